@@ -1,54 +1,76 @@
 # /app/app.py
 # Flask server (HF Spaces-safe: writes to /tmp by default)
-from flask import Flask, render_template, request, jsonify, send_file
-import os, json, uuid, random, traceback, requests 
-from datetime import datetime, timezone, timedelta
+from flask import Flask, Response, render_template, request, jsonify, send_file, stream_with_context
+import os, json, uuid, random, traceback, mimetypes
+from datetime import datetime
 import pytz
 from pathlib import Path
-import atexit, shutil
+import atexit, html
 from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
 
 # --- LLM client (safe fallback if llm.py absent) ---
 try:
-    from gentask import prompt_llm
+    from gentask import prompt_llm, prompt_llm_stream
 except Exception:
     def prompt_llm(prompt: str) -> str:  # minimal fallback; only used if llm.py missing
         return "Nice! That totally counts. Ready for another quick challenge?"
 
+    def prompt_llm_stream(prompt: str):
+        yield prompt_llm(prompt)
+
 app = Flask(__name__)
 
 try:
-    from judge import judge_with_gemma as judge_submission_model
+    from judge import judge_with_gemma as judge_submission_model, JUDGE_BATCHER
 except Exception as e:
     print("[ERROR] judge.py failed to import:", e)
+    JUDGE_BATCHER = None
     def judge_submission_model(*args, **kwargs):
         return "Nice job! Looks good to me 👍"
 
 
-from micronarrative import create_micro_narrative_chapter
+from micronarrative import STORY_STORE, create_micro_narrative_chapter, missing_story_images, restore_story_images
+from envcontext import gather_context, issue_context_token, read_context_token
+from taskpool import TaskPool
+from jobs import JobQueue
+from submissions import SubmissionStore
+from feedbacklog import FeedbackLog
+from mediasvc import MEDIA_SERVICE, MediaSummary
+from mediaprep import preprocess as preprocess_media
+from uploads import OffsetMismatch, UploadError, UploadManager
+from geocache import GeoCache
+from novelty import NoveltyIndex
+from promptcache import PROMPT_CACHE
+from prompts import TASK_PROMPT
+import prompts
+import llm
+import outbound
+import solar
+from geoindex import POI_TAGS, LanduseIndex, PoiIndex
+
+# Signs context tokens handed out with tasks; set SECRET_KEY when running more than one worker
+app.config['SECRET_KEY'] = os.getenv('SECRET_KEY') or os.urandom(32).hex()
 
 # --- Writable paths (HF Spaces tip: /tmp is writable) ---
 app.config['UPLOAD_FOLDER'] = os.getenv('UPLOAD_FOLDER', '/tmp/uploads')
 RESULTS_DIR = os.getenv('RESULTS_DIR', '/tmp/results')
 
 FEEDBACK_DIR = "/tmp/outputs"
-EXPORT_DIR = "./feedback_export"
-
-@atexit.register
-def export_feedback():
-    try:
-        os.makedirs(EXPORT_DIR, exist_ok=True)
-        for f in os.listdir(FEEDBACK_DIR):
-            src = os.path.join(FEEDBACK_DIR, f)
-            dst = os.path.join(EXPORT_DIR, f)
-            shutil.copyfile(src, dst)
-        print("Exported feedback logs to feedback_export/")
-    except Exception as e:
-        print("Error exporting feedback logs:", e)
+EXPORT_DIR = os.getenv("FEEDBACK_EXPORT_DIR", "./feedback_export")
 
 # 64 MB max upload
 app.config['MAX_CONTENT_LENGTH'] = 64 * 1024 * 1024
 
+# --- Media serving offload ---
+# USE_X_SENDFILE=1 lets Apache/lighttpd stream files; for nginx set ACCEL_*_PREFIX to `internal`
+# locations aliasing UPLOAD_FOLDER / STORY_STORE_DIR so Python only authorizes and sets headers.
+app.config['USE_X_SENDFILE'] = os.getenv('USE_X_SENDFILE', '0') == '1'
+ACCEL_UPLOADS_PREFIX = os.getenv('ACCEL_UPLOADS_PREFIX', '')
+ACCEL_STORY_PREFIX = os.getenv('ACCEL_STORY_PREFIX', '')
+UPLOAD_CACHE_CONTROL = "private, max-age=3600"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
 # Ensure writable dirs exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(RESULTS_DIR, exist_ok=True)
@@ -56,6 +78,39 @@ os.makedirs(RESULTS_DIR, exist_ok=True)
 # --- NEW: Feedback directory ---
 FEEDBACK_DIR = os.getenv("FEEDBACK_DIR", "/tmp/outputs")
 os.makedirs(FEEDBACK_DIR, exist_ok=True)
+# Ratings go to rotated JSONL segments via a background writer; exports copy only new bytes
+FEEDBACK_LOG = FeedbackLog(FEEDBACK_DIR, export_dir=EXPORT_DIR)
+
+@atexit.register
+def export_feedback():
+    try:
+        FEEDBACK_LOG.close()
+        print(f"Exported feedback logs to {EXPORT_DIR}/")
+    except Exception as e:
+        print("Error exporting feedback logs:", e)
+
+
+# Geo-bucketed cache for upstream lookups (set GEO_CACHE_PATH to persist across restarts)
+GEO_CACHE = GeoCache(path=os.getenv("GEO_CACHE_PATH") or None)
+# Optional offline POI index built with `python geoindex.py build-pois` (None → Overpass)
+POI_INDEX = PoiIndex.open_if_configured(os.getenv("POI_INDEX_PATH"))
+# Optional offline landuse classifier (`python geoindex.py build-landuse`); Nominatim becomes a fallback
+LANDUSE_INDEX = LanduseIndex.open_if_configured(os.getenv("LANDUSE_INDEX_PATH"))
+NOMINATIM_FALLBACK = os.getenv("NOMINATIM_FALLBACK", "1") == "1"
+# Recently issued tasks per session and per geohash cell; near-repeats are rejected or regenerated
+NOVELTY = NoveltyIndex()
+NOVELTY_RETRIES = int(os.getenv("NOVELTY_RETRIES", "1"))   # extra LLM calls allowed to replace a repeat
+# Pre-generated tasks per context bucket (TASK_POOL_SIZE=0 disables); looks prompt_llm up per call
+TASK_POOL = TaskPool(lambda prompt: prompt_llm(prompt))
+# Worker pool for the submit pipeline (summarize → judge → narrate)
+JOBS = JobQueue()
+# Submission metadata lives in SQLite (media stays on disk); the old meta.json tree is imported once
+SUBMISSIONS = SubmissionStore(os.getenv("SUBMISSIONS_DB") or os.path.join(app.config['UPLOAD_FOLDER'], "submissions.db"))
+SUBMISSIONS.migrate_from_dir(app.config['UPLOAD_FOLDER'])
+# Resumable chunked uploads are staged under .uploads/ (never served) until /submit claims them
+UPLOADS = UploadManager(os.path.join(app.config['UPLOAD_FOLDER'], ".uploads"))
+# A story chapter is written once per this many submissions (memoized per session)
+CHAPTER_SIZE = int(os.getenv("CHAPTER_SIZE", "3"))
 
 
 def now_stamp() -> str:
@@ -67,40 +122,33 @@ def http_get(url: str, **kw):
     kw.setdefault("timeout", 10)
     headers = kw.pop("headers", {})
     headers.setdefault("User-Agent", "hoppi-app")
-    return requests.get(url, headers=headers, **kw)
+    return outbound.get(url, headers=headers, **kw)
+
+WEATHER_FALLBACK = "Weather data unavailable; suggest something suitable for any condition."
 
 def get_day_period(lat, lon):
+    """Sun-cycle period computed locally from lat/lon (no network; see solar.py)."""
     try:
-        url = f"https://api.sunrise-sunset.org/json?lat={lat}&lng={lon}&formatted=0"
-        res = http_get(url)
-        res.raise_for_status()
-        data = res.json()["results"]
-        sunrise = datetime.fromisoformat(data["sunrise"]).replace(tzinfo=timezone.utc)
-        sunset  = datetime.fromisoformat(data["sunset"]).replace(tzinfo=timezone.utc)
-        now = datetime.now(timezone.utc)
-
-        morning_end   = sunrise + timedelta(hours=4)
-        afternoon_end = sunset  - timedelta(hours=2)
-
-        if now < sunrise: return "pre-dawn"
-        if sunrise <= now < morning_end: return "morning"
-        if morning_end <= now < afternoon_end: return "afternoon"
-        if afternoon_end <= now < sunset: return "evening"
-        return "night"
+        return solar.day_period(float(lat), float(lon))
     except Exception as e:
-        print(f"[ERROR] Sunrise-Sunset API failed: {e}")
-        hour = datetime.now().hour
-        if hour < 12: return "morning"
-        if hour < 18: return "afternoon"
-        return "night"
+        print(f"[ERROR] Solar position failed: {e}")
+        return local_hour_period()
+
+def local_hour_period():
+    hour = datetime.now().hour
+    if hour < 12: return "morning"
+    if hour < 18: return "afternoon"
+    return "night"
 
 def get_weather_hint(lat, lon):
-    try:
+    def _fetch():
         url = f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&current_weather=true"
         res = http_get(url)
         res.raise_for_status()
-        data = res.json()
-        weather_code = data["current_weather"]["weathercode"]
+        return res.json()["current_weather"]["weathercode"]
+
+    try:
+        weather_code = GEO_CACHE.get_or_load("weather", lat, lon, _fetch)
 
         # Broaden coverage
         if weather_code in range(0, 2):  # 0,1
@@ -119,43 +167,28 @@ def get_weather_hint(lat, lon):
             return "Weather unclear; suggest something adaptable."
     except Exception as e:
         print(f"[Weather Error] {e}")
-        return "Weather data unavailable; suggest something suitable for any condition."
+        return WEATHER_FALLBACK
 
 
 def get_nearby_places(lat, lon, radius=500):
+    # Offline index first (sub-millisecond, no rate limits)
+    if POI_INDEX is not None:
+        try:
+            return POI_INDEX.nearby(lat, lon, radius)
+        except Exception as e:
+            print(f"[ERROR] Local POI index failed, falling back to Overpass: {e}")
+
     url = "https://overpass-api.de/api/interpreter"
+    clauses = "\n".join(f'      node["{k}"="{v}"](around:{radius},{lat},{lon});' for k, v in POI_TAGS)
     query = f"""
     [out:json][timeout:25];
     (
-      node["leisure"="park"](around:{radius},{lat},{lon});
-      node["leisure"="playground"](around:{radius},{lat},{lon});
-      node["amenity"="cafe"](around:{radius},{lat},{lon});
-      node["amenity"="restaurant"](around:{radius},{lat},{lon});
-      node["amenity"="fast_food"](around:{radius},{lat},{lon});
-      node["amenity"="bar"](around:{radius},{lat},{lon});
-      node["amenity"="pub"](around:{radius},{lat},{lon});
-      node["shop"="mall"](around:{radius},{lat},{lon});
-      node["shop"="supermarket"](around:{radius},{lat},{lon});
-      node["shop"="convenience"](around:{radius},{lat},{lon});
-      node["amenity"="library"](around:{radius},{lat},{lon});
-      node["amenity"="school"](around:{radius},{lat},{lon});
-      node["amenity"="university"](around:{radius},{lat},{lon});
-      node["amenity"="hospital"](around:{radius},{lat},{lon});
-      node["amenity"="clinic"](around:{radius},{lat},{lon});
-      node["amenity"="bus_station"](around:{radius},{lat},{lon});
-      node["amenity"="train_station"](around:{radius},{lat},{lon});
-      node["tourism"="museum"](around:{radius},{lat},{lon});
-      node["tourism"="art_gallery"](around:{radius},{lat},{lon});
-      node["leisure"="sports_centre"](around:{radius},{lat},{lon});
-      node["leisure"="fitness_centre"](around:{radius},{lat},{lon});
-      node["amenity"="place_of_worship"](around:{radius},{lat},{lon});
-      node["amenity"="marketplace"](around:{radius},{lat},{lon});
-      node["amenity"="theatre"](around:{radius},{lat},{lon});
-      node["tourism"="hotel"](around:{radius},{lat},{lon});
+{clauses}
     );
     out center;
     """
-    try:
+
+    def _fetch():
         res = http_get(url, params={'data': query})
         res.raise_for_status()
         data = res.json()
@@ -167,15 +200,29 @@ def get_nearby_places(lat, lon, radius=500):
             category = tags.get('amenity') or tags.get('shop') or tags.get('leisure') or tags.get('tourism') or 'unknown'
             out.append({'name': name, 'category': category, 'lat': el.get('lat'), 'lon': el.get('lon')})
         return out
+
+    try:
+        return GEO_CACHE.get_or_load("places", lat, lon, _fetch, extra=str(radius))
     except Exception as e:
         print(f"[ERROR] Nearby place detection failed: {e}")
         return []
 
 def get_location_type(lat, lon):
-    try:
+    if LANDUSE_INDEX is not None:
+        try:
+            local_type = LANDUSE_INDEX.classify(lat, lon)
+            if local_type:
+                return local_type
+        except Exception as e:
+            print(f"[ERROR] Local landuse index failed: {e}")
+        if not NOMINATIM_FALLBACK:
+            return 'street'
+
+    def _fetch():
         url = f"https://nominatim.openstreetmap.org/reverse?lat={lat}&lon={lon}&format=json&zoom=18&addressdetails=1"
         res = http_get(url)
         print(f"[DEBUG] Nominatim status {res.status_code}")
+        res.raise_for_status()  # don't cache error pages for weeks
         data = res.json()
         tags = data.get("address", {})
         blob = json.dumps(tags).lower()
@@ -186,19 +233,29 @@ def get_location_type(lat, lon):
         if 'forest' in blob: return 'park'
         if any(k in tags for k in ('road','suburb','city','neighbourhood')): return 'street'
         return 'street'
+
+    try:
+        return GEO_CACHE.get_or_load("location_type", lat, lon, _fetch)
     except Exception as e:
         print(f"[ERROR] Location type detection failed: {e}")
         return 'street'
 
+def get_environment_context(lat, lon, include_places=True):
+    """Resolve location type, weather, sun cycle (and nearby places) concurrently under one deadline."""
+    sources = {
+        "location_type": (lambda: get_location_type(lat, lon), "street"),
+        "weather_hint": (lambda: get_weather_hint(lat, lon), WEATHER_FALLBACK),
+        "day_period": (lambda: get_day_period(lat, lon), local_hour_period),
+    }
+    if include_places:
+        sources["nearby_places"] = (lambda: get_nearby_places(lat, lon), list)
+    return gather_context(sources)
+
 def ensure_session_dir(session_id: str) -> Path:
     d = Path(app.config['UPLOAD_FOLDER']) / session_id
     d.mkdir(parents=True, exist_ok=True)
     return d
 
-def next_index(session_dir: Path) -> int:
-    dirs = [p for p in session_dir.iterdir() if p.is_dir() and p.name.isdigit()]
-    return (max(int(p.name) for p in dirs)+1) if dirs else 1
-
 def judge_submission(task: str, media_type: str, text: str | None, file_path: str | None, lat: float | None, lon: float | None) -> str:
     sample = text if text else f"User submitted a {media_type} (content unknown)."
     prompt = f"""
@@ -225,11 +282,139 @@ Rules:
         return "Nice! That totally counts. Ready for another quick challenge?"
 
 
+def build_task_prompt(ctx, lat, lon, main_place, avoid=None):
+    """
+    Prompt for one challenge (see prompts.TASK_PROMPT). `main_place` without a name (pooled tasks)
+    only mentions its category and, with lat/lon None, the prompt carries no coordinates at all;
+    `avoid` is a recent task the new one must not resemble.
+    """
+    location_type = ctx["location_type"]
+    weather_hint = ctx["weather_hint"]
+    period = ctx["day_period"]
+    time_hint_map = {
+        "pre-dawn":"It's before sunrise — suggest something peaceful or introspective.",
+        "morning":"It's morning, suggest something energizing and fresh.",
+        "afternoon":"It's afternoon, suggest something social or creative.",
+        "evening":"It's evening, suggest something calm and reflective.",
+        "night":"It's night, suggest something quiet, safe, and introspective."
+    }
+    safety_hint = "It's dark, so avoid unsafe areas or strangers. Focus on calm, personal tasks." if period in ("evening","night","pre-dawn") else "It's bright outside, so social or playful tasks are great."
+    if main_place and main_place.get('name'):
+        nearby_hint = f"There is a {main_place['category']} nearby called '{main_place['name']}'. Suggest something relevant to that place."
+    elif main_place:
+        nearby_hint = f"There is a {main_place['category']} nearby. Suggest something relevant to that kind of place."
+    else:
+        nearby_hint = "No major places nearby. Suggest something suitable for open areas."
+    daytime = [
+        "Be energetic and playful.","Encourage interaction with others.","Make it involve a stranger.",
+        "Encourage them to take a photo, video or record audio.","Make it feel like a mini-game.",
+        "Include movement or interaction with the environment.","Encourage a quick creative act.",
+        "Make them explore a small detail around them they normally ignore.","Include something involving color or sound."
+    ]
+    nighttime = [
+        "Be soft and gentle.","Encourage quiet reflection.","Focus on creativity or mindfulness.",
+        "Suggest a calming or self-reflective act.","Make it about observing surroundings quietly.",
+        "Encourage them to write or record a thought privately.","Let them notice city lights, sounds, or patterns quietly.",
+        "Prompt them to capture a subtle night detail in a photo or note."
+    ]
+    variation_hint = random.choice(nighttime if period in ("evening","night","pre-dawn") else daytime)
+    freshness_hint = random.choice([
+        "Make sure this challenge feels totally new compared to any previous idea.",
+        "Ensure this activity feels distinct in tone or action from the last few suggestions.",
+        "Add a small creative twist not seen in previous tasks.",
+        "Vary the setting or mood slightly to keep it interesting.",
+        "Change up the interaction style for variety."
+    ])
+    if avoid:
+        freshness_hint = f"The user recently got “{avoid}”. Make this one clearly different in action and subject."
+
+    return TASK_PROMPT.render(
+        location_type=location_type, coordinates=f"{lat:.4f}, {lon:.4f}" if lat is not None and lon is not None else "not given", hour=datetime.now().strftime('%H'),
+        weather_hint=weather_hint, period=period, time_hint=time_hint_map[period], safety_hint=safety_hint,
+        nearby_hint=nearby_hint, variation_hint=variation_hint, freshness_hint=freshness_hint,
+    )
+
+
+def task_pool_key(ctx, main_place):
+    """(location type, day period, weather bucket, POI category) — the context a pooled task fits."""
+    return (ctx["location_type"], ctx["day_period"], ctx["weather_hint"], main_place["category"] if main_place else None)
+
+
+def task_cache_fields(ctx, main_place):
+    """The prompt fields a live task depends on (the random variation/freshness hints are left out)."""
+    return {"bucket": task_pool_key(ctx, main_place), "place": main_place["name"] if main_place else None}
+
+
 # --- routes ---
 @app.route('/')
 def index():
     return render_template('index.html')
 
+TASK_FALLBACK = "Nice! That totally counts. Ready for another quick challenge."
+
+def prepare_task(lat, lon, session_id=None):
+    """Everything /generate-task does before the LLM call: context, place, pool/cache lookup, prompt."""
+    ctx = get_environment_context(lat, lon)
+    nearby_places = ctx["nearby_places"]
+    main_place = random.choice(nearby_places) if nearby_places else None
+
+    # ⚡ Serve a pre-generated task for this context bucket if one is ready
+    pool_key = task_pool_key(ctx, main_place)
+    pooled = TASK_POOL.pop(pool_key)
+    scopes = NOVELTY.scopes_for(session_id, lat, lon)
+    # Pooled and cached tasks exist to be shared by people in the same context, so they only have
+    # to be new to this session; fresh generations must also differ from what this cell just got
+    session_scopes = NOVELTY.scopes_for(session_id)
+    if pooled and not NOVELTY.is_novel(pooled["task"], session_scopes):
+        pooled = None   # the pool refills anyway
+    # Pooled tasks (and their prompts) are handed to other users, so they're built from the bucket
+    # only: the POI category, no place name and never the coordinates of whoever triggered the refill
+    generic_place = {'category': main_place['category'], 'name': None} if main_place else None
+    TASK_POOL.refill(pool_key, lambda: build_task_prompt(ctx, None, None, generic_place))
+
+    job = {'ctx': ctx, 'lat': lat, 'lon': lon, 'main_place': main_place, 'pool_key': pool_key,
+           'cache_fields': task_cache_fields(ctx, main_place), 'novelty_scopes': scopes}
+    if pooled:
+        job.update(task=pooled["task"], prompt=pooled["prompt"], source="pool")
+        return job
+
+    prompt = build_task_prompt(ctx, lat, lon, main_place, avoid=NOVELTY.recent(scopes))
+    # One of the last few tasks written for exactly this context, once enough variants exist
+    cached = PROMPT_CACHE.get("task", job['cache_fields'])
+    if cached and NOVELTY.is_novel(cached, session_scopes):
+        job.update(task=cached, prompt=prompt, source="cache")
+        return job
+    job.update(task=None, prompt=prompt, source="LLM")
+
+    # Write last prompt for debugging/QA (in writable place)
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(os.path.join(RESULTS_DIR, 'prompts.txt'), 'w', encoding='utf-8') as f:
+        f.write(prompt + "\n")
+    return job
+
+def generate_novel_task(job):
+    """LLM task for the job, regenerated (up to NOVELTY_RETRIES times) while it repeats a recent one."""
+    task = prompt_llm(job['prompt']).strip()
+    for _ in range(NOVELTY_RETRIES):
+        similar = NOVELTY.check(task, job['novelty_scopes'])
+        if similar['novel']:
+            break
+        print(f"[DEBUG] Task too close to a recent one ({similar['score']}), regenerating")
+        job['prompt'] = build_task_prompt(job['ctx'], job['lat'], job['lon'], job['main_place'], avoid=similar['closest'])
+        task = prompt_llm(job['prompt']).strip()
+    return task
+
+def task_response(job, task):
+    return {
+        'task': task,
+        'location_type': job['ctx']["location_type"],
+        'coordinates': {'lat': job['lat'], 'lon': job['lon']},
+        'source': job['source'],
+        'selected_place': job['main_place'],
+        'context_token': issue_context_token(job['ctx'], job['lat'], job['lon'], app.config['SECRET_KEY']),
+        'prompt': job['prompt'].strip()  # 👈 add prompt to allow user feedback
+    }
+
 @app.route('/generate-task', methods=['POST'])
 def generate_task():
     try:
@@ -237,154 +422,158 @@ def generate_task():
         lat = data.get('latitude'); lon = data.get('longitude')
         if lat is None or lon is None:
             return jsonify({'error': 'Location data required'}), 400
-        location_type = get_location_type(lat, lon)
-        weather_hint = get_weather_hint(lat, lon)
-        nearby_places = get_nearby_places(lat, lon)
-        main_place = random.choice(nearby_places) if nearby_places else None
-
-        period = get_day_period(lat, lon)
-        time_hint_map = {
-            "pre-dawn":"It's before sunrise — suggest something peaceful or introspective.",
-            "morning":"It's morning, suggest something energizing and fresh.",
-            "afternoon":"It's afternoon, suggest something social or creative.",
-            "evening":"It's evening, suggest something calm and reflective.",
-            "night":"It's night, suggest something quiet, safe, and introspective."
-        }
-        safety_hint = "It's dark, so avoid unsafe areas or strangers. Focus on calm, personal tasks." if period in ("evening","night","pre-dawn") else "It's bright outside, so social or playful tasks are great."
-        nearby_hint = f"There is a {main_place['category']} nearby called '{main_place['name']}'. Suggest something relevant to that place." if main_place else "No major places nearby. Suggest something suitable for open areas."
-        daytime = [
-            "Be energetic and playful.","Encourage interaction with others.","Make it involve a stranger.",
-            "Encourage them to take a photo, video or record audio.","Make it feel like a mini-game.",
-            "Include movement or interaction with the environment.","Encourage a quick creative act.",
-            "Make them explore a small detail around them they normally ignore.","Include something involving color or sound."
-        ]
-        nighttime = [
-            "Be soft and gentle.","Encourage quiet reflection.","Focus on creativity or mindfulness.",
-            "Suggest a calming or self-reflective act.","Make it about observing surroundings quietly.",
-            "Encourage them to write or record a thought privately.","Let them notice city lights, sounds, or patterns quietly.",
-            "Prompt them to capture a subtle night detail in a photo or note."
-        ]
-        variation_hint = random.choice(nighttime if period in ("evening","night","pre-dawn") else daytime)
-        freshness_hint = random.choice([
-            "Make sure this challenge feels totally new compared to any previous idea.",
-            "Ensure this activity feels distinct in tone or action from the last few suggestions.",
-            "Add a small creative twist not seen in previous tasks.",
-            "Vary the setting or mood slightly to keep it interesting.",
-            "Change up the interaction style for variety."
-        ])
-
-        prompt = f"""
-You are a warm, witty real-world assistant named Hoppi.
-
-The user’s environment: {location_type}.
-Coordinates: {lat:.4f}, {lon:.4f}.
-Local time (approx hour): {datetime.now().strftime('%H')}:00.
-{weather_hint}
-According to the sun cycle, it’s {period}.
-{time_hint_map[period]}
-{safety_hint}
-
-Nearby info: {nearby_hint}
-Variation: {variation_hint}
-Freshness: {freshness_hint}
-
-Write ONE real-time challenge (25–30 words) that clearly includes the weather hint (“{weather_hint}”) and the current light condition ({period}). 
-For example, if it’s raining, the task should mention rain or wet surfaces directly.
-No emojis/hashtags. Avoid repetitive openings. No exact clock time. 
-Simple, 12-year-old-friendly, spontaneous, doable now with just a phone.
-Each challenge should invite the user to do *only one small action* — like take a photo, record ambient sound, take a few seconds clip or write one thought. 
-The weather and time should influence the tone.
+        job = prepare_task(lat, lon, data.get('session_id'))
 
-"""
-        # Write last prompt for debugging/QA (in writable place)
-        os.makedirs(RESULTS_DIR, exist_ok=True)
-        with open(os.path.join(RESULTS_DIR, 'prompts.txt'), 'w', encoding='utf-8') as f:
-            f.write(prompt + "\n")
+        task = job['task']
+        if task is None:
+            # --- NEW: Safe fallback for LLM failure ---
+            try:
+                task = generate_novel_task(job)
+                TASK_POOL.note_issued(job['pool_key'], task)
+                PROMPT_CACHE.put("task", job['cache_fields'], task)
+            except Exception as e:
+                print("[LLM ERROR in /generate-task]", e)
+                task = TASK_FALLBACK
+        if task != TASK_FALLBACK:
+            NOVELTY.add(task, job['novelty_scopes'])
 
-        # --- NEW: Safe fallback for LLM failure ---
-        try:
-            task = prompt_llm(prompt).strip()
-        except Exception as e:
-            print("[LLM ERROR in /generate-task]", e)
-            task = "Nice! That totally counts. Ready for another quick challenge."
-
-        # --- Continue as normal ---
-        response = {
-            'task': task,
-            'location_type': location_type,
-            'coordinates': {'lat': lat, 'lon': lon},
-            'source': "LLM",
-            'selected_place': main_place,
-            'prompt': prompt.strip()  # 👈 add prompt to allow user feedback
-        }
-        return jsonify(response)
+        return jsonify(task_response(job, task))
     except Exception as e:
         print("[ERROR] Exception in generate-task:", traceback.format_exc())
         return jsonify({'error': str(e)}), 500
 
+def sse(event, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
+@app.route('/generate-task/stream', methods=['POST'])
+def generate_task_stream():
+    """Server-Sent Events: `meta` (place/context) first, then `token` deltas, then `done` with the full response."""
+    data = request.get_json(force=True, silent=True) or {}
+    lat = data.get('latitude'); lon = data.get('longitude')
+    if lat is None or lon is None:
+        return jsonify({'error': 'Location data required'}), 400
 
-def summarize_media(file_path, media_type):
-    """Summarize image/audio content so Hoppi can better judge."""
-    if not file_path:
-        return "No file provided."
-
-    # --- 1️⃣ Image captioning (Hugging Face API example) ---
-    if media_type in ("photo", "image", "picture"):
+    def events():
         try:
-            hf_key = os.getenv("HF_API_KEY", "")
-            res = requests.post(
-                "https://api-inference.huggingface.co/models/Salesforce/blip-image-captioning-large",
-                headers={"Authorization": f"Bearer {hf_key}"} if hf_key else {},
-                files={"file": open(file_path, "rb")},
-                timeout=30
-            )
-            caption_data = res.json()
-            if isinstance(caption_data, list) and "generated_text" in caption_data[0]:
-                caption = caption_data[0]["generated_text"]
+            job = prepare_task(lat, lon, data.get('session_id'))
+            yield sse("meta", {'location_type': job['ctx']["location_type"],
+                               'selected_place': job['main_place'], 'source': job['source']})
+            task = job['task']
+            if task is not None:
+                yield sse("token", {'text': task})
             else:
-                caption = str(caption_data)
-            return f"Image description: {caption}"
+                parts = []
+                try:
+                    for delta in prompt_llm_stream(job['prompt']):
+                        parts.append(delta)
+                        yield sse("token", {'text': delta})
+                    task = "".join(parts).strip()
+                    TASK_POOL.note_issued(job['pool_key'], task)
+                    PROMPT_CACHE.put("task", job['cache_fields'], task)
+                except Exception as e:
+                    print("[LLM ERROR in /generate-task/stream]", e)
+                    if not parts:
+                        task = TASK_FALLBACK
+                        yield sse("token", {'text': task})
+                    else:
+                        task = "".join(parts).strip()
+            # Already streamed, so no regenerating here; the `avoid` hint in the prompt did that work
+            if task != TASK_FALLBACK:
+                NOVELTY.add(task, job['novelty_scopes'])
+            yield sse("done", task_response(job, task))
         except Exception as e:
-            print("[WARN] Image captioning failed:", e)
-            return "Image description unavailable."
+            print("[ERROR] Exception in generate-task/stream:", traceback.format_exc())
+            yield sse("error", {'error': str(e)})
 
-    # --- 2️⃣ Audio transcription (Whisper) ---
-    elif media_type in ("audio", "recording", "voice"):
-        try:
-            import openai
-            openai.api_key = os.getenv("OPENAI_API_KEY", "")
-            transcript = openai.Audio.transcribe("whisper-1", open(file_path, "rb"))
-            return f"Audio transcription: {transcript['text']}"
-        except Exception as e:
-            print("[WARN] Audio transcription failed:", e)
-            return "Audio content unavailable."
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
-    # --- 3️⃣ Fallback ---
-    else:
-        return f"Uploaded a {media_type}, but no automatic summary available."
-
-# --- Helper: get recent submissions ---
-def get_user_recent_submissions(session_id, limit=3):
-    """Fetch the user's last N submissions."""
-    session_dir = ensure_session_dir(session_id)
-    dirs = sorted(
-        [p for p in session_dir.iterdir() if p.is_dir() and p.name.isdigit()],
-        key=lambda p: int(p.name),
-        reverse=True
-    )
-    submissions = []
-    for d in dirs[:limit]:
-        meta_path = d / "meta.json"
-        if meta_path.exists():
-            with open(meta_path, "r", encoding="utf-8") as f:
-                meta = json.load(f)
-            submissions.append({
-                "task": meta.get("task", ""),
-                "summary": meta.get("text", "")[:200],
-                "judge_feedback": meta.get("fit_score", ""),
-            })
-    return submissions
+
+
+def summarize_media(file_path, media_type):
+    """Summarize image/audio content so Hoppi can better judge (cached by upload hash)."""
+    return MEDIA_SERVICE.summarize(file_path, media_type)
+
+# --- Helper: summarize stored submissions for the narrator ---
+def submission_summary(meta):
+    return {
+        "task": meta.get("task") or "",
+        "summary": (meta.get("text") or "")[:200],
+        "judge_feedback": meta.get("fit_score") if meta.get("fit_score") is not None else "",
+    }
+
+
+def completed_chapter_ids(session_id, idx: int):
+    """
+    Submission ids of the chapter that submission `idx` completes, or None if it doesn't end one.
+    Chapters are fixed blocks of CHAPTER_SIZE submissions in index order, so each is written once.
+    """
+    ids = SUBMISSIONS.indices(session_id)
+    if idx not in ids:
+        return None
+    pos = ids.index(idx) + 1
+    if pos % CHAPTER_SIZE:
+        return None
+    return ids[pos - CHAPTER_SIZE:pos]
+
+
+def load_chapters(session_dir: Path) -> dict:
+    path = session_dir / "chapters.json"
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except Exception as e:
+        print("[WARN] Unreadable chapters.json, starting over:", e)
+        return {}
+
+
+def save_chapters(session_dir: Path, chapters: dict):
+    tmp = session_dir / "chapters.json.tmp"
+    tmp.write_text(json.dumps(chapters, indent=2), encoding="utf-8")
+    os.replace(tmp, session_dir / "chapters.json")
+
+
+def get_or_create_chapter(session_id, idx, **callbacks):
+    """
+    Story chapter completed by submission `idx`, generated at most once per block of submissions
+    and memoized in the session's chapters.json. Returns None when `idx` doesn't close a chapter.
+    Runs inside the session's job lane, so two submissions never race on the memo. Images the story
+    store has since evicted are regenerated from the chapter's beats, so its URLs keep working.
+    """
+    sdir = ensure_session_dir(session_id)
+    ids = completed_chapter_ids(session_id, idx)
+    if ids is None:
+        return None
+    key = "-".join(f"{i:03d}" for i in ids)
+    chapters = load_chapters(sdir)
+    number = len(chapters) + 1
+    if key in chapters:
+        chapter = chapters[key]
+        missing = missing_story_images(chapter.get("images", []))
+        if not missing:
+            return chapter
+        if chapter.get("beats"):
+            chapter["images"] = restore_story_images(chapter["beats"], chapter["images"], missing,
+                                                     on_image=callbacks.get("on_image"))
+            save_chapters(sdir, chapters)
+            return chapter
+        number = chapter["number"]   # memo without beats: write the chapter again in its place
+
+    # Newest first, as the narrator expects
+    submissions = [submission_summary(m) for m in (SUBMISSIONS.get(session_id, i) for i in reversed(ids)) if m]
+    story = create_micro_narrative_chapter(submissions, **callbacks)
+    chapter = {
+        "number": number,
+        "submission_ids": ids,
+        "story_text": story.get("story_text"),
+        "beats": story.get("beats", []),
+        "images": story.get("images", []),
+        "created_utc": datetime.utcnow().isoformat() + "Z",
+    }
+    chapters[key] = chapter
+    save_chapters(sdir, chapters)
+    return chapter
 
 
 @app.route("/submit", methods=["POST"])
@@ -397,23 +586,35 @@ def submit():
         lon = request.form.get("lon", type=float)
         text = request.form.get("text")
 
+        upload_id = request.form.get("upload_id")
+
         if not task or not media_type:
             return jsonify({"error": "Missing task or media_type"}), 400
 
-        # 🧠 Recompute environmental context
-        location_type = get_location_type(lat, lon)
-        weather_hint = get_weather_hint(lat, lon)
-        period = get_day_period(lat, lon)
+        # 📦 A finished chunked upload is claimed first; its file moves into the entry below
+        upload = None
+        if upload_id:
+            try:
+                upload = UPLOADS.claim(upload_id, session_id)
+            except UploadError as e:
+                return jsonify({"error": str(e)}), e.status
+
+        # 🧠 Reuse the context /generate-task resolved; recompute only if the token is missing/expired
+        ctx = read_context_token(request.form.get("context_token"), lat, lon, app.config['SECRET_KEY'])
+        if ctx is None:
+            ctx = get_environment_context(lat, lon, include_places=False)
 
         # 🗂️ Ensure directories
         sdir = ensure_session_dir(session_id)
-        idx = next_index(sdir)
+        idx = SUBMISSIONS.allocate_index(session_id)
         entry = sdir / f"{idx:03d}"
         entry.mkdir(parents=True, exist_ok=True)
+        file_path = None
+        if upload is not None:
+            file_path = UPLOADS.move(upload, str(entry / os.path.basename(upload.path))).path
 
         # 🖼 Save file if uploaded
-        file_path = None
-        if "file" in request.files and request.files["file"].filename:
+        if upload is None and "file" in request.files and request.files["file"].filename:
             f = request.files["file"]
             fname = secure_filename(f.filename) or f"{media_type}-{now_stamp()}"
             file_path = str(entry / fname)
@@ -423,12 +624,6 @@ def submit():
         if text and text.strip():
             (entry / "note.txt").write_text(text.strip(), encoding="utf-8")
 
-        # 🧩 Create summary for non-text content
-        if file_path:
-            media_summary = summarize_media(file_path, media_type)
-        else:
-            media_summary = text or "No submission text provided."
-
         # 💾 Save metadata
         meta = {
             "session_id": session_id,
@@ -441,89 +636,208 @@ def submit():
             "lon": lon,
             "created_utc": datetime.utcnow().isoformat() + "Z",
         }
-        (entry / "meta.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+        (entry / "meta.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")  # sidecar for exports
 
         # 📊 Count progress
-        total = len([p for p in sdir.iterdir() if p.is_dir() and p.name.isdigit()])
+        total = SUBMISSIONS.add(meta)
         remaining = max(0, 5 - total)
         surprise_ready = total >= 5
 
-        # 🤖 Call judge
-        judge_result = judge_submission_model(
-            task,
-            media_type,
-            media_summary,
-            file_path,
-            lat,
-            lon,
-            session_id=session_id,
-            context={
-                "location_type": location_type,
-                "weather_hint": weather_hint,
-                "day_period": period,
-            },
-        )
-
-        if isinstance(judge_result, dict):
-            judge_text = judge_result.get("feedback")
-            fit_score = judge_result.get("fit_score")
-        else:
-            judge_text = judge_result
-            fit_score = None
-
-        if fit_score is not None:
-            meta["fit_score"] = fit_score
-            (entry / "meta.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
-
-        # 🪄 Log summary
-        print("\n───────────── HOPPI JUDGE SUMMARY ─────────────")
-        print(f"🧩 Session ID: {session_id}")
-        print(f"🕹️ Task: {task[:80]}{'...' if len(task) > 80 else ''}")
-        print(f"📍 Location: lat={lat}, lon={lon}")
-        print(f"📸 Media Type: {media_type}")
-        if text:
-            print(f"📝 Text Preview: {text[:100]}{'...' if len(text) > 100 else ''}")
-        if file_path:
-            print(f"📂 File: {os.path.basename(file_path)}")
-        print(f"🤖 Hoppi Feedback: {judge_text}")
-        if fit_score is not None:
-            print(f"🎯 Fit Score: {fit_score:.2f}")
-        print("───────────────────────────────────────────────\n")
-
-       # --- Micro-narrative generation after 3 submissions ---
-        micro_story = None
-        micro_images = []
-        story_ready = False
-
-        user_submissions = get_user_recent_submissions(session_id, limit=3)
-        if len(user_submissions) == 3:
-            try:
-                story = create_micro_narrative_chapter(user_submissions)
-                micro_story = story.get("story_text")
-                micro_images = story.get("images", [])
-                story_ready = True
-            except Exception as e:
-                print("[ERROR] Micro-narrative generation failed:", e)
-
+        # ⏩ Summarize → judge → narrate in the background; the client follows the job
+        job_id = JOBS.submit(lambda job: process_submission(job, entry, meta, ctx), key=session_id)
 
-        # ✅ Return response
         return jsonify({
             "ok": True,
             "session_id": session_id,
             "count": total,
             "remaining": remaining,
             "surprise_ready": surprise_ready,
-            "judge_text": judge_text,
-            "story_ready": story_ready,
-            "story_text": micro_story,
-            "story_images": micro_images,
-        })
+            "job_id": job_id,
+            "status": "queued",
+            "status_url": f"/jobs/{job_id}",
+            "events_url": f"/jobs/{job_id}/events",
+        }), 202
 
     except Exception as e:
         print("[ERROR] /submit failed", traceback.format_exc())
         return jsonify({"error": str(e)}), 500
 
 
+def process_submission(job, entry, meta, ctx):
+    """Worker side of /submit: summarize the media, judge it, then maybe write a story chapter."""
+    session_id, task, media_type = meta["session_id"], meta["task"], meta["media_type"]
+    file_path, text, lat, lon = meta["file"], meta["text"], meta["lat"], meta["lon"]
+
+    # 🗜️ Downscale photos / resample audio before anything reads or keeps the upload
+    if file_path:
+        job.set_stage("prepare")
+        prepared = preprocess_media(file_path, media_type)
+        if prepared["file"] != file_path or prepared["thumbnail"]:
+            file_path = meta["file"] = prepared["file"]
+            meta["thumbnail"] = prepared["thumbnail"]
+            (entry / "meta.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+            SUBMISSIONS.update(session_id, meta["index"], file=file_path, thumbnail=prepared["thumbnail"])
+
+    # 🧩 Create summary for non-text content
+    job.set_stage("summarize")
+    if file_path:
+        media_summary = summarize_media(file_path, media_type)
+    else:
+        media_summary = text or MediaSummary("No submission text provided.", analyzed=False)
+
+    # 🤖 Call judge
+    job.set_stage("judge")
+    judge_result = judge_submission_model(
+        task,
+        media_type,
+        media_summary,
+        file_path,
+        lat,
+        lon,
+        session_id=session_id,
+        context=ctx,
+    )
+
+    if isinstance(judge_result, dict):
+        judge_text = judge_result.get("feedback")
+        fit_score = judge_result.get("fit_score")
+    else:
+        judge_text = judge_result
+        fit_score = None
+
+    meta["judge_text"] = judge_text
+    if fit_score is not None:
+        meta["fit_score"] = fit_score
+    (entry / "meta.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    SUBMISSIONS.update(session_id, meta["index"], judge_text=judge_text, fit_score=fit_score)
+    job.emit("judge", {"judge_text": judge_text, "fit_score": fit_score})
+
+    # 🪄 Log summary
+    print("\n───────────── HOPPI JUDGE SUMMARY ─────────────")
+    print(f"🧩 Session ID: {session_id}")
+    print(f"🕹️ Task: {task[:80]}{'...' if len(task) > 80 else ''}")
+    print(f"📍 Location: lat={lat}, lon={lon}")
+    print(f"📸 Media Type: {media_type}")
+    if text:
+        print(f"📝 Text Preview: {text[:100]}{'...' if len(text) > 100 else ''}")
+    if file_path:
+        print(f"📂 File: {os.path.basename(file_path)}")
+    print(f"🤖 Hoppi Feedback: {judge_text}")
+    if fit_score is not None:
+        print(f"🎯 Fit Score: {fit_score:.2f}")
+    print("───────────────────────────────────────────────\n")
+
+    # --- Micro-narrative: one chapter per CHAPTER_SIZE submissions ---
+    job.set_stage("narrate")
+    micro_story = None
+    micro_images = []
+    story_ready = False
+
+    try:
+        # Stream the text first, then each image as it finishes
+        chapter = get_or_create_chapter(
+            session_id,
+            meta["index"],
+            on_story=lambda story_text, beats: job.emit("story_text", {"story_text": story_text}),
+            on_image=lambda i, image: job.emit("story_image", {"index": i, "image": image}, merge=False),
+        )
+        if chapter:
+            micro_story = chapter.get("story_text")
+            micro_images = chapter.get("images", [])
+            story_ready = True
+    except Exception as e:
+        print("[ERROR] Micro-narrative generation failed:", e)
+
+    job.emit("story", {"story_ready": story_ready, "story_text": micro_story, "story_images": micro_images})
+
+
+def upload_error(e):
+    body = {"error": str(e)}
+    if isinstance(e, OffsetMismatch):
+        body["offset"] = e.offset
+    return jsonify(body), e.status
+
+@app.route("/upload/init", methods=["POST"])
+def upload_init():
+    """Start a chunked upload: creates its (empty) staging file; /submit gives it a submission index."""
+    data = request.get_json(silent=True) or request.form
+    session_id = data.get("session_id") or str(uuid.uuid4())
+    media_type = (data.get("media_type") or "").strip()
+    if not media_type:
+        return jsonify({"error": "Missing media_type"}), 400
+
+    fname = secure_filename(data.get("filename") or "") or f"{media_type}-{now_stamp()}"
+    upload = UPLOADS.create(session_id, fname, media_type)
+    return jsonify({
+        "upload_id": upload.id,
+        "session_id": session_id,
+        "offset": 0,
+        "max_bytes": UPLOADS.max_bytes,
+        "upload_url": f"/upload/{upload.id}",
+    }), 201
+
+@app.route("/upload/<upload_id>", methods=["GET", "PATCH"])
+def upload_chunk(upload_id):
+    """PATCH appends the raw body at `Upload-Offset` (must equal the current size); GET/HEAD report the offset."""
+    try:
+        if request.method == "PATCH":
+            offset = request.headers.get("Upload-Offset", type=int)
+            if offset is None:
+                return jsonify({"error": "Missing Upload-Offset header"}), 400
+            new_offset = UPLOADS.append(upload_id, offset, request.stream)
+            finalized = False
+        else:
+            upload = UPLOADS.get(upload_id)
+            new_offset, finalized = upload.offset, upload.finalized
+        res = jsonify({"offset": new_offset, "finalized": finalized})
+        res.headers["Upload-Offset"] = str(new_offset)
+        res.headers["Cache-Control"] = "no-store"
+        return res
+    except UploadError as e:
+        return upload_error(e)
+
+@app.route("/upload/<upload_id>/finalize", methods=["POST"])
+def upload_finalize(upload_id):
+    data = request.get_json(silent=True) or {}
+    try:
+        upload = UPLOADS.finalize(upload_id, data.get("size"))
+    except UploadError as e:
+        return upload_error(e)
+    return jsonify({"upload_id": upload.id, "size": upload.offset, "blake2b": upload.digest})
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.snapshot())
+
+@app.route("/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    """SSE feed of a job's progress (`judge`, `story`, then `done`/`failed`); replays past events."""
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    cursor = request.headers.get("Last-Event-ID", type=int)
+    cursor = 0 if cursor is None else cursor + 1
+
+    def events():
+        nonlocal cursor
+        while True:
+            batch, finished = job.wait_events(cursor)
+            for ev in batch:
+                yield f"id: {cursor}\n" + sse(ev["event"], ev["data"])
+                cursor += 1
+            if finished and not batch:
+                return
+            if not batch:
+                yield ": keep-alive\n\n"
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 @app.route("/feedback", methods=["POST"])
 def feedback():
     try:
@@ -546,70 +860,127 @@ def feedback():
         if rating == "down" and reason:
             entry["reason"] = reason.strip()
 
-        fname = f"{now_stamp()}_{rating}.txt"
-
-        # Save to /tmp/outputs
-        with open(os.path.join(FEEDBACK_DIR, fname), "w", encoding="utf-8") as f:
-            f.write(f"Rating: {rating}\n")
-            f.write(f"Time: {entry['timestamp']}\n")
-            f.write(f"Prompt: {entry['input']}\n")
-            f.write(f"Task: {entry['output']}\n")
-            if entry.get("reason"):
-                f.write(f"Reason: {entry['reason']}\n")
-
-        # ✅ Immediate copy to feedback_export
-        try:
-            shutil.copyfile(
-                os.path.join(FEEDBACK_DIR, fname),
-                os.path.join(EXPORT_DIR, fname)
-            )
-        except Exception as e:
-            print("Immediate feedback export failed:", e)
+        # Queued for the JSONL writer (which also exports the new lines)
+        feedback_id = FEEDBACK_LOG.append(entry)
 
-        return jsonify({"ok": True})
+        return jsonify({"ok": True, "id": feedback_id})
     except Exception as e:
         print("[ERROR] /feedback failed", traceback.format_exc())
         return jsonify({"error": str(e)}), 500
 
 @app.route("/feedback-logs")
 def list_feedback_logs():
+    """Newest-first feedback, one page at a time (`?limit=&cursor=`); JSON with `?format=json`."""
     try:
-        files = sorted(os.listdir(FEEDBACK_DIR), reverse=True)
-        links = [
-            f'<li><a href="/feedback-logs/{fname}" target="_blank">{fname}</a></li>'
-            for fname in files if fname.endswith(".txt")
+        limit = max(1, min(request.args.get("limit", 50, type=int), 500))
+        try:
+            page = FEEDBACK_LOG.page(request.args.get("cursor"), limit)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if request.args.get("format") == "json":
+            return jsonify(page)
+        rows = [
+            f"<li>{html.escape(e.get('timestamp', ''))} · <b>{html.escape(e.get('rating', ''))}</b> · "
+            f"{html.escape(e.get('output', ''))}"
+            + (f" — <i>{html.escape(e['reason'])}</i>" if e.get("reason") else "") + "</li>"
+            for e in page["items"]
         ]
-        return f"<h3>Feedback Logs</h3><ul>{''.join(links)}</ul>"
+        more = (f'<p><a href="/feedback-logs?limit={limit}&cursor={page["next_cursor"]}">Older →</a></p>'
+                if page["next_cursor"] else "")
+        return f"<h3>Feedback Logs</h3><ul>{''.join(rows)}</ul>{more}"
     except Exception as e:
-        return f"<p>Error: {e}</p>", 500
+        return f"<p>Error: {html.escape(str(e))}</p>", 500
 
 @app.route("/feedback-logs/<filename>")
 def get_feedback(filename):
-    path = os.path.join(FEEDBACK_DIR, filename)
-    if os.path.exists(path):
-        return send_file(path, as_attachment=True)
+    path = safe_join(FEEDBACK_DIR, filename)
+    if path and os.path.isfile(path):
+        # Segments only grow, so the ETag (mtime + size) lets clients revalidate cheaply
+        return serve_media(path, cache_control="no-cache", attachment=True)
     return jsonify({"error": "Not found"}), 404
 
 
 @app.route("/progress/<session_id>", methods=["GET"])
 def progress(session_id: str):
     try:
-        sdir = ensure_session_dir(session_id)
-        total = len([p for p in sdir.iterdir() if p.is_dir() and p.name.isdigit()])
+        total = SUBMISSIONS.count(session_id)
         return jsonify({"count": total, "remaining": max(0, 5 - total), "surprise_ready": total >= 5})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/novelty", methods=["POST"])
+def novelty_score():
+    """How close `text` is to tasks recently issued to this session and/or location."""
+    data = request.get_json(force=True, silent=True) or {}
+    text = (data.get("text") or "").strip()
+    if not text:
+        return jsonify({"error": "text required"}), 400
+    lat, lon = data.get("latitude"), data.get("longitude")
+    if lat is not None or lon is not None:
+        try:
+            lat, lon = float(lat), float(lon)
+        except (TypeError, ValueError):
+            return jsonify({"error": "latitude and longitude must both be numbers"}), 400
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            return jsonify({"error": "latitude/longitude out of range"}), 400
+    scopes = NOVELTY.scopes_for(data.get("session_id"), lat, lon)
+    if not scopes:
+        return jsonify({"error": "session_id or latitude/longitude required"}), 400
+    result = NOVELTY.similarity(text, scopes)
+    return jsonify({**result, "novel": result["score"] < NOVELTY.threshold, "threshold": NOVELTY.threshold})
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return jsonify({"geo_cache": GEO_CACHE.stats(), "upstreams": outbound.stats(), "task_pool": TASK_POOL.stats(),
+                    "story_store": STORY_STORE.stats(), "media": MEDIA_SERVICE.stats(), "llm": llm.GATEWAY.stats(),
+                    "prompt_cache": PROMPT_CACHE.stats(), "prompts": prompts.stats(),
+                    "judge_batch": JUDGE_BATCHER.stats() if JUDGE_BATCHER is not None else None, "novelty": NOVELTY.stats()})
+
+
+def serve_media(path, cache_control, accel_uri=None, mimetype=None, attachment=False):
+    """
+    Send a file with Range, ETag/If-None-Match and Last-Modified handling (206/304 come from
+    werkzeug's conditional responses). With `accel_uri`, nginx streams the bytes instead.
+    """
+    if accel_uri:
+        res = Response(mimetype=mimetype or mimetypes.guess_type(path)[0] or "application/octet-stream")
+        res.headers["X-Accel-Redirect"] = accel_uri
+    else:
+        res = send_file(path, mimetype=mimetype, as_attachment=attachment, conditional=True, etag=True)
+    if attachment and accel_uri:
+        res.headers["Content-Disposition"] = f'attachment; filename="{os.path.basename(path)}"'
+    res.headers["Cache-Control"] = cache_control
+    res.headers["Accept-Ranges"] = "bytes"
+    return res
+
+
+def _is_internal(rel_path):
+    """Store files and upload bookkeeping live under UPLOAD_FOLDER too but are never served."""
+    parts = rel_path.replace("\\", "/").split("/")
+    return any(p.startswith(".") for p in parts) or rel_path.endswith((".db", ".db-wal", ".db-shm"))
+
+
 @app.route('/download/<path:filename>')
 def download_file(filename):
+    """Media playback/download: inline by default (seekable), `?dl=1` for an attachment."""
     try:
-        path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        if os.path.exists(path):
-            return send_file(path, as_attachment=True)
+        attachment = request.args.get("dl") == "1"
+        # Story images are content-addressed, so a given URL never changes and can be cached forever
+        if filename.startswith("story/"):
+            name = filename[len("story/"):]
+            path = STORY_STORE.open(name)
+            if path is None:
+                return jsonify({'error':'File not found'}), 404
+            accel = f"{ACCEL_STORY_PREFIX.rstrip('/')}/{name[:2]}/{name}" if ACCEL_STORY_PREFIX else None
+            return serve_media(path, IMMUTABLE_CACHE_CONTROL, accel, mimetype="image/png", attachment=attachment)
+        path = safe_join(app.config['UPLOAD_FOLDER'], filename)
+        if path and not _is_internal(filename) and os.path.isfile(path):
+            accel = f"{ACCEL_UPLOADS_PREFIX.rstrip('/')}/{filename}" if ACCEL_UPLOADS_PREFIX else None
+            return serve_media(path, UPLOAD_CACHE_CONTROL, accel, attachment=attachment)
         return jsonify({'error':'File not found'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-        
+
 
 if __name__ == "__main__":
     # On local runs you can override PORT; HF sets PORT automatically.
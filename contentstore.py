@@ -0,0 +1,114 @@
+# /app/contentstore.py
+# Content-addressed blob store: generated artifacts are saved once under the hash of the inputs
+# that produced them (model, prompt, size, ...), evicted least-recently-used past a size cap.
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+_NAME_RE = re.compile(r"^[0-9a-f]{64}\.[a-z0-9]{1,8}$")
+
+
+def content_key(*parts) -> str:
+    """Stable hex digest of the inputs (any JSON-serialisable values)."""
+    blob = json.dumps(parts, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ContentStore:
+    """
+    Files live at `<root>/<key[:2]>/<key>.<ext>`. Writes are atomic (temp file + rename), reads
+    bump recency, and once the store grows past `max_bytes` the least recently used blobs go first.
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self._lru = OrderedDict()   # name -> size, oldest first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+        self._scan()
+
+    def _scan(self):
+        os.makedirs(self.root, exist_ok=True)
+        found = []
+        for shard in os.listdir(self.root):
+            shard_dir = os.path.join(self.root, shard)
+            if not os.path.isdir(shard_dir):
+                continue
+            for name in os.listdir(shard_dir):
+                if _NAME_RE.match(name):
+                    st = os.stat(os.path.join(shard_dir, name))
+                    found.append((st.st_mtime, name, st.st_size))
+        for _, name, size in sorted(found):
+            self._lru[name] = size
+            self._bytes += size
+
+    def path_for(self, name):
+        """Absolute path of a stored blob name (`<key>.<ext>`), or None if the name isn't one of ours."""
+        if not _NAME_RE.match(name or ""):
+            return None
+        return os.path.join(self.root, name[:2], name)
+
+    def get(self, key, ext):
+        """Path of the stored blob, or None. Counts a hit/miss."""
+        name = f"{key}.{ext}"
+        with self._lock:
+            if name not in self._lru:
+                self.misses += 1
+                return None
+            self._lru.move_to_end(name)
+            self.hits += 1
+        path = self.path_for(name)
+        try:
+            os.utime(path)  # recency survives restarts
+        except OSError:
+            with self._lock:
+                self._bytes -= self._lru.pop(name, 0)
+            return None
+        return path
+
+    def open(self, name):
+        """Path for serving a stored blob by name, or None; bumps recency like get()."""
+        key, _, ext = (name or "").partition(".")
+        return self.get(key, ext) if self.path_for(name) else None
+
+    def put(self, key, ext, data: bytes):
+        name = f"{key}.{ext}"
+        path = self.path_for(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            self._bytes += len(data) - self._lru.pop(name, 0)
+            self._lru[name] = len(data)
+            self._evict()
+        return path
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and len(self._lru) > 1:
+            name, size = self._lru.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self.path_for(name))
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "blobs": len(self._lru),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,86 @@
+# /app/envcontext.py
+# Concurrent environmental-context fan-out (location type, weather, POIs, sun cycle)
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+# Bounded pool shared by every request; each lookup is I/O-bound so a few threads go a long way
+CONTEXT_WORKERS = int(os.getenv("CONTEXT_WORKERS", "8"))
+# One overall deadline (seconds) for the whole fan-out, not per source
+CONTEXT_DEADLINE = float(os.getenv("CONTEXT_DEADLINE", "10"))
+
+_executor = ThreadPoolExecutor(max_workers=CONTEXT_WORKERS, thread_name_prefix="hoppi-ctx")
+
+
+def _resolve(fallback):
+    return fallback() if callable(fallback) else fallback
+
+
+def gather_context(sources, deadline=None):
+    """
+    Run every lookup in `sources` concurrently and return one context dict.
+    `sources` maps a context key to (lookup, fallback); `lookup` is a zero-arg callable and
+    `fallback` is a value (or zero-arg callable) used when the lookup raises or misses the deadline.
+    """
+    deadline = CONTEXT_DEADLINE if deadline is None else deadline
+    started = time.monotonic()
+    futures = {name: _executor.submit(lookup) for name, (lookup, _) in sources.items()}
+    wait(futures.values(), timeout=deadline)
+
+    context = {}
+    for name, fut in futures.items():
+        fallback = sources[name][1]
+        if not fut.done():
+            fut.cancel()  # only helps if it never started; running lookups finish on their own
+            print(f"[WARN] Context source '{name}' missed the {deadline:.1f}s deadline; using fallback")
+            context[name] = _resolve(fallback)
+            continue
+        try:
+            context[name] = fut.result()
+        except Exception as e:
+            print(f"[ERROR] Context source '{name}' failed: {e}")
+            context[name] = _resolve(fallback)
+
+    print(f"[DEBUG] Context gathered in {time.monotonic() - started:.2f}s: {sorted(context)}")
+    return context
+
+
+# --- Signed context tokens: let /submit reuse what /generate-task already resolved ---
+CONTEXT_TOKEN_MAX_AGE = int(os.getenv("CONTEXT_TOKEN_MAX_AGE", "1800"))
+TOKEN_KEYS = ("location_type", "weather_hint", "day_period")
+# How far (degrees) the submit coordinates may drift from the task's before we recompute (~1 km)
+TOKEN_MAX_DRIFT = 0.01
+
+
+def _serializer(secret):
+    return URLSafeTimedSerializer(secret, salt="hoppi-context")
+
+
+def issue_context_token(ctx, lat, lon, secret):
+    """Sign the reusable part of `ctx` (no nearby places) together with the coordinates it was resolved for."""
+    payload = {k: ctx.get(k) for k in TOKEN_KEYS}
+    payload["lat"], payload["lon"] = lat, lon
+    return _serializer(secret).dumps(payload)
+
+
+def read_context_token(token, lat, lon, secret, max_age=None):
+    """Return the signed context, or None if the token is missing, tampered, expired or for another spot."""
+    if not token:
+        return None
+    try:
+        payload = _serializer(secret).loads(token, max_age=max_age or CONTEXT_TOKEN_MAX_AGE)
+    except SignatureExpired:
+        print("[DEBUG] Context token expired; recomputing context")
+        return None
+    except BadSignature:
+        print("[WARN] Invalid context token; recomputing context")
+        return None
+    if lat is not None and lon is not None:
+        try:
+            if abs(payload["lat"] - lat) > TOKEN_MAX_DRIFT or abs(payload["lon"] - lon) > TOKEN_MAX_DRIFT:
+                return None
+        except (KeyError, TypeError):
+            return None
+    return {k: payload.get(k) for k in TOKEN_KEYS}
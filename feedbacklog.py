@@ -0,0 +1,183 @@
+# /app/feedbacklog.py
+# Append-only, rotated JSONL sink for thumbs up/down feedback. A background thread batches writes,
+# and exports copy only the bytes appended since the last export (tracked as per-segment offsets).
+import json
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+
+FEEDBACK_ROTATE_BYTES = int(os.getenv("FEEDBACK_ROTATE_BYTES", str(5 * 1024 * 1024)))
+FEEDBACK_FLUSH_INTERVAL = float(os.getenv("FEEDBACK_FLUSH_INTERVAL", "1.0"))   # seconds between batches
+_SEGMENT_RE = re.compile(r"^feedback-(\d{6})\.jsonl$")
+_OFFSETS_FILE = ".export-offsets.json"
+READ_BLOCK = 64 * 1024   # pages are read backwards from the cursor in blocks of this size
+
+
+def segment_name(n):
+    return f"feedback-{n:06d}.jsonl"
+
+
+class FeedbackLog:
+    """
+    `append(entry)` returns immediately with the entry's id; the writer thread appends it to the
+    current segment, rotating to a new one past `rotate_bytes`. `page()` reads newest-first from
+    the tail segments only, so listing cost doesn't grow with the number of ratings.
+    """
+
+    def __init__(self, directory, export_dir=None, rotate_bytes=FEEDBACK_ROTATE_BYTES,
+                 flush_interval=FEEDBACK_FLUSH_INTERVAL):
+        self.directory = directory
+        self.export_dir = export_dir
+        self.rotate_bytes = rotate_bytes
+        self.flush_interval = flush_interval
+        os.makedirs(directory, exist_ok=True)
+        # One directory listing at startup to find the active segment; never per request
+        numbers = [int(m.group(1)) for m in map(_SEGMENT_RE.match, os.listdir(directory)) if m]
+        self.segment = max(numbers, default=1)
+        self._queue = queue.Queue()
+        self._export_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="hoppi-feedback", daemon=True)
+        self._thread.start()
+
+    def path_for(self, n):
+        return os.path.join(self.directory, segment_name(n))
+
+    # --- writing ---
+    def append(self, entry):
+        entry = dict(entry, id=uuid.uuid4().hex)
+        self._queue.put(entry)
+        return entry["id"]
+
+    def _run(self):
+        while True:
+            # Whatever arrives within flush_interval of the first entry goes out in one write
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            try:
+                while (remaining := deadline - time.monotonic()) > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                pass
+            try:
+                self._write(batch)
+                self.export()
+            except Exception as e:
+                print("[ERROR] Feedback write failed:", e)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch):
+        path = self.path_for(self.segment)
+        if os.path.exists(path) and os.path.getsize(path) >= self.rotate_bytes:
+            self.segment += 1
+            path = self.path_for(self.segment)
+        data = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in batch)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(data)
+
+    def flush(self):
+        """Block until every appended entry is on disk (and exported)."""
+        self._queue.join()
+
+    # --- incremental export ---
+    def export(self):
+        """Copy bytes appended since the last export into `export_dir`, segment by segment."""
+        if not self.export_dir:
+            return 0
+        with self._export_lock:
+            os.makedirs(self.export_dir, exist_ok=True)
+            offsets_path = os.path.join(self.export_dir, _OFFSETS_FILE)
+            try:
+                with open(offsets_path, "r", encoding="utf-8") as f:
+                    offsets = json.load(f)
+            except (OSError, ValueError):
+                offsets = {}
+            copied = 0
+            # Earlier segments are closed once rotated, so resume from the oldest one not fully copied
+            n = min((int(_SEGMENT_RE.match(k).group(1)) for k in offsets if _SEGMENT_RE.match(k)),
+                    default=1)
+            for n in range(n, self.segment + 1):
+                name = segment_name(n)
+                src = self.path_for(n)
+                if not os.path.exists(src):
+                    continue
+                start = offsets.get(name, 0)
+                size = os.path.getsize(src)
+                if size > start:
+                    with open(src, "rb") as fin, open(os.path.join(self.export_dir, name), "ab") as fout:
+                        fin.seek(start)
+                        fout.write(fin.read(size - start))
+                    copied += size - start
+                offsets[name] = size
+            # Keep just the newest segment's offset; older ones are complete
+            offsets = {segment_name(self.segment): offsets.get(segment_name(self.segment), 0)}
+            tmp = offsets_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(offsets, f)
+            os.replace(tmp, offsets_path)
+            return copied
+
+    def close(self):
+        self.flush()
+        self.export()
+
+    # --- reading ---
+    @staticmethod
+    def _tail_lines(path, end, count):
+        """
+        Up to `count` complete lines ending at byte `end` (None = end of file), read backwards a block
+        at a time. Returns (lines oldest first, byte offset where the first of them starts).
+        """
+        with open(path, "rb") as f:
+            pos = f.seek(0, os.SEEK_END) if end is None else end
+            buf = b""
+            # count+1 newlines guarantee `count` whole lines after the (maybe partial) first piece
+            while pos > 0 and buf.count(b"\n") <= count:
+                step = min(READ_BLOCK, pos)
+                pos -= step
+                f.seek(pos)
+                buf = f.read(step) + buf
+        buf = buf[:buf.rfind(b"\n") + 1]   # drop a trailing partial write
+        pieces = buf.split(b"\n")[:-1]
+        start = pos
+        if pos > 0:
+            start += len(pieces[0]) + 1   # began before the bytes we read
+            pieces = pieces[1:]
+        skipped = pieces[:-count] if len(pieces) > count else []
+        start += sum(len(p) + 1 for p in skipped)
+        return pieces[len(skipped):], start
+
+    def page(self, cursor=None, limit=50):
+        """
+        Newest-first page of entries. `cursor` is the opaque string from a previous page's
+        `next_cursor` ("<segment>:<byte offset>"); returns {"items": [...], "next_cursor": str|None}.
+        Reads only about `limit` lines back from the offset, however big the segment is.
+        """
+        if cursor:
+            seg, _, end = cursor.partition(":")
+            if not (seg.isdigit() and end.isdigit()):
+                raise ValueError(f"Malformed cursor: {cursor[:40]!r}")
+            seg, end = int(seg), int(end)
+            if not 1 <= seg <= self.segment:
+                raise ValueError(f"Cursor segment out of range: {seg}")
+            if os.path.exists(self.path_for(seg)) and end > os.path.getsize(self.path_for(seg)):
+                raise ValueError(f"Cursor offset past the end of segment {seg}")
+        else:
+            seg, end = self.segment, None
+        items = []
+        while seg >= 1 and len(items) < limit:
+            path = self.path_for(seg)
+            if not os.path.exists(path):
+                seg, end = seg - 1, None
+                continue
+            lines, start = self._tail_lines(path, end, limit - len(items))
+            items.extend(json.loads(line) for line in reversed(lines))
+            if start > 0:
+                return {"items": items, "next_cursor": f"{seg}:{start}"}
+            seg, end = seg - 1, None
+        return {"items": items, "next_cursor": f"{seg}:{os.path.getsize(self.path_for(seg))}"
+                if seg >= 1 and os.path.exists(self.path_for(seg)) else None}
@@ -5,7 +5,8 @@ warnings.filterwarnings("ignore")
 import os
 import textwrap
 from dotenv import load_dotenv
-from together import Together
+
+import llm
 
 # Load environment variables (for local dev)
 load_dotenv()
@@ -14,18 +15,19 @@ TOGETHER_API_KEY = os.getenv("TOGETHER_API_KEY", "").strip()
 # 🧩 ADD THIS DEBUG LINE HERE:
 print(f"[DEBUG] TOGETHER_API_KEY exists: {bool(TOGETHER_API_KEY)}")
 
-client = Together(api_key=TOGETHER_API_KEY)
-
 def prompt_llm(prompt, with_linebreak=False):
-    model = "openai/gpt-oss-20b"
+    model = llm.TEXT_MODEL
     print(f"[DEBUG] Sending prompt to Together API (model={model})")
 
-    response = client.chat.completions.create(
-        model=model,
-        messages=[{"role": "user", "content": prompt}],
-    )
-
-    output = response.choices[0].message.content
+    output = llm.complete(prompt, model)
     print(f"[DEBUG] LLM response received: {output[:80]}...")  # shorten for logs
 
     return textwrap.fill(output, width=50) if with_linebreak else output
+
+
+def prompt_llm_stream(prompt):
+    """Same call as prompt_llm, but yields text deltas as the model produces them."""
+    model = llm.TEXT_MODEL
+    print(f"[DEBUG] Streaming prompt to Together API (model={model})")
+
+    yield from llm.stream(prompt, model)
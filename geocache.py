@@ -0,0 +1,174 @@
+# /app/geocache.py
+# Geo-bucketed TTL cache for weather, reverse geocode and POI lookups
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# source -> geohash precision (cell size), TTL seconds, max in-memory entries
+#   precision 5 ≈ 4.9×4.9 km, 7 ≈ 153×153 m
+DEFAULT_POLICIES = {
+    "weather":       {"precision": 5, "ttl": 10 * 60,           "max_entries": 2000},
+    "location_type": {"precision": 7, "ttl": 21 * 24 * 3600,    "max_entries": 20000},
+    "places":        {"precision": 7, "ttl": 14 * 24 * 3600,    "max_entries": 5000},
+}
+
+
+def geohash(lat: float, lon: float, precision: int = 7) -> str:
+    """Standard base32 geohash of (lat, lon)."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    out, bits, ch, even = [], 0, 0, True
+    while len(out) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                ch = (ch << 1) | 1; lon_lo = mid
+            else:
+                ch <<= 1; lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                ch = (ch << 1) | 1; lat_lo = mid
+            else:
+                ch <<= 1; lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            out.append(_BASE32[ch])
+            bits, ch = 0, 0
+    return "".join(out)
+
+
+class GeoCache:
+    """
+    Per-source LRU + TTL cache keyed on a geohash cell, with optional SQLite write-through
+    so entries survive restarts. Values must be JSON-serialisable.
+    """
+
+    def __init__(self, policies=None, path=None):
+        self.policies = {k: dict(v) for k, v in (policies or DEFAULT_POLICIES).items()}
+        self._entries = {name: OrderedDict() for name in self.policies}
+        self._counters = {name: {"hits": 0, "misses": 0} for name in self.policies}
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._open_disk(path)
+
+    # --- disk backing ---
+    def _open_disk(self, path):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS geo_cache ("
+                " source TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires REAL NOT NULL,"
+                " PRIMARY KEY (source, key))"
+            )
+            self._db.execute("DELETE FROM geo_cache WHERE expires < ?", (time.time(),))
+            self._db.commit()
+        except Exception as e:
+            print(f"[WARN] Geo cache disk backing disabled ({path}): {e}")
+            self._db = None
+
+    def _disk_get(self, source, key):
+        if self._db is None:
+            return None
+        row = self._db.execute(
+            "SELECT value, expires FROM geo_cache WHERE source = ? AND key = ?", (source, key)
+        ).fetchone()
+        if row and row[1] > time.time():
+            return json.loads(row[0]), row[1]
+        return None
+
+    def _disk_put(self, source, key, value, expires):
+        if self._db is None:
+            return
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO geo_cache (source, key, value, expires) VALUES (?, ?, ?, ?)",
+                (source, key, json.dumps(value), expires),
+            )
+            self._db.commit()
+        except Exception as e:
+            print(f"[WARN] Geo cache disk write failed: {e}")
+
+    # --- public API ---
+    def key_for(self, source, lat, lon, extra=""):
+        cell = geohash(float(lat), float(lon), self.policies[source]["precision"])
+        return f"{cell}|{extra}" if extra else cell
+
+    def get(self, source, lat, lon, extra=""):
+        """Return the cached value or None (counts a hit/miss)."""
+        key = self.key_for(source, lat, lon, extra)
+        now = time.time()
+        with self._lock:
+            entries = self._entries[source]
+            item = entries.get(key)
+            if item is not None and item[1] <= now:
+                del entries[key]
+                item = None
+            if item is None:
+                item = self._disk_get(source, key)
+                if item is not None:
+                    self._store(source, key, item[0], item[1])
+            if item is None:
+                self._counters[source]["misses"] += 1
+                return None
+            entries.move_to_end(key)
+            self._counters[source]["hits"] += 1
+            return item[0]
+
+    def put(self, source, lat, lon, value, extra=""):
+        key = self.key_for(source, lat, lon, extra)
+        expires = time.time() + self.policies[source]["ttl"]
+        with self._lock:
+            self._store(source, key, value, expires)
+            self._disk_put(source, key, value, expires)
+
+    def _store(self, source, key, value, expires):
+        entries = self._entries[source]
+        entries[key] = (value, expires)
+        entries.move_to_end(key)
+        while len(entries) > self.policies[source]["max_entries"]:
+            entries.popitem(last=False)
+
+    def get_or_load(self, source, lat, lon, loader, extra=""):
+        """
+        Return the cached value for the cell, calling `loader()` on a miss.
+        Exceptions from `loader` propagate and are never cached, so callers keep their own fallbacks.
+        """
+        if lat is None or lon is None:
+            return loader()
+        value = self.get(source, lat, lon, extra)
+        if value is None:
+            value = loader()
+            self.put(source, lat, lon, value, extra)
+        return value
+
+    def clear(self):
+        with self._lock:
+            for entries in self._entries.values():
+                entries.clear()
+            for c in self._counters.values():
+                c["hits"] = c["misses"] = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM geo_cache")
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            out = {}
+            for name, c in self._counters.items():
+                total = c["hits"] + c["misses"]
+                out[name] = {
+                    "hits": c["hits"],
+                    "misses": c["misses"],
+                    "hit_rate": round(c["hits"] / total, 3) if total else 0.0,
+                    "size": len(self._entries[name]),
+                }
+            return out
@@ -0,0 +1,316 @@
+# /app/geoindex.py
+# Local spatial indexes (SQLite R*Tree, memory-mapped) that stand in for Overpass/Nominatim lookups
+#
+# Build once from a preprocessed OSM extract, then point the app at the file:
+#   python geoindex.py build-pois extract.csv /data/pois.sqlite
+#   python geoindex.py build-landuse landuse.geojson /data/landuse.sqlite
+#   POI_INDEX_PATH=/data/pois.sqlite LANDUSE_INDEX_PATH=/data/landuse.sqlite python app.py
+import csv
+import json
+import math
+import os
+import sqlite3
+import sys
+import threading
+
+# (OSM key, value) pairs we care about — the Overpass query in app.py is built from the same list
+POI_TAGS = [
+    ("leisure", "park"), ("leisure", "playground"),
+    ("amenity", "cafe"), ("amenity", "restaurant"), ("amenity", "fast_food"),
+    ("amenity", "bar"), ("amenity", "pub"),
+    ("shop", "mall"), ("shop", "supermarket"), ("shop", "convenience"),
+    ("amenity", "library"), ("amenity", "school"), ("amenity", "university"),
+    ("amenity", "hospital"), ("amenity", "clinic"),
+    ("amenity", "bus_station"), ("amenity", "train_station"),
+    ("tourism", "museum"), ("tourism", "art_gallery"),
+    ("leisure", "sports_centre"), ("leisure", "fitness_centre"),
+    ("amenity", "place_of_worship"), ("amenity", "marketplace"), ("amenity", "theatre"),
+    ("tourism", "hotel"),
+]
+POI_CATEGORIES = {value for _, value in POI_TAGS}
+# Same precedence Overpass results are categorised with
+CATEGORY_KEYS = ("amenity", "shop", "leisure", "tourism")
+
+# OSM tags → the location types get_location_type returns. Commercial zones map to 'street' so a
+# downtown hit is still a definitive local answer that skips Nominatim.
+LANDUSE_TAGS = [
+    ("natural", "beach", "beach"), ("natural", "coastline", "beach"),
+    ("leisure", "park", "park"), ("leisure", "garden", "park"), ("leisure", "nature_reserve", "park"),
+    ("landuse", "forest", "park"), ("natural", "wood", "park"), ("landuse", "recreation_ground", "park"),
+    ("amenity", "restaurant", "restaurant"), ("amenity", "cafe", "restaurant"),
+    ("shop", "mall", "mall"), ("landuse", "retail", "mall"),
+    ("landuse", "commercial", "street"), ("landuse", "residential", "street"),
+]
+LOCATION_TYPES = {"beach", "park", "restaurant", "mall", "street"}
+# Coastlines are lines, not areas: count points within this distance as 'beach'
+COAST_BUFFER_M = float(os.getenv("COAST_BUFFER_M", "150"))
+
+EARTH_RADIUS_M = 6371008.8
+MMAP_BYTES = int(os.getenv("GEOINDEX_MMAP_BYTES", str(256 * 1024 * 1024)))
+
+
+def haversine_m(lat1, lon1, lat2, lon2) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def bbox(lat, lon, radius_m):
+    """(min_lat, max_lat, min_lon, max_lon) enclosing a circle of `radius_m` around the point."""
+    dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+    dlon = math.degrees(radius_m / (EARTH_RADIUS_M * max(math.cos(math.radians(lat)), 1e-6)))
+    return lat - dlat, lat + dlat, lon - dlon, lon + dlon
+
+
+class _SqliteIndex:
+    """Read-only, memory-mapped SQLite file with one connection per thread."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._conn()  # fail fast if the file is unusable
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            conn.execute(f"PRAGMA mmap_size={MMAP_BYTES}")
+            self._local.conn = conn
+        return conn
+
+    @classmethod
+    def open_if_configured(cls, path):
+        """Open the index at `path`, or return None when unset/missing so callers use the online API."""
+        if not path:
+            return None
+        try:
+            index = cls(path)
+            print(f"[INFO] Loaded {cls.__name__} from {path} ({len(index)} rows)")
+            return index
+        except Exception as e:
+            print(f"[WARN] Could not open {cls.__name__} at {path}: {e}")
+            return None
+
+
+class PoiIndex(_SqliteIndex):
+    """Radius queries over preprocessed POIs, returning the same records as the Overpass path."""
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM pois").fetchone()[0]
+
+    def nearby(self, lat, lon, radius=500):
+        lat, lon = float(lat), float(lon)
+        min_lat, max_lat, min_lon, max_lon = bbox(lat, lon, radius)
+        rows = self._conn().execute(
+            "SELECT p.name, p.category, p.lat, p.lon FROM poi_rtree r JOIN pois p ON p.id = r.id"
+            " WHERE r.min_lat <= ? AND r.max_lat >= ? AND r.min_lon <= ? AND r.max_lon >= ?",
+            (max_lat, min_lat, max_lon, min_lon),
+        ).fetchall()
+        out = []
+        for name, category, plat, plon in rows:
+            if haversine_m(lat, lon, plat, plon) <= radius:
+                out.append({"name": name or "Unknown place", "category": category, "lat": plat, "lon": plon})
+        return out
+
+
+def _point_in_ring(lat, lon, ring):
+    """Ray casting; `ring` is a GeoJSON ring of [lon, lat] pairs."""
+    inside = False
+    j = len(ring) - 1
+    for i in range(len(ring)):
+        xi, yi = ring[i][0], ring[i][1]
+        xj, yj = ring[j][0], ring[j][1]
+        if (yi > lat) != (yj > lat) and lon < (xj - xi) * (lat - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+
+def _point_in_polygons(lat, lon, polygons):
+    """`polygons` is a MultiPolygon coordinate list: outer ring first, then holes."""
+    for rings in polygons:
+        if rings and _point_in_ring(lat, lon, rings[0]) and not any(_point_in_ring(lat, lon, h) for h in rings[1:]):
+            return True
+    return False
+
+
+def _distance_to_lines_m(lat, lon, lines):
+    """Shortest distance from the point to any segment, on a local equirectangular projection."""
+    kx = math.radians(1) * EARTH_RADIUS_M * math.cos(math.radians(lat))
+    ky = math.radians(1) * EARTH_RADIUS_M
+    best = float("inf")
+    for line in lines:
+        for (x1, y1), (x2, y2) in zip(line, line[1:]):
+            ax, ay = (x1 - lon) * kx, (y1 - lat) * ky
+            bx, by = (x2 - lon) * kx, (y2 - lat) * ky
+            dx, dy = bx - ax, by - ay
+            seg = dx * dx + dy * dy
+            t = 0.0 if seg == 0 else max(0.0, min(1.0, -(ax * dx + ay * dy) / seg))
+            best = min(best, math.hypot(ax + t * dx, ay + t * dy))
+    return best
+
+
+class LanduseIndex(_SqliteIndex):
+    """Point-in-polygon location-type classifier over precomputed landuse zones."""
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM zones").fetchone()[0]
+
+    def classify(self, lat, lon):
+        """Return the location type of the most specific (smallest) zone containing the point, or None."""
+        lat, lon = float(lat), float(lon)
+        rows = self._conn().execute(
+            "SELECT z.class, z.kind, z.geom FROM zone_rtree r JOIN zones z ON z.id = r.id"
+            " WHERE r.min_lat <= ? AND r.max_lat >= ? AND r.min_lon <= ? AND r.max_lon >= ?"
+            " ORDER BY z.area",
+            (lat, lat, lon, lon),
+        ).fetchall()
+        for cls, kind, geom in rows:
+            coords = json.loads(geom)
+            if kind == "line":
+                if _distance_to_lines_m(lat, lon, coords) <= COAST_BUFFER_M:
+                    return cls
+            elif _point_in_polygons(lat, lon, coords):
+                return cls
+        return None
+
+
+# --- builders ---
+def _read_rows(src):
+    """Yield dict rows from a CSV, Parquet (needs pyarrow) or SQLite (table `pois`) extract."""
+    ext = os.path.splitext(src)[1].lower()
+    if ext == ".csv":
+        with open(src, newline="", encoding="utf-8") as f:
+            yield from csv.DictReader(f)
+    elif ext == ".parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Reading Parquet extracts requires pyarrow (pip install pyarrow)")
+        for batch in pq.ParquetFile(src).iter_batches():
+            yield from batch.to_pylist()
+    elif ext in (".sqlite", ".db"):
+        conn = sqlite3.connect(src)
+        conn.row_factory = sqlite3.Row
+        for row in conn.execute("SELECT * FROM pois"):
+            yield dict(row)
+        conn.close()
+    else:
+        raise SystemExit(f"Unsupported extract format: {ext}")
+
+
+def _poi_category(row):
+    category = row.get("category")
+    if not category:
+        category = next((row[k] for k in CATEGORY_KEYS if row.get(k)), None)
+    return category
+
+
+def build_poi_index(src, dst) -> int:
+    """Turn a raw extract (name, lat, lon + category or OSM key columns) into an R*Tree index file."""
+    tmp = dst + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    conn = sqlite3.connect(tmp)
+    conn.executescript(
+        "CREATE TABLE pois (id INTEGER PRIMARY KEY, name TEXT, category TEXT NOT NULL,"
+        " lat REAL NOT NULL, lon REAL NOT NULL);"
+        "CREATE VIRTUAL TABLE poi_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon);"
+    )
+    count = 0
+    for row in _read_rows(src):
+        category = _poi_category(row)
+        if category not in POI_CATEGORIES:
+            continue
+        try:
+            lat, lon = float(row["lat"]), float(row["lon"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        count += 1
+        conn.execute("INSERT INTO pois VALUES (?, ?, ?, ?, ?)", (count, row.get("name") or None, category, lat, lon))
+        conn.execute("INSERT INTO poi_rtree VALUES (?, ?, ?, ?, ?)", (count, lat, lat, lon, lon))
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+    os.replace(tmp, dst)
+    return count
+
+
+def _landuse_class(props):
+    cls = props.get("class")
+    if cls in LOCATION_TYPES:
+        return cls
+    return next((c for key, value, c in LANDUSE_TAGS if props.get(key) == value), None)
+
+
+def _ring_area_deg2(ring):
+    return abs(sum(x1 * y2 - x2 * y1 for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1]))) / 2
+
+
+def build_landuse_index(src, dst) -> int:
+    """
+    Turn a GeoJSON FeatureCollection of landuse areas (Polygon/MultiPolygon) and coastlines
+    (LineString/MultiLineString) into an R*Tree-backed classifier file. Features carry either a
+    `class` property or raw OSM tags (leisure=park, natural=beach, landuse=retail, ...).
+    """
+    with open(src, encoding="utf-8") as f:
+        features = json.load(f).get("features", [])
+    tmp = dst + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    conn = sqlite3.connect(tmp)
+    conn.executescript(
+        "CREATE TABLE zones (id INTEGER PRIMARY KEY, class TEXT NOT NULL, kind TEXT NOT NULL,"
+        " geom TEXT NOT NULL, area REAL NOT NULL);"
+        "CREATE VIRTUAL TABLE zone_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon);"
+    )
+    count = 0
+    for feat in features:
+        cls = _landuse_class(feat.get("properties") or {})
+        geometry = feat.get("geometry") or {}
+        gtype, coords = geometry.get("type"), geometry.get("coordinates")
+        if cls is None or not coords:
+            continue
+        if gtype == "Polygon":
+            kind, parts = "polygon", [coords]
+        elif gtype == "MultiPolygon":
+            kind, parts = "polygon", coords
+        elif gtype == "LineString":
+            kind, parts = "line", [coords]
+        elif gtype == "MultiLineString":
+            kind, parts = "line", coords
+        else:
+            continue
+        points = [pt for part in parts for pt in (part[0] if kind == "polygon" else part)]
+        min_lon, max_lon = min(p[0] for p in points), max(p[0] for p in points)
+        min_lat, max_lat = min(p[1] for p in points), max(p[1] for p in points)
+        if kind == "line":
+            # Grow the box by the coast buffer so nearby points still hit the R*Tree
+            min_lat, _, min_lon, _ = bbox(min_lat, min_lon, COAST_BUFFER_M)
+            _, max_lat, _, max_lon = bbox(max_lat, max_lon, COAST_BUFFER_M)
+            area = 0.0
+        else:
+            area = sum(_ring_area_deg2(rings[0]) for rings in parts)
+        count += 1
+        conn.execute("INSERT INTO zones VALUES (?, ?, ?, ?, ?)", (count, cls, kind, json.dumps(parts), area))
+        conn.execute("INSERT INTO zone_rtree VALUES (?, ?, ?, ?, ?)", (count, min_lat, max_lat, min_lon, max_lon))
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+    os.replace(tmp, dst)
+    return count
+
+
+def main(argv):
+    commands = {"build-pois": build_poi_index, "build-landuse": build_landuse_index}
+    if len(argv) != 3 or argv[0] not in commands:
+        print(f"usage: python geoindex.py {{{'|'.join(commands)}}} <extract> <index-file>")
+        return 2
+    n = commands[argv[0]](argv[1], argv[2])
+    print(f"Wrote {n} rows to {argv[2]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,129 @@
+# /app/jobs.py
+# Background job pipeline: requests enqueue work and return a job id right away; a bounded worker
+# pool runs it and clients follow progress by polling (/jobs/<id>) or SSE (/jobs/<id>/events).
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_HISTORY = int(os.getenv("JOB_HISTORY", "1000"))   # finished jobs kept for polling
+
+
+class Job:
+    def __init__(self, job_id, key=None):
+        self.id = job_id
+        self.key = key
+        self.status = "queued"       # queued → running → done | failed
+        self.stage = None
+        self.result = {}
+        self.events = []             # [{"event": name, "data": {...}}], replayed to late SSE subscribers
+        self.error = None
+        self.created = self.updated = time.time()
+        self._cond = threading.Condition()
+
+    def emit(self, event, data=None, merge=True):
+        """Publish a progress event; unless `merge=False` its data is also merged into the job's result."""
+        with self._cond:
+            data = data or {}
+            if merge:
+                self.result.update(data)
+            self.events.append({"event": event, "data": data})
+            self.updated = time.time()
+            self._cond.notify_all()
+
+    def set_stage(self, stage):
+        with self._cond:
+            self.stage = stage
+            self.updated = time.time()
+
+    def _finish(self, status, error=None):
+        with self._cond:
+            self.status = status
+            self.error = error
+            self.stage = None
+            self.events.append({"event": status, "data": dict(self.result, error=error) if error else dict(self.result)})
+            self.updated = time.time()
+            self._cond.notify_all()
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    def wait_events(self, after=0, timeout=15.0):
+        """Events with index >= `after`, blocking up to `timeout` for new ones."""
+        with self._cond:
+            if len(self.events) <= after and not self.finished:
+                self._cond.wait(timeout)
+            return self.events[after:], self.finished
+
+    def snapshot(self):
+        with self._cond:
+            out = {"job_id": self.id, "status": self.status, "stage": self.stage}
+            out.update(self.result)
+            if self.error:
+                out["error"] = self.error
+            return out
+
+
+class JobQueue:
+    """
+    Runs `fn(job)` on a worker pool. Jobs sharing a `key` (e.g. a session) run one at a time, in
+    order: later ones wait in that key's queue and are handed to the pool when the previous one
+    finishes, so a busy session never ties up more than one worker.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, history=JOB_HISTORY):
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="hoppi-job")
+        self._jobs = OrderedDict()
+        self._key_queues = {}   # key -> deque of (job, fn) waiting behind the key's running job
+        self._lock = threading.Lock()
+        self.history = history
+
+    def submit(self, fn, key=None):
+        job = Job(uuid.uuid4().hex, key)
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.history:
+                old_id, old = next(iter(self._jobs.items()))
+                if not old.finished:
+                    break
+                del self._jobs[old_id]
+            if key is not None:
+                waiting = self._key_queues.get(key)
+                if waiting is not None:
+                    waiting.append((job, fn))
+                    return job.id
+                self._key_queues[key] = deque()
+        self._executor.submit(self._run, job, fn, key)
+        return job.id
+
+    def _run(self, job, fn, key):
+        try:
+            with job._cond:
+                job.status = "running"
+            fn(job)
+            job._finish("done")
+        except Exception as e:
+            print(f"[ERROR] Job {job.id} failed:", traceback.format_exc())
+            job._finish("failed", str(e))
+        finally:
+            if key is not None:
+                self._next_for(key)
+
+    def _next_for(self, key):
+        """Start the key's next queued job, or forget the key once its queue has drained."""
+        with self._lock:
+            waiting = self._key_queues[key]
+            if not waiting:
+                del self._key_queues[key]
+                return
+            job, fn = waiting.popleft()
+        self._executor.submit(self._run, job, fn, key)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
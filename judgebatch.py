@@ -0,0 +1,123 @@
+# /app/judgebatch.py
+# Micro-batching for judge calls: requests arriving within a short window are sent to the model as
+# one multi-item prompt and the JSON answer is split back out to each waiting caller. Items missing
+# from the answer (or a batch that can't be parsed) fall back to one call per item.
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+JUDGE_BATCH = os.getenv("JUDGE_BATCH", "1") == "1"
+JUDGE_BATCH_WINDOW = float(os.getenv("JUDGE_BATCH_WINDOW_MS", "100")) / 1000   # gather time after the first item
+JUDGE_BATCH_MAX = int(os.getenv("JUDGE_BATCH_MAX", "12"))
+JUDGE_BATCH_WORKERS = int(os.getenv("JUDGE_BATCH_WORKERS", "4"))
+
+
+def parse_batch(text, ids):
+    """{id: feedback} from a `[{"id": .., "feedback": ".."}, ...]` answer; unknown ids are ignored."""
+    start, end = text.find("["), text.rfind("]")
+    if start < 0 or end <= start:
+        raise ValueError("no JSON array in batch answer")
+    out = {}
+    for entry in json.loads(text[start:end + 1]):
+        if not isinstance(entry, dict):
+            continue
+        try:
+            item_id = int(entry.get("id"))
+        except (TypeError, ValueError):
+            continue
+        feedback = entry.get("feedback")
+        if item_id in ids and isinstance(feedback, str) and feedback.strip():
+            out[item_id] = feedback.strip()
+    return out
+
+
+class JudgeBatcher:
+    """
+    `submit(single_prompt, fields)` returns a Future for the model's text. `complete(prompt) -> str`
+    calls the model; `build_prompt([(id, fields), ...]) -> str` writes the multi-item prompt. A batch
+    of one is sent as its own single prompt, so quiet periods behave exactly like unbatched calls.
+    """
+
+    def __init__(self, complete, build_prompt, window=JUDGE_BATCH_WINDOW, max_items=JUDGE_BATCH_MAX,
+                 workers=JUDGE_BATCH_WORKERS):
+        self.complete = complete
+        self.build_prompt = build_prompt
+        self.window = window
+        self.max_items = max(1, max_items)
+        self._queue = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="hoppi-judge")
+        self._lock = threading.Lock()
+        self.batches = self.items = self.batched_items = self.fallbacks = self.parse_failures = self.overflow = 0
+        self._thread = threading.Thread(target=self._run, name="hoppi-judge-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, prompt, fields):
+        fut = Future()
+        self._queue.put((prompt, fields, fut))
+        return fut
+
+    def _run(self):
+        while True:
+            # Whatever arrives within `window` of the first request (up to max_items) goes out together
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            try:
+                while len(batch) < self.max_items and (remaining := deadline - time.monotonic()) > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                pass
+            self._executor.submit(self._dispatch, batch)
+
+    def _single(self, prompt, fut):
+        try:
+            fut.set_result(self.complete(prompt))
+        except Exception as e:
+            fut.set_exception(e)
+
+    def _dispatch(self, batch):
+        with self._lock:
+            self.batches += 1
+            self.items += len(batch)
+        if len(batch) == 1:
+            prompt, _, fut = batch[0]
+            self._single(prompt, fut)
+            return
+        ids = {i: item for i, item in enumerate(batch, 1)}
+        included = list(ids)
+        try:
+            prompt = self.build_prompt([(i, f) for i, (_, f, _) in ids.items()])
+            # The prompt may leave out items that would push it over budget; they're judged singly below
+            included = getattr(prompt, "ids", included)
+            answers = parse_batch(self.complete(prompt), set(included))
+        except Exception as e:
+            print(f"[WARN] Judge batch of {len(batch)} failed, judging one by one:", e)
+            with self._lock:
+                self.parse_failures += 1
+            answers = {}
+        with self._lock:
+            self.batched_items += len(answers)
+            self.overflow += len(ids) - len(included)
+        for i, (prompt, _, fut) in ids.items():
+            if i in answers:
+                fut.set_result(answers[i])
+                continue
+            with self._lock:
+                self.fallbacks += 1
+            # Not waited on here, so a worker never blocks on another worker
+            self._executor.submit(self._single, prompt, fut)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "avg_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+                "batched_items": self.batched_items,
+                "fallbacks": self.fallbacks,
+                "parse_failures": self.parse_failures,
+                "overflow": self.overflow,
+                "queued": self._queue.qsize(),
+            }
@@ -0,0 +1,79 @@
+# /app/keyframes.py
+# Keyframe sampling for video submissions with ffmpeg: scene-change detection on a rate-capped
+# stream, falling back to uniform sampling. ffmpeg decodes frame by frame, so a clip is never
+# held in memory, and only the few selected frames are written out (downscaled JPEGs).
+import os
+import re
+import shutil
+import subprocess
+
+VIDEO_MAX_FRAMES = int(os.getenv("VIDEO_MAX_FRAMES", "6"))
+VIDEO_MAX_FPS = float(os.getenv("VIDEO_MAX_FPS", "2"))          # frames per second ever examined
+VIDEO_SCENE_THRESHOLD = float(os.getenv("VIDEO_SCENE_THRESHOLD", "0.3"))
+VIDEO_MIN_SCENE_FRAMES = 2                                      # fewer → sample uniformly instead
+FRAME_MAX_SIDE = 512
+FFMPEG = shutil.which("ffmpeg")
+FFPROBE = shutil.which("ffprobe")
+
+_PTS_RE = re.compile(r"pts_time:\s*([0-9.]+)")
+
+
+def available():
+    return FFMPEG is not None
+
+
+def probe_duration(path):
+    """Clip length in seconds from the container header, or None."""
+    if not FFPROBE:
+        return None
+    try:
+        out = subprocess.run(
+            [FFPROBE, "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", path],
+            capture_output=True, text=True, timeout=30, check=True,
+        ).stdout.strip()
+        return float(out) if out and out != "N/A" else None
+    except Exception:
+        return None
+
+
+def uniform_fps(duration, max_frames=VIDEO_MAX_FRAMES, max_fps=VIDEO_MAX_FPS):
+    """Sampling rate that spreads `max_frames` over the clip, never above `max_fps`."""
+    if not duration or duration <= 0:
+        return max_fps
+    return min(max_fps, max_frames / duration)
+
+
+def _run(path, out_dir, vf, max_frames):
+    for name in os.listdir(out_dir):
+        if name.startswith("frame_"):
+            os.remove(os.path.join(out_dir, name))
+    proc = subprocess.run(
+        [FFMPEG, "-nostdin", "-hide_banner", "-loglevel", "info", "-i", path, "-an", "-sn",
+         "-vf", f"{vf},scale='min({FRAME_MAX_SIDE},iw)':-2,showinfo",
+         "-vsync", "vfr", "-frames:v", str(max_frames), "-q:v", "4",
+         os.path.join(out_dir, "frame_%03d.jpg")],
+        capture_output=True, text=True, timeout=300,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {proc.stderr.strip()[-300:]}")
+    times = [float(t) for t in _PTS_RE.findall(proc.stderr)]
+    frames = sorted(n for n in os.listdir(out_dir) if n.startswith("frame_"))
+    return [(times[i] if i < len(times) else None, os.path.join(out_dir, n)) for i, n in enumerate(frames)]
+
+
+def extract_keyframes(path, out_dir, max_frames=VIDEO_MAX_FRAMES):
+    """
+    [(timestamp_seconds or None, jpeg_path)] for up to `max_frames` frames, in clip order.
+    Raises RuntimeError when ffmpeg is missing or can't read the clip.
+    """
+    if not FFMPEG:
+        raise RuntimeError("ffmpeg not installed")
+    os.makedirs(out_dir, exist_ok=True)
+    # First frame plus every scene cut, looking at no more than VIDEO_MAX_FPS frames per second
+    scene = (f"fps={VIDEO_MAX_FPS},"
+             f"select='eq(n\\,0)+gt(scene\\,{VIDEO_SCENE_THRESHOLD})'")
+    frames = _run(path, out_dir, scene, max_frames)
+    if len(frames) >= VIDEO_MIN_SCENE_FRAMES:
+        return frames
+    # One long shot: spread the frames evenly instead
+    return _run(path, out_dir, f"fps={uniform_fps(probe_duration(path), max_frames):.4f}", max_frames)
@@ -0,0 +1,370 @@
+# /app/llm.py
+# Shared LLM gateway: one provider client for the whole app, per-model concurrency limits, deadlines
+# that carry across nested calls, and hedged requests that race a fallback model when the primary
+# is slower than its recent p90.
+import abc
+import asyncio
+import contextlib
+import contextvars
+import copy
+import dataclasses
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "45"))                   # seconds, per call unless a deadline is tighter
+LLM_WORKERS = int(os.getenv("LLM_WORKERS", "16"))
+LLM_MODEL_CONCURRENCY = int(os.getenv("LLM_MODEL_CONCURRENCY", "4"))  # requests in flight per model
+LLM_HEDGE = os.getenv("LLM_HEDGE", "1") == "1"
+LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", "4"))            # hedge delay until there are enough samples
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+
+TEXT_MODEL = "openai/gpt-oss-20b"
+JUDGE_MODEL = "google/gemma-3n-E4B-it"
+# Which model answers when the other one is slow or failing
+FALLBACK_MODELS = {TEXT_MODEL: JUDGE_MODEL, JUDGE_MODEL: TEXT_MODEL}
+
+_deadline = contextvars.ContextVar("llm_deadline", default=None)
+
+
+class LLMError(RuntimeError):
+    pass
+
+
+class LLMTimeout(LLMError, TimeoutError):
+    pass
+
+
+@contextlib.contextmanager
+def deadline(seconds):
+    """Every LLM call inside the block (in this thread or task) must finish within `seconds`."""
+    at = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(at if outer is None else min(outer, at))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def _messages(prompt):
+    return [{"role": "user", "content": prompt}] if isinstance(prompt, str) else list(prompt)
+
+
+# --- providers ---
+class LLMProvider(abc.ABC):
+    """What the gateway needs from a model API. Methods return plain text (or yield it) or raise."""
+
+    name = "base"
+
+    @abc.abstractmethod
+    def complete(self, model, messages, timeout, **params) -> str:
+        ...
+
+    def stream(self, model, messages, timeout, **params):
+        yield self.complete(model, messages, timeout, **params)
+
+    @abc.abstractmethod
+    def generate_image(self, model, prompt, timeout, **params):
+        ...
+
+
+class TogetherProvider(LLMProvider):
+    """Together AI through one lazily created client, so every call shares its connection pool."""
+
+    name = "together"
+
+    def __init__(self, api_key=None, timeout=LLM_TIMEOUT):
+        self.api_key = api_key
+        self.timeout = timeout
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                from together import Together
+                # Retries are the gateway's job (fallback model); the SDK's would blow the deadline
+                self._client = Together(api_key=(self.api_key or os.getenv("TOGETHER_API_KEY", "")).strip(),
+                                        timeout=self.timeout, max_retries=0)
+            return self._client
+
+    def client_for(self, timeout):
+        """The shared client with its HTTP timeout cut to what's left of the caller's deadline."""
+        client = self.client
+        timeout = max(0.5, timeout)   # the 1.x SDK reads a timeout of 0 as "use the default"
+        if hasattr(client, "with_options"):
+            return client.with_options(timeout=timeout)
+        # 1.x has no with_options, but builds a requestor from `client.client` on every call
+        from together import resources
+        scoped = copy.copy(client)
+        scoped.client = dataclasses.replace(client.client, timeout=timeout)
+        scoped.chat, scoped.images = resources.Chat(scoped.client), resources.Images(scoped.client)
+        return scoped
+
+    def complete(self, model, messages, timeout, **params):
+        response = self.client_for(timeout).chat.completions.create(model=model, messages=messages, **params)
+        return response.choices[0].message.content
+
+    def stream(self, model, messages, timeout, **params):
+        client = self.client_for(timeout)
+        for chunk in client.chat.completions.create(model=model, messages=messages, stream=True, **params):
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            text = getattr(delta, "content", None) if delta is not None else None
+            if text:
+                yield text
+
+    def generate_image(self, model, prompt, timeout, **params):
+        return self.client_for(timeout).images.generate(model=model, prompt=prompt, **params)
+
+
+class FakeProvider(LLMProvider):
+    """
+    Offline stand-in for tests and benchmarks. `latency` is seconds (or {model: seconds}), models in
+    `fail` raise, `reply(model, messages)` and `image(model, prompt, **params)` override the output.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency=0.0, fail=(), reply=None, image=None):
+        self.latency = latency
+        self.fail = set(fail)
+        self.reply = reply
+        self.image = image
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _enter(self, model):
+        with self._lock:
+            self.calls.append(model)
+        delay = self.latency.get(model, 0.0) if isinstance(self.latency, dict) else self.latency
+        if delay:
+            time.sleep(delay)
+        if model in self.fail:
+            raise LLMError(f"{model} unavailable")
+
+    def complete(self, model, messages, timeout, **params):
+        self._enter(model)
+        if self.reply:
+            return self.reply(model, messages)
+        return f"[{model}] {messages[-1]['content'][:60]}"
+
+    def stream(self, model, messages, timeout, **params):
+        text = self.complete(model, messages, timeout, **params)
+        for i, word in enumerate(text.split(" ")):
+            yield word if i == 0 else f" {word}"
+
+    def generate_image(self, model, prompt, timeout, **params):
+        self._enter(model)
+        if self.image is None:
+            raise LLMError("FakeProvider has no image function")
+        return self.image(model, prompt, **params)
+
+
+PROVIDERS = {"together": TogetherProvider, "fake": FakeProvider}
+
+
+# --- gateway ---
+class ModelState:
+    """Concurrency slots and recent latencies (successful calls only) for one model."""
+
+    def __init__(self, limit):
+        self.slots = threading.BoundedSemaphore(limit)
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.calls = self.errors = self.rejected = 0
+
+    def quantile(self, q):
+        data = sorted(self.latencies)
+        return data[int(q * (len(data) - 1))] if data else None
+
+
+class LLMGateway:
+    """
+    `complete(prompt, model)` returns the model's text or raises LLMError/LLMTimeout. If the model
+    hasn't answered by its p90 latency, the same request goes to its fallback model and the first
+    answer wins; a failure goes to the fallback straight away. `stream` falls back only before the
+    first token. `acomplete` is the asyncio version.
+    """
+
+    def __init__(self, provider=None, workers=LLM_WORKERS, model_concurrency=LLM_MODEL_CONCURRENCY,
+                 timeout=LLM_TIMEOUT, hedge=LLM_HEDGE, fallbacks=None):
+        self.provider = provider or TogetherProvider()
+        self.model_concurrency = model_concurrency
+        self.timeout = timeout
+        self.hedge = hedge
+        self.fallbacks = FALLBACK_MODELS if fallbacks is None else fallbacks
+        self._executor = ThreadPoolExecutor(max_workers=max(2, workers), thread_name_prefix="hoppi-llm")
+        self._models = {}
+        self._lock = threading.Lock()
+        self.hedges = self.hedge_wins = self.fallback_calls = self.timeouts = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(PROVIDERS.get(os.getenv("LLM_PROVIDER", "together"), TogetherProvider)())
+
+    def _model(self, model):
+        with self._lock:
+            if model not in self._models:
+                self._models[model] = ModelState(self.model_concurrency)
+            return self._models[model]
+
+    def _deadline_for(self, timeout):
+        at = time.monotonic() + (self.timeout if timeout is None else timeout)
+        outer = _deadline.get()
+        return at if outer is None else min(outer, at)
+
+    def hedge_delay(self, model):
+        state = self._model(model)
+        if len(state.latencies) < HEDGE_MIN_SAMPLES:
+            return LLM_HEDGE_AFTER
+        return state.quantile(0.9)
+
+    @contextlib.contextmanager
+    def _slot(self, model, at):
+        state = self._model(model)
+        if not state.slots.acquire(timeout=max(0.0, at - time.monotonic())):
+            with self._lock:
+                state.rejected += 1
+            raise LLMTimeout(f"No free slot for {model} before the deadline")
+        try:
+            yield state
+        finally:
+            state.slots.release()
+
+    def _call(self, model, messages, at, params):
+        with self._slot(model, at) as state:
+            started = time.monotonic()
+            try:
+                text = self.provider.complete(model, messages, max(0.0, at - started), **params)
+            except Exception:
+                with self._lock:
+                    state.calls += 1
+                    state.errors += 1
+                raise
+            with self._lock:
+                state.calls += 1
+                state.latencies.append(time.monotonic() - started)
+            return text
+
+    def complete(self, prompt, model=TEXT_MODEL, timeout=None, hedge=None, **params):
+        messages = _messages(prompt)
+        at = self._deadline_for(timeout)
+        hedge = self.hedge if hedge is None else hedge
+        backups = [m for m in (self.fallbacks.get(model),) if m and m != model]
+        hedge_at = time.monotonic() + self.hedge_delay(model)
+        pending = {self._executor.submit(self._call, model, messages, at, params): model}
+        error = None
+        while pending:
+            now = time.monotonic()
+            wait_for = at - now
+            if backups and hedge:
+                wait_for = min(wait_for, hedge_at - now)
+            done, _ = wait(pending, timeout=max(0.0, wait_for), return_when=FIRST_COMPLETED)
+            for fut in done:
+                answered_by = pending.pop(fut)
+                try:
+                    text = fut.result()
+                except Exception as e:
+                    print(f"[WARN] LLM call to {answered_by} failed:", e)
+                    error = e
+                    continue
+                # The loser keeps its slot until it returns; its answer is discarded
+                if answered_by != model:
+                    with self._lock:
+                        self.hedge_wins += 1
+                return text
+            now = time.monotonic()
+            if backups and (not pending or (hedge and now >= hedge_at)) and now < at:
+                backup = backups.pop(0)
+                with self._lock:
+                    if pending:
+                        self.hedges += 1
+                    else:
+                        self.fallback_calls += 1
+                pending[self._executor.submit(self._call, backup, messages, at, params)] = backup
+            elif pending and now >= at:
+                with self._lock:
+                    self.timeouts += 1
+                raise LLMTimeout(f"{model} did not answer before the deadline")
+        raise error if isinstance(error, LLMError) else LLMError(f"{model} failed: {error}")
+
+    def stream(self, prompt, model=TEXT_MODEL, timeout=None, **params):
+        messages = _messages(prompt)
+        at = self._deadline_for(timeout)
+        for candidate in [model] + [m for m in (self.fallbacks.get(model),) if m and m != model]:
+            started, state = False, None
+            try:
+                with self._slot(candidate, at) as state:
+                    t0 = time.monotonic()
+                    for text in self.provider.stream(candidate, messages, max(0.0, at - t0), **params):
+                        started = True
+                        yield text
+                    with self._lock:
+                        state.calls += 1
+                        state.latencies.append(time.monotonic() - t0)
+                return
+            except Exception as e:
+                if state is not None:   # no slot means _slot already counted it as rejected
+                    with self._lock:
+                        state.errors += 1
+                if started:
+                    raise
+                print(f"[WARN] LLM stream from {candidate} failed:", e)
+                error = e
+        raise error if isinstance(error, LLMError) else LLMError(f"{model} failed: {error}")
+
+    def generate_image(self, model, prompt, timeout=None, **params):
+        """Image generation through the shared client and the model's concurrency slots (no hedging)."""
+        at = self._deadline_for(timeout)
+        with self._slot(model, at) as state:
+            try:
+                return self.provider.generate_image(model, prompt, max(0.0, at - time.monotonic()), **params)
+            finally:
+                with self._lock:
+                    state.calls += 1
+
+    async def acomplete(self, prompt, model=TEXT_MODEL, timeout=None, hedge=None, **params):
+        # to_thread copies the context, so an enclosing deadline() still applies
+        return await asyncio.to_thread(self.complete, prompt, model, timeout, hedge, **params)
+
+    def stats(self):
+        with self._lock:
+            models = {
+                name: {
+                    "calls": s.calls,
+                    "errors": s.errors,
+                    "rejected": s.rejected,
+                    "p50_ms": round(s.quantile(0.5) * 1000, 1) if s.latencies else None,
+                    "p90_ms": round(s.quantile(0.9) * 1000, 1) if s.latencies else None,
+                }
+                for name, s in self._models.items()
+            }
+            return {
+                "provider": self.provider.name,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "fallbacks": self.fallback_calls,
+                "timeouts": self.timeouts,
+                "models": models,
+            }
+
+
+GATEWAY = LLMGateway.from_env()
+
+
+def complete(prompt, model=TEXT_MODEL, **kw):
+    return GATEWAY.complete(prompt, model, **kw)
+
+
+def stream(prompt, model=TEXT_MODEL, **kw):
+    return GATEWAY.stream(prompt, model, **kw)
+
+
+async def acomplete(prompt, model=TEXT_MODEL, **kw):
+    return await GATEWAY.acomplete(prompt, model, **kw)
@@ -0,0 +1,142 @@
+# /app/mediaprep.py
+# Upload preprocessing: phone photos become a bounded-resolution JPEG/WebP (plus a thumbnail) and
+# audio becomes 16 kHz mono Opus (about the size of the phone's webm) before captioning,
+# transcription and long-term storage.
+import os
+import shutil
+import subprocess
+import wave
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from mediasvc import AUDIO_TYPES, IMAGE_TYPES
+
+IMAGE_MAX_SIDE = int(os.getenv("MEDIA_IMAGE_MAX_SIDE", "1024"))
+THUMB_MAX_SIDE = int(os.getenv("MEDIA_THUMB_MAX_SIDE", "320"))
+IMAGE_FORMAT = os.getenv("MEDIA_IMAGE_FORMAT", "JPEG").upper()      # JPEG or WEBP
+IMAGE_QUALITY = int(os.getenv("MEDIA_IMAGE_QUALITY", "85"))
+IMAGE_PASSTHROUGH_BYTES = int(os.getenv("MEDIA_IMAGE_PASSTHROUGH_BYTES", str(1024 * 1024)))  # small JPEGs kept as-is
+AUDIO_RATE = 16000
+AUDIO_BITRATE = os.getenv("MEDIA_AUDIO_BITRATE", "24k")             # Opus; plenty for speech at 16 kHz
+KEEP_ORIGINALS = os.getenv("MEDIA_KEEP_ORIGINALS", "0") == "1"
+FFMPEG = shutil.which("ffmpeg")
+
+_EXT = {"JPEG": ".jpg", "WEBP": ".webp"}
+
+
+def _derivative(path, suffix, ext):
+    """Path next to the upload with the same stem, e.g. pic.HEIC → pic.small.jpg."""
+    return f"{os.path.splitext(path)[0]}{suffix}{ext}"
+
+
+def _save_image(img, dst, max_side):
+    img = img.copy()
+    img.thumbnail((max_side, max_side), Image.LANCZOS)
+    tmp = f"{dst}.tmp"
+    img.save(tmp, IMAGE_FORMAT, quality=IMAGE_QUALITY, **({"optimize": True} if IMAGE_FORMAT == "JPEG" else {}))
+    os.replace(tmp, dst)
+
+
+def _passthrough(img, path):
+    """An upright RGB JPEG already within the limits gains nothing from a decode and re-encode."""
+    return (IMAGE_FORMAT == "JPEG" and img.format == "JPEG" and img.mode in ("RGB", "L")
+            and max(img.size) <= IMAGE_MAX_SIDE and img.getexif().get(0x0112, 1) == 1
+            and os.path.getsize(path) <= IMAGE_PASSTHROUGH_BYTES)
+
+
+def prepare_image(path, keep_original=KEEP_ORIGINALS):
+    """Returns {"file": derivative, "thumbnail": thumb}; raises if Pillow can't read the upload."""
+    ext = _EXT.get(IMAGE_FORMAT, ".jpg")
+    thumbnail = _derivative(path, ".thumb", ext)
+    with Image.open(path) as img:
+        if _passthrough(img, path):
+            img.draft("RGB", (THUMB_MAX_SIDE, THUMB_MAX_SIDE))
+            _save_image(img.convert("RGB"), thumbnail, THUMB_MAX_SIDE)
+            return {"file": path, "thumbnail": thumbnail}
+        # JPEG can decode straight at a reduced scale, which skips most of the work for big photos
+        img.draft("RGB", (IMAGE_MAX_SIDE, IMAGE_MAX_SIDE))
+        img = ImageOps.exif_transpose(img).convert("RGB")
+    # Without keep_original the derivative takes the upload's place (same stem, maybe same name)
+    derivative = _derivative(path, ".small" if keep_original else "", ext)
+    _save_image(img, derivative, IMAGE_MAX_SIDE)
+    _save_image(img, thumbnail, THUMB_MAX_SIDE)
+    return {"file": derivative, "thumbnail": thumbnail}
+
+
+def _resample_wav(src, dst):
+    """16 kHz mono 16-bit PCM from a PCM WAV, with NumPy (used when ffmpeg isn't installed)."""
+    with wave.open(src, "rb") as w:
+        channels, width, rate, n = w.getnchannels(), w.getsampwidth(), w.getframerate(), w.getnframes()
+        raw = w.readframes(n)
+    dtype = {1: np.uint8, 2: np.int16, 4: np.int32}[width]
+    samples = np.frombuffer(raw, dtype=dtype).astype(np.float32)
+    if width == 1:
+        samples = (samples - 128) * 256
+    elif width == 4:
+        samples /= 65536
+    mono = samples.reshape(-1, channels).mean(axis=1)
+    if rate != AUDIO_RATE and len(mono):
+        # Average down to the target rate first so high frequencies don't alias, then interpolate
+        step = max(1, rate // AUDIO_RATE)
+        if step > 1:
+            mono = mono[: len(mono) // step * step].reshape(-1, step).mean(axis=1)
+            rate = rate / step
+        t_out = np.arange(int(len(mono) * AUDIO_RATE / rate)) / AUDIO_RATE
+        mono = np.interp(t_out, np.arange(len(mono)) / rate, mono)
+    pcm = np.clip(mono, -32768, 32767).astype("<i2")
+    tmp = f"{dst}.tmp"
+    with wave.open(tmp, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(AUDIO_RATE)
+        out.writeframes(pcm.tobytes())
+    os.replace(tmp, dst)
+
+
+def prepare_audio(path, keep_original=KEEP_ORIGINALS):
+    """
+    Returns {"file": 16 kHz mono audio}: Opus in Ogg via ffmpeg for any codec, or 16-bit WAV via
+    NumPy for plain WAV uploads. Without ffmpeg a derivative bigger than the upload isn't kept.
+    """
+    if FFMPEG:
+        dst = _derivative(path, ".16k" if keep_original else "", ".ogg")
+        tmp = f"{dst}.tmp.ogg"
+        subprocess.run(
+            [FFMPEG, "-nostdin", "-loglevel", "error", "-y", "-i", path, "-vn",
+             "-ac", "1", "-ar", str(AUDIO_RATE), "-c:a", "libopus", "-b:a", AUDIO_BITRATE,
+             "-application", "voip", tmp],
+            check=True, timeout=120,
+        )
+        os.replace(tmp, dst)
+        return {"file": dst}
+    tmp = _derivative(path, ".16k", ".wav")
+    _resample_wav(path, tmp)
+    if os.path.getsize(tmp) >= os.path.getsize(path):
+        os.remove(tmp)          # e.g. 8 kHz 8-bit source: PCM at 16 kHz would only grow it
+        return {"file": path}
+    dst = _derivative(path, ".16k" if keep_original else "", ".wav")
+    if dst != tmp:
+        os.replace(tmp, dst)
+    return {"file": dst}
+
+
+def preprocess(path, media_type, keep_original=KEEP_ORIGINALS):
+    """
+    Derivatives for a saved upload: {"file": path to store/analyze, "thumbnail": path or None,
+    "original": path or None}. Anything that can't be processed is passed through untouched.
+    """
+    out = {"file": path, "thumbnail": None, "original": path if keep_original else None}
+    try:
+        if media_type in IMAGE_TYPES:
+            out.update(prepare_image(path, keep_original))
+        elif media_type in AUDIO_TYPES:
+            out.update(prepare_audio(path, keep_original))
+        else:
+            return out
+    except Exception as e:
+        print(f"[WARN] Preprocessing skipped for {os.path.basename(path)}: {e}")
+        return {"file": path, "thumbnail": None, "original": None}
+    if not keep_original and out["file"] != path and os.path.exists(path):
+        os.remove(path)
+    return out
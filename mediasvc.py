@@ -0,0 +1,308 @@
+# /app/mediasvc.py
+# Media understanding service: captions photos and transcribes audio on a bounded worker pool,
+# keyed by a BLAKE2 hash of the upload so re-uploads and retried jobs skip inference entirely.
+import abc
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import keyframes
+import outbound
+
+MEDIA_WORKERS = int(os.getenv("MEDIA_WORKERS", "2"))
+MEDIA_TIMEOUT = float(os.getenv("MEDIA_TIMEOUT", "60"))   # seconds a caller waits for one summary
+MEDIA_MEMORY_ENTRIES = int(os.getenv("MEDIA_MEMORY_ENTRIES", "2000"))   # in-memory LRU; SQLite keeps the rest
+HASH_CHUNK = 1024 * 1024
+
+IMAGE_TYPES = ("photo", "image", "picture")
+AUDIO_TYPES = ("audio", "recording", "voice")
+VIDEO_TYPES = ("video",)
+
+BLIP_URL = "https://api-inference.huggingface.co/models/Salesforce/blip-image-captioning-large"
+
+
+def file_digest(path) -> str:
+    """BLAKE2b-256 of the file contents, read in chunks."""
+    h = hashlib.blake2b(digest_size=32)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class MediaSummary(str):
+    """The summary text, plus `analyzed`: False when it's a stock fallback rather than a real caption/transcript."""
+
+    def __new__(cls, text, analyzed=True):
+        self = super().__new__(cls, text)
+        self.analyzed = analyzed
+        return self
+
+
+# --- backends ---
+class MediaBackend(abc.ABC):
+    """What the service needs from a model provider. Methods return plain text or raise."""
+
+    name = "base"
+
+    @abc.abstractmethod
+    def caption(self, path) -> str:
+        ...
+
+    @abc.abstractmethod
+    def transcribe(self, path) -> str:
+        ...
+
+
+class RemoteBackend(MediaBackend):
+    """BLIP captions on the Hugging Face Inference API, Whisper transcripts on OpenAI."""
+
+    name = "remote"
+
+    def caption(self, path):
+        hf_key = os.getenv("HF_API_KEY", "")
+        with open(path, "rb") as f:
+            res = outbound.post(
+                BLIP_URL,
+                headers={"Authorization": f"Bearer {hf_key}"} if hf_key else {},
+                files={"file": f},
+                timeout=30,
+            )
+        caption_data = res.json()
+        if isinstance(caption_data, list) and caption_data and "generated_text" in caption_data[0]:
+            return caption_data[0]["generated_text"]
+        if isinstance(caption_data, dict) and "generated_text" in caption_data:
+            return caption_data["generated_text"]
+        raise ValueError(f"Unexpected caption response: {str(caption_data)[:200]}")
+
+    def transcribe(self, path):
+        import openai
+        openai.api_key = os.getenv("OPENAI_API_KEY", "")
+        with open(path, "rb") as f:
+            transcript = openai.Audio.transcribe("whisper-1", f)
+        return transcript["text"]
+
+
+class StubBackend(MediaBackend):
+    """Offline stand-in for tests and benchmarks: deterministic text, optional fake latency."""
+
+    name = "stub"
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+
+    def _reply(self, kind, path):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return f"{kind} of {os.path.basename(path)}"
+
+    def caption(self, path):
+        return self._reply("a picture", path)
+
+    def transcribe(self, path):
+        return self._reply("a recording", path)
+
+
+BACKENDS = {"remote": RemoteBackend, "stub": StubBackend}
+
+
+# --- service ---
+class MediaService:
+    """
+    `summarize(path, media_type)` returns the text the judge sees. Successful captions/transcripts
+    are cached by content hash (in a bounded in-memory LRU and, with `cache_path`, in SQLite);
+    failures are not. Concurrent requests for the same file share one inference call.
+    """
+
+    def __init__(self, backend=None, cache_path=None, workers=MEDIA_WORKERS, timeout=MEDIA_TIMEOUT,
+                 max_memory=MEDIA_MEMORY_ENTRIES):
+        self.backend = backend or RemoteBackend()
+        self.timeout = timeout
+        self.max_memory = max_memory
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="hoppi-media")
+        self._memory = OrderedDict()   # (digest, kind) -> text, oldest first
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._db = None
+        self.hits = self.misses = self.failures = 0
+        if cache_path:
+            self._open_disk(cache_path)
+
+    @classmethod
+    def from_env(cls):
+        backend = BACKENDS.get(os.getenv("MEDIA_BACKEND", "remote"), RemoteBackend)()
+        return cls(backend, cache_path=os.getenv("MEDIA_CACHE_PATH", "/tmp/hoppi-media-cache.db"))
+
+    def _open_disk(self, path):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS media_cache ("
+                " digest TEXT NOT NULL, kind TEXT NOT NULL, text TEXT NOT NULL, created REAL NOT NULL,"
+                " PRIMARY KEY (digest, kind))"
+            )
+            self._db.commit()
+        except Exception as e:
+            print(f"[WARN] Media cache disk backing disabled ({path}): {e}")
+            self._db = None
+
+    def _remember(self, key, text):
+        self._memory[key] = text
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory:
+            self._memory.popitem(last=False)
+
+    def _cached(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT text FROM media_cache WHERE digest = ? AND kind = ?", key
+                ).fetchone()
+                if row:
+                    self._remember(key, row[0])
+                    return row[0]
+        return None
+
+    def _store(self, key, text):
+        with self._lock:
+            self._remember(key, text)
+            if self._db is not None:
+                try:
+                    self._db.execute("INSERT OR REPLACE INTO media_cache VALUES (?, ?, ?, ?)", (*key, text, time.time()))
+                    self._db.commit()
+                except Exception as e:
+                    print(f"[WARN] Media cache disk write failed: {e}")
+
+    def _schedule(self, path, kind):
+        """A future for the file's text: already resolved on a cache hit, shared while in flight."""
+        key = (file_digest(path), kind)
+        text = self._cached(key)
+        with self._lock:
+            if text is None:
+                text = self._memory.get(key)   # may have finished while we were hashing
+            if text is not None:
+                self.hits += 1
+                fut = Future()
+                fut.set_result(text)
+                return fut
+            fut = self._inflight.get(key)
+            if fut is None:
+                self.misses += 1
+                fut = self._executor.submit(self._infer, key, path, kind)
+                self._inflight[key] = fut
+            return fut
+
+    def analyze(self, path, kind):
+        """Cached caption ("caption") or transcript ("transcript") of the file; raises on failure."""
+        return self._schedule(path, kind).result(timeout=self.timeout)
+
+    def analyze_many(self, paths, kind):
+        """Queue every file at once so the pool works on them together; None for files that failed."""
+        futures = [self._schedule(p, kind) for p in paths]
+        out = []
+        for fut in futures:
+            try:
+                out.append(fut.result(timeout=self.timeout))
+            except Exception as e:
+                print(f"[WARN] Media {kind} failed:", e)
+                out.append(None)
+        return out
+
+    def describe_video(self, path):
+        """
+        Compact multi-frame summary: keyframes are sampled with ffmpeg and captioned through the same
+        pool and cache as photos. Cached per clip hash; raises if no frame could be captioned.
+        """
+        key = (file_digest(path), "video")
+        text = self._cached(key)
+        if text is not None:
+            with self._lock:
+                self.hits += 1
+            return text
+        with tempfile.TemporaryDirectory(prefix="hoppi-frames-") as tmp:
+            frames = keyframes.extract_keyframes(path, tmp)
+            captions = self.analyze_many([f for _, f in frames], "caption")
+        parts, last = [], None
+        for (ts, _), caption in zip(frames, captions):
+            if not caption or caption == last:   # drop failures and repeats of the same shot
+                continue
+            last = caption
+            parts.append(f"[{int(ts // 60)}:{int(ts % 60):02d}] {caption}" if ts is not None else caption)
+        if not parts:
+            raise ValueError("no keyframe could be captioned")
+        text = "; ".join(parts)
+        self._store(key, text)
+        return text
+
+    def _infer(self, key, path, kind):
+        try:
+            text = self.backend.caption(path) if kind == "caption" else self.backend.transcribe(path)
+            self._store(key, text)
+            return text
+        except Exception:
+            with self._lock:
+                self.failures += 1
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def summarize(self, file_path, media_type):
+        """Summarize image/audio content so Hoppi can better judge; returns a MediaSummary."""
+        if not file_path:
+            return MediaSummary("No file provided.", analyzed=False)
+
+        if media_type in IMAGE_TYPES:
+            try:
+                return MediaSummary(f"Image description: {self.analyze(file_path, 'caption')}")
+            except Exception as e:
+                print("[WARN] Image captioning failed:", e)
+                return MediaSummary("Image description unavailable.", analyzed=False)
+
+        elif media_type in AUDIO_TYPES:
+            try:
+                return MediaSummary(f"Audio transcription: {self.analyze(file_path, 'transcript')}")
+            except Exception as e:
+                print("[WARN] Audio transcription failed:", e)
+                return MediaSummary("Audio content unavailable.", analyzed=False)
+
+        elif media_type in VIDEO_TYPES and keyframes.available():
+            try:
+                return MediaSummary(f"Video keyframes: {self.describe_video(file_path)}")
+            except Exception as e:
+                print("[WARN] Video analysis failed:", e)
+                return MediaSummary("Video content unavailable.", analyzed=False)
+
+        else:
+            return MediaSummary(f"Uploaded a {media_type}, but no automatic summary available.", analyzed=False)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "backend": self.backend.name,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "failures": self.failures,
+                "inflight": len(self._inflight),
+                "memory_entries": len(self._memory),
+            }
+
+
+MEDIA_SERVICE = MediaService.from_env()
+
+
+def summarize_media(file_path, media_type):
+    return MEDIA_SERVICE.summarize(file_path, media_type)
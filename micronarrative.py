@@ -1,12 +1,29 @@
-import os, traceback, json, base64
-from together import Together
+import os, traceback, json, base64, time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
-# Initialize Together API client
-client = Together(api_key=os.getenv("TOGETHER_API_KEY", "").strip())
+import llm
+import outbound
+from contentstore import ContentStore, content_key
+from promptcache import PROMPT_CACHE
 
 # Models
-TEXT_MODEL = "openai/gpt-oss-20b"
+TEXT_MODEL = llm.TEXT_MODEL
 IMAGE_MODEL = "black-forest-labs/FLUX.1-schnell"  # supports image generation
+IMAGE_SIZE = "1024x1024"
+IMAGE_STEPS = 8
+
+# Generated images, stored once per (model, prompt, size, steps) and served by hash through
+# /download/story/<key>.png; narrative text is cached in PROMPT_CACHE
+STORY_STORE = ContentStore(
+    os.getenv("STORY_STORE_DIR", "/tmp/hoppi-story-store"),
+    max_bytes=int(os.getenv("STORY_STORE_MAX_MB", "512")) * 1024 * 1024,
+)
+
+# Story beats are rendered in parallel on a small pool per chapter (the gateway's per-model slots
+# bound the image API across chapters), so one chapter's stuck beats can't hold up the next one
+IMAGE_CONCURRENCY = int(os.getenv("IMAGE_CONCURRENCY", "3"))
+IMAGE_TIMEOUT = float(os.getenv("IMAGE_TIMEOUT", "60"))  # seconds per beat, from when it starts, before the placeholder
+_QUEUED_POLL = 0.1   # how often to look for queued beats that have started (and so have a timer)
 
 
 def submissions_are_unrelated(submissions):
@@ -67,11 +84,12 @@ Return ONLY JSON.
 """
 
     try:
-        response = client.chat.completions.create(
-            model=TEXT_MODEL,
-            messages=[{"role": "user", "content": prompt}],
-        )
-        text_out = response.choices[0].message.content.strip()
+        fields = {"model": TEXT_MODEL, "unrelated": unrelated, "submissions": [
+            {k: s.get(k, "") for k in ("task", "summary", "judge_feedback")} for s in submissions
+        ]}
+        text_out = PROMPT_CACHE.get("narrative", fields)
+        if text_out is None:
+            text_out = llm.complete(prompt, TEXT_MODEL).strip()
 
         # --- Safe JSON parsing ---
         try:
@@ -83,6 +101,7 @@ Return ONLY JSON.
 
         story_text = data.get("story_text", "").strip()
         beats = data.get("beats", [])
+        PROMPT_CACHE.put("narrative", fields, text_out)
 
         if unrelated and not beats:
             beats = [
@@ -104,82 +123,167 @@ Return ONLY JSON.
         return story_text, beats
 
 
+PLACEHOLDER_IMAGE = "https://placekitten.com/512/512"
+
+
+def story_image_url(key):
+    return f"/download/story/{key}.png"
+
+
+def missing_story_images(images):
+    """Indices of images whose stored blob is gone (evicted from STORY_STORE); hosted URLs never are."""
+    prefix = story_image_url("")[:-len(".png")]
+    return [
+        i for i, img in enumerate(images)
+        if (img or {}).get("url", "").startswith(prefix) and STORY_STORE.open(img["url"][len(prefix):]) is None
+    ]
+
+
+def restore_story_images(beats, images, missing, on_image=None):
+    """
+    Regenerate the images at `missing` from their beats. Blobs are keyed by prompt, so a restored
+    image gets its old URL back; one that fails again becomes the placeholder.
+    """
+    images = list(images)
+    todo = [i for i in missing if i < len(beats)]
+    for j, image in iter_story_images([beats[i] for i in todo]):
+        images[todo[j]] = dict(image, title=images[todo[j]].get("title") or image["title"])
+        if on_image:
+            on_image(todo[j], images[todo[j]])
+    return images
+
+
+def _generate_beat_image(b, timeout=IMAGE_TIMEOUT):
+    """Generate one beat's image; returns {title, url} (stored by prompt hash, hosted URL, or placeholder)."""
+    try:
+        img_prompt = f"{b['prompt']} | cinematic, natural light, detailed textures, poetic atmosphere"
+        key = content_key(IMAGE_MODEL, img_prompt, IMAGE_SIZE, IMAGE_STEPS)
+        if STORY_STORE.get(key, "png"):
+            return {"title": b.get("title", ""), "url": story_image_url(key)}
+
+        response = llm.GATEWAY.generate_image(
+            IMAGE_MODEL,
+            img_prompt,
+            timeout=timeout,
+            size=IMAGE_SIZE,
+            steps=IMAGE_STEPS
+        )
+
+        print("[DEBUG RAW IMAGE RESPONSE]", response.__dict__)
+
+        data = getattr(response, "data", [])
+        if not data:
+            raise ValueError("Empty image response")
+
+        item = data[0]
+        if isinstance(item, dict):
+            hosted_url, b64 = item.get("url"), item.get("b64_json")
+        else:
+            hosted_url, b64 = getattr(item, "url", None), getattr(item, "b64_json", None)
+
+        # 🧩 Base64 is stored directly; a hosted URL is fetched once so repeats are served locally
+        image_bytes = None
+        if b64:
+            image_bytes = base64.b64decode(b64)
+        elif hosted_url:
+            try:
+                res = outbound.get(hosted_url, timeout=30)
+                res.raise_for_status()
+                image_bytes = res.content
+            except Exception as e:
+                print(f"[WARN] Could not store hosted image, linking it instead: {e}")
+                return {"title": b.get("title", ""), "url": hosted_url}  # ✅ Together's hosted URL still works
+
+        if image_bytes:
+            STORY_STORE.put(key, "png", image_bytes)
+            image_url = story_image_url(key)
+        else:
+            image_url = PLACEHOLDER_IMAGE
+
+        return {
+            "title": b.get("title", ""),
+            "url": image_url
+        }
+
+    except Exception as e:
+        print(f"[ERROR] Image generation failed for {b.get('title','(unknown)')}: {e}")
+        return {
+            "title": b.get("title", ""),
+            "url": PLACEHOLDER_IMAGE
+        }
+
+
+def iter_story_images(beats, timeout=None):
+    """
+    Generate all beat images concurrently (at most IMAGE_CONCURRENCY in flight for this chapter) and
+    yield (beat_index, {title, url}) as each one finishes. A beat that runs longer than `timeout`
+    from its own start yields the placeholder image.
+    """
+    timeout = IMAGE_TIMEOUT if timeout is None else timeout
+    if not beats:
+        return
+    executor = ThreadPoolExecutor(max_workers=max(1, min(IMAGE_CONCURRENCY, len(beats))),
+                                  thread_name_prefix="hoppi-images")
+    started = {}
+
+    def run(i, b):
+        started[i] = time.monotonic()
+        return _generate_beat_image(b, timeout)
+
+    futures = {executor.submit(run, i, b): i for i, b in enumerate(beats)}
+    pending = set(futures)
+    try:
+        while pending:
+            now = time.monotonic()
+            for fut in [f for f in pending if not f.done() and now - started.get(futures[f], now) >= timeout]:
+                pending.discard(fut)
+                b = beats[futures[fut]]
+                print(f"[ERROR] Image generation timed out for {b.get('title','(unknown)')}")
+                yield futures[fut], {"title": b.get("title", ""), "url": PLACEHOLDER_IMAGE}
+            if not pending:
+                return
+            # Sleep until the earliest running beat's timer runs out; queued beats get theirs once they start
+            deadlines = [started[futures[f]] + timeout for f in pending if futures[f] in started]
+            wait_for = min(deadlines) - now if deadlines else timeout
+            if len(deadlines) < len(pending):
+                wait_for = min(wait_for, _QUEUED_POLL)
+            done, pending = wait(pending, timeout=max(0.0, wait_for), return_when=FIRST_COMPLETED)
+            for fut in done:
+                yield futures[fut], fut.result()
+    finally:
+        # Abandoned beats finish in the background (the gateway deadline ends them); queued ones never start
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
 def generate_story_images(beats):
     """
     Create 3 AI-generated images for each story beat.
-    Converts base64 output from Together API into temporary files
-    served via /download/<filename>.
+    Images land in STORY_STORE keyed by their prompt and are
+    served via /download/story/<key>.png. Beats run concurrently; results keep beat order.
     """
-    image_urls = []
-
-    for b in beats:
-        try:
-            img_prompt = f"{b['prompt']} | cinematic, natural light, detailed textures, poetic atmosphere"
-            response = client.images.generate(
-                model=IMAGE_MODEL,
-                prompt=img_prompt,
-                size="1024x1024",
-                steps=8
-            )
-
-            print("[DEBUG RAW IMAGE RESPONSE]", response.__dict__)
-
-            data = getattr(response, "data", [])
-            if not data:
-                raise ValueError("Empty image response")
-
-            item = data[0]
-            image_bytes = None
-
-            # 🧩 Handle URL first, then base64 fallback
-            if hasattr(item, "url") and item.url:
-                image_urls.append({"title": b.get("title", ""), "url": item.url})
-                continue  # ✅ Together returned a hosted image URL
-
-            elif hasattr(item, "b64_json") and item.b64_json:
-                image_bytes = base64.b64decode(item.b64_json)
-
-            elif isinstance(item, dict):
-                if "url" in item and item["url"]:
-                    image_urls.append({"title": b.get("title", ""), "url": item["url"]})
-                    continue
-                elif "b64_json" in item and item["b64_json"]:
-                    image_bytes = base64.b64decode(item["b64_json"])
-
-
-            # 🖼️ Save image to /tmp
-            if image_bytes:
-                import uuid
-                filename = f"story_{uuid.uuid4().hex}.png"
-                path = f"/tmp/{filename}"
-                with open(path, "wb") as f:
-                    f.write(image_bytes)
-                image_url = f"/download/{filename}"
-            else:
-                image_url = "https://placekitten.com/512/512"
-
-            image_urls.append({
-                "title": b.get("title", ""),
-                "url": image_url
-            })
-
-        except Exception as e:
-            print(f"[ERROR] Image generation failed for {b.get('title','(unknown)')}: {e}")
-            image_urls.append({
-                "title": b.get("title", ""),
-                "url": "https://placekitten.com/512/512"
-            })
+    image_urls = [None] * len(beats)
+    for i, image in iter_story_images(beats):
+        image_urls[i] = image
 
     print("[DEBUG] Generated story images:", image_urls)
     return image_urls
 
 
-def create_micro_narrative_chapter(submissions):
+def create_micro_narrative_chapter(submissions, on_story=None, on_image=None):
     """
     High-level pipeline: 3 submissions → narrative text + 3 generated images
+    Optional callbacks stream progress: on_story(story_text, beats) as soon as the text is ready,
+    then on_image(beat_index, image) as each image finishes.
     """
     story_text, beats = generate_micro_narrative(submissions)
-    image_urls = generate_story_images(beats)
+    if on_story:
+        on_story(story_text, beats)
+    image_urls = [None] * len(beats)
+    for i, image in iter_story_images(beats):
+        image_urls[i] = image
+        if on_image:
+            on_image(i, image)
+    print("[DEBUG] Generated story images:", image_urls)
     return {
         "story_text": story_text,
         "beats": beats,
@@ -0,0 +1,163 @@
+# /app/novelty.py
+# Novelty index of recently issued tasks, per session and per geohash cell. Tasks become hashed
+# n-gram vectors (NumPy), so "is this too close to something they just got?" is one matrix product.
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+from geocache import geohash
+
+NOVELTY_THRESHOLD = float(os.getenv("NOVELTY_THRESHOLD", "0.6"))   # cosine similarity that counts as a repeat
+NOVELTY_WINDOW = int(os.getenv("NOVELTY_WINDOW", "30"))             # recent tasks remembered per scope
+NOVELTY_TTL = float(os.getenv("NOVELTY_TTL", str(24 * 3600)))
+NOVELTY_MAX_SCOPES = int(os.getenv("NOVELTY_MAX_SCOPES", "5000"))
+NOVELTY_CELL_PRECISION = 6                                          # geohash cell ≈ 1.2×0.6 km
+DIM = 256
+
+# Words every challenge shares; left in, they'd make all tasks look alike
+_STOPWORDS = frozenset(
+    "a an the and or of to in on at for with your you it its this that is are be as by from one some "
+    "something take snap record write photo picture video clip sound audio quick small short".split()
+)
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def _bucket(feature):
+    return zlib.crc32(feature.encode("utf-8")) % DIM
+
+
+def vectorize(text):
+    """Unit-length hashed vector of the task's content words, word bigrams and in-word trigrams."""
+    words = [w for w in _WORD_RE.findall(text.lower()) if w not in _STOPWORDS]
+    features = list(words)
+    features += [f"{a} {b}" for a, b in zip(words, words[1:])]
+    features += [f"#{w[i:i + 3]}" for w in words if len(w) > 4 for i in range(len(w) - 2)]
+    v = np.zeros(DIM, dtype=np.float32)
+    if features:
+        np.add.at(v, [_bucket(f) for f in features], 1.0)
+        v /= np.linalg.norm(v)
+    return v
+
+
+class _Scope:
+    """Ring buffer of the last `window` task vectors for one session or cell (grown on demand)."""
+
+    def __init__(self, window):
+        self.window = window
+        self.vectors = np.zeros((min(4, window), DIM), dtype=np.float32)
+        self.texts = []
+        self.times = np.zeros(len(self.vectors))
+        self.next = 0
+
+    def add(self, vec, text, now):
+        if len(self.texts) < self.window and len(self.texts) == len(self.vectors):
+            size = min(self.window, 2 * len(self.vectors))
+            self.vectors = np.vstack([self.vectors, np.zeros((size - len(self.vectors), DIM), dtype=np.float32)])
+            self.times = np.concatenate([self.times, np.zeros(size - len(self.times))])
+        i = self.next
+        self.vectors[i], self.times[i] = vec, now
+        if i < len(self.texts):
+            self.texts[i] = text
+        else:
+            self.texts.append(text)
+        self.next = (i + 1) % self.window
+
+
+class NoveltyIndex:
+    """
+    `similarity(text, scopes)` → {"score", "closest", "scope"}: the highest cosine similarity between
+    `text` and any unexpired task in those scopes. `check`/`is_novel` compare that to the threshold;
+    `add` records an issued task in every scope.
+    """
+
+    def __init__(self, threshold=NOVELTY_THRESHOLD, window=NOVELTY_WINDOW, ttl=NOVELTY_TTL,
+                 max_scopes=NOVELTY_MAX_SCOPES):
+        self.threshold = threshold
+        self.window = window
+        self.ttl = ttl
+        self.max_scopes = max_scopes
+        self._scopes = OrderedDict()
+        self._lock = threading.Lock()
+        self.checks = self.rejections = 0
+
+    @staticmethod
+    def scopes_for(session_id=None, lat=None, lon=None):
+        scopes = []
+        if session_id:
+            scopes.append(f"session:{session_id}")
+        if lat is not None and lon is not None:
+            scopes.append(f"cell:{geohash(float(lat), float(lon), NOVELTY_CELL_PRECISION)}")
+        return scopes
+
+    def similarity(self, text, scopes):
+        vec = vectorize(text)
+        best = {"score": 0.0, "closest": None, "scope": None}
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            for key in scopes:
+                scope = self._scopes.get(key)
+                if scope is None or not scope.texts:
+                    continue
+                n = len(scope.texts)
+                sims = scope.vectors[:n] @ vec
+                sims[scope.times[:n] < cutoff] = 0.0
+                i = int(np.argmax(sims))
+                if sims[i] > best["score"]:
+                    best = {"score": round(float(sims[i]), 3), "closest": scope.texts[i], "scope": key}
+        return best
+
+    def check(self, text, scopes):
+        """`similarity` plus "novel" (score under the threshold); counted in the stats."""
+        result = self.similarity(text, scopes)
+        result["novel"] = result["score"] < self.threshold
+        with self._lock:
+            self.checks += 1
+            self.rejections += not result["novel"]
+        return result
+
+    def is_novel(self, text, scopes):
+        return self.check(text, scopes)["novel"]
+
+    def recent(self, scopes):
+        """The most recently issued unexpired task across the scopes, or None."""
+        latest, text = time.time() - self.ttl, None
+        with self._lock:
+            for key in scopes:
+                scope = self._scopes.get(key)
+                if scope is not None and scope.texts:
+                    i = (scope.next - 1) % len(scope.texts)
+                    if scope.times[i] > latest:
+                        latest, text = scope.times[i], scope.texts[i]
+        return text
+
+    def add(self, text, scopes):
+        vec, now = vectorize(text), time.time()
+        with self._lock:
+            for key in scopes:
+                scope = self._scopes.get(key)
+                if scope is None:
+                    scope = self._scopes[key] = _Scope(self.window)
+                self._scopes.move_to_end(key)
+                scope.add(vec, text, now)
+            while len(self._scopes) > self.max_scopes:
+                self._scopes.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._scopes.clear()
+            self.checks = self.rejections = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "scopes": len(self._scopes),
+                "checks": self.checks,
+                "rejections": self.rejections,
+                "rejection_rate": round(self.rejections / self.checks, 3) if self.checks else 0.0,
+                "threshold": self.threshold,
+            }
@@ -0,0 +1,191 @@
+# /app/outbound.py
+# Shared outbound HTTP layer: pooled keep-alive sessions per host, jittered retries under a
+# retry budget, per-upstream circuit breakers and latency histograms.
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+MAX_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.2"))
+# Retry budget: every request earns RETRY_RATIO tokens (capped), every retry spends one,
+# so retries can never add more than ~20% load to an upstream that's struggling.
+RETRY_RATIO = float(os.getenv("HTTP_RETRY_RATIO", "0.2"))
+RETRY_BUDGET_MAX = float(os.getenv("HTTP_RETRY_BUDGET_MAX", "10"))
+BREAKER_FAILURES = int(os.getenv("HTTP_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.getenv("HTTP_BREAKER_COOLDOWN", "30"))
+DEFAULT_TIMEOUT = 10
+USER_AGENT = "hoppi-app"
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is "slower than that"
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised without touching the network while an upstream's breaker is open."""
+
+
+class CircuitBreaker:
+    """Closed → open after N consecutive failures → half-open (one probe) after the cooldown."""
+
+    def __init__(self, failures=BREAKER_FAILURES, cooldown=BREAKER_COOLDOWN):
+        self.max_failures = failures
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self.probing:
+                self.probing = True
+                return True
+            return False
+
+    def record(self, ok: bool):
+        with self._lock:
+            self.probing = False
+            if ok:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.failures >= self.max_failures or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+
+class Upstream:
+    """Per-host state: keep-alive session, breaker, retry budget and latency histogram."""
+
+    def __init__(self, host):
+        self.host = host
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["User-Agent"] = USER_AGENT
+        self.breaker = CircuitBreaker()
+        self.retry_tokens = RETRY_BUDGET_MAX
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.requests = self.errors = self.retries = self.short_circuits = 0
+        self.total_ms = 0.0
+        self._lock = threading.Lock()
+
+    def _earn(self):
+        with self._lock:
+            self.requests += 1
+            self.retry_tokens = min(RETRY_BUDGET_MAX, self.retry_tokens + RETRY_RATIO)
+
+    def _spend_retry(self) -> bool:
+        with self._lock:
+            if self.retry_tokens < 1:
+                return False
+            self.retry_tokens -= 1
+            self.retries += 1
+            return True
+
+    def _observe(self, ms, ok):
+        with self._lock:
+            self.total_ms += ms
+            if not ok:
+                self.errors += 1
+            i = next((i for i, bound in enumerate(LATENCY_BUCKETS_MS) if ms <= bound), len(LATENCY_BUCKETS_MS))
+            self.buckets[i] += 1
+
+    def stats(self):
+        with self._lock:
+            observed = sum(self.buckets)
+            labels = [f"le_{b}ms" for b in LATENCY_BUCKETS_MS] + ["inf"]
+            return {
+                "state": self.breaker.state,
+                "requests": self.requests,
+                "errors": self.errors,
+                "retries": self.retries,
+                "short_circuits": self.short_circuits,
+                "avg_ms": round(self.total_ms / observed, 1) if observed else 0.0,
+                "latency_histogram": dict(zip(labels, self.buckets)),
+            }
+
+
+_upstreams = {}
+_upstreams_lock = threading.Lock()
+
+
+def upstream_for(url) -> Upstream:
+    host = urlsplit(url).netloc
+    with _upstreams_lock:
+        if host not in _upstreams:
+            _upstreams[host] = Upstream(host)
+        return _upstreams[host]
+
+
+def request(method, url, retries=None, **kw):
+    """
+    Send a request through the host's pooled session. Connection errors, timeouts and 429/5xx are
+    retried with jittered exponential backoff while the retry budget allows (GET only by default).
+    Raises CircuitOpenError immediately when the upstream's breaker is open.
+    """
+    up = upstream_for(url)
+    kw.setdefault("timeout", DEFAULT_TIMEOUT)
+    if retries is None:
+        retries = MAX_RETRIES if method.upper() == "GET" else 0
+
+    up._earn()
+    attempt = 0
+    while True:
+        if not up.breaker.allow():
+            with up._lock:
+                up.short_circuits += 1
+            raise CircuitOpenError(f"Circuit open for {up.host}")
+
+        started = time.monotonic()
+        res, ok, error = None, False, None
+        try:
+            res = up.session.request(method, url, **kw)
+            ok = res.status_code not in RETRY_STATUSES
+        except requests.exceptions.RequestException as e:
+            error = e
+        finally:
+            # Always recorded, or a half-open probe that raised would leave the breaker stuck probing
+            up._observe((time.monotonic() - started) * 1000, ok)
+            up.breaker.record(ok)
+
+        transient = error is None or isinstance(error, (requests.exceptions.ConnectionError,
+                                                        requests.exceptions.Timeout))
+        if ok or not transient or attempt >= retries or not up._spend_retry():
+            if error is not None:
+                raise error
+            return res
+        attempt += 1
+        # Full jitter: sleep somewhere in [0, base * 2^attempt)
+        time.sleep(random.uniform(0, BACKOFF_BASE * (2 ** attempt)))
+
+
+def get(url, **kw):
+    return request("GET", url, **kw)
+
+
+def post(url, **kw):
+    return request("POST", url, **kw)
+
+
+def stats():
+    with _upstreams_lock:
+        ups = list(_upstreams.values())
+    return {up.host: up.stats() for up in ups}
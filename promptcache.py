@@ -0,0 +1,179 @@
+# /app/promptcache.py
+# Response cache for LLM calls keyed by the normalized fields a prompt is built from (not its raw
+# text), with a reuse policy per call site: exact reuse, or pick one of k cached variants.
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from contentstore import content_key
+
+# namespace -> reuse mode, variants kept (k), TTL seconds, max in-memory keys
+#   "exact": the first answer is reused as-is
+#   "variants": the first k calls for a key each ask the model; after that a cached one is picked at random
+DEFAULT_POLICIES = {
+    "task":      {"mode": "variants", "k": int(os.getenv("PROMPT_CACHE_TASK_VARIANTS", "4")),
+                  "ttl": 30 * 60,           "max_entries": 2000},
+    "judge":     {"mode": "exact", "k": 1, "ttl": 24 * 3600,        "max_entries": 5000},
+    "narrative": {"mode": "exact", "k": 1, "ttl": 7 * 24 * 3600,    "max_entries": 1000},
+}
+
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize(value):
+    """Case/whitespace-insensitive form of a prompt field; floats are rounded so noise doesn't split keys."""
+    if isinstance(value, str):
+        return _SPACE_RE.sub(" ", value).strip().lower()
+    if isinstance(value, float):
+        return round(value, 3)
+    if isinstance(value, dict):
+        return {k: normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize(v) for v in value]
+    return value
+
+
+class PromptCache:
+    """
+    Per-namespace LRU + TTL cache of model answers, with optional SQLite write-through so entries
+    survive restarts. Answers must be JSON-serialisable; failures are never cached.
+    """
+
+    def __init__(self, policies=None, path=None):
+        self.policies = {k: dict(v) for k, v in (policies or DEFAULT_POLICIES).items()}
+        self._entries = {name: OrderedDict() for name in self.policies}   # key -> (variants, expires)
+        self._counters = {name: {"hits": 0, "misses": 0} for name in self.policies}
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._open_disk(path)
+
+    # --- disk backing ---
+    def _open_disk(self, path):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS prompt_cache ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL, variants TEXT NOT NULL, expires REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            self._db.execute("DELETE FROM prompt_cache WHERE expires < ?", (time.time(),))
+            self._db.commit()
+        except Exception as e:
+            print(f"[WARN] Prompt cache disk backing disabled ({path}): {e}")
+            self._db = None
+
+    def _disk_get(self, namespace, key):
+        if self._db is None:
+            return None
+        row = self._db.execute(
+            "SELECT variants, expires FROM prompt_cache WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        if row and row[1] > time.time():
+            return json.loads(row[0]), row[1]
+        return None
+
+    def _disk_put(self, namespace, key, variants, expires):
+        if self._db is None:
+            return
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO prompt_cache (namespace, key, variants, expires) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(variants), expires),
+            )
+            self._db.commit()
+        except Exception as e:
+            print(f"[WARN] Prompt cache disk write failed: {e}")
+
+    # --- public API ---
+    def key_for(self, namespace, fields):
+        return content_key(namespace, normalize(fields))
+
+    def _item(self, namespace, key):
+        item = self._entries[namespace].get(key)
+        if item is not None and item[1] <= time.time():
+            del self._entries[namespace][key]
+            item = None
+        if item is None:
+            item = self._disk_get(namespace, key)
+            if item is not None:
+                self._store(namespace, key, *item)
+        return item
+
+    def get(self, namespace, fields):
+        """A reusable cached answer, or None (counts a hit/miss). Variant keys miss until k are cached."""
+        policy = self.policies[namespace]
+        key = self.key_for(namespace, fields)
+        with self._lock:
+            item = self._item(namespace, key)
+            if item is None or len(item[0]) < policy["k"]:
+                self._counters[namespace]["misses"] += 1
+                return None
+            self._entries[namespace].move_to_end(key)
+            self._counters[namespace]["hits"] += 1
+            return random.choice(item[0])
+
+    def put(self, namespace, fields, value):
+        """Record a fresh answer: replaces it in exact mode, adds a variant (up to k) otherwise."""
+        policy = self.policies[namespace]
+        key = self.key_for(namespace, fields)
+        with self._lock:
+            item = self._item(namespace, key)
+            variants = list(item[0]) if item is not None and policy["mode"] == "variants" else []
+            if value not in variants:
+                variants = (variants + [value])[-policy["k"]:]
+            # Adding a variant doesn't extend the key's lifetime, so a creative key is refreshed every TTL
+            expires = item[1] if item is not None and policy["mode"] == "variants" else time.time() + policy["ttl"]
+            self._store(namespace, key, variants, expires)
+            self._disk_put(namespace, key, variants, expires)
+
+    def _store(self, namespace, key, variants, expires):
+        entries = self._entries[namespace]
+        entries[key] = (variants, expires)
+        entries.move_to_end(key)
+        while len(entries) > self.policies[namespace]["max_entries"]:
+            entries.popitem(last=False)
+
+    def get_or_load(self, namespace, fields, loader):
+        """
+        Return a cached answer for these fields, calling `loader()` on a miss.
+        Exceptions from `loader` propagate and are never cached, so callers keep their own fallbacks.
+        """
+        value = self.get(namespace, fields)
+        if value is None:
+            value = loader()
+            self.put(namespace, fields, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            for entries in self._entries.values():
+                entries.clear()
+            for c in self._counters.values():
+                c["hits"] = c["misses"] = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM prompt_cache")
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            out = {}
+            for name, c in self._counters.items():
+                total = c["hits"] + c["misses"]
+                out[name] = {
+                    "mode": self.policies[name]["mode"],
+                    "hits": c["hits"],
+                    "misses": c["misses"],
+                    "hit_rate": round(c["hits"] / total, 3) if total else 0.0,
+                    "size": len(self._entries[name]),
+                }
+            return out
+
+
+PROMPT_CACHE = PromptCache(path=os.getenv("PROMPT_CACHE_PATH") or None)
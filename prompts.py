@@ -0,0 +1,243 @@
+# /app/prompts.py
+# Prompt templates compiled once at import: the static instructions form a byte-identical prefix
+# (so provider-side prefix caching can reuse it) and the per-request context goes at the end,
+# with variable fields truncated to fit a per-call token budget.
+import os
+import string
+import threading
+
+CHARS_PER_TOKEN = 4   # the usual English estimate; close enough for budgeting both gpt-oss and gemma
+ELLIPSIS = "…"
+
+
+def count_tokens(text) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN) if text else 0
+
+
+def truncate_tokens(text, max_tokens):
+    """Cut `text` to about `max_tokens` at a word boundary, marking the cut with an ellipsis."""
+    text = str(text or "")
+    if count_tokens(text) <= max_tokens:
+        return text
+    limit = max(0, max_tokens * CHARS_PER_TOKEN - len(ELLIPSIS))
+    cut = text[:limit]
+    if " " in cut[limit // 2:]:
+        cut = cut[:cut.rindex(" ")]
+    return cut.rstrip(" ,.;:") + ELLIPSIS
+
+
+class RenderedPrompt(str):
+    """
+    The prompt text, plus `tokens` (estimated), the names of the fields that were truncated and
+    whether it is still over the template's budget.
+    """
+
+    def __new__(cls, text, tokens, truncated, over_budget=False):
+        self = super().__new__(cls, text)
+        self.tokens = tokens
+        self.truncated = truncated
+        self.over_budget = over_budget
+        return self
+
+
+class PromptTemplate:
+    """
+    `prefix` is fixed text; `context` is a string.Template ($name fields) rendered per call and
+    appended after it. `limits` caps individual fields in tokens; if the whole prompt is still over
+    `budget`, those same fields are shortened further, longest first.
+    """
+
+    def __init__(self, name, prefix, context, budget, limits=None):
+        self.name = name
+        self.prefix = prefix.strip() + "\n\n"
+        self.context = string.Template(context.strip() + "\n")
+        self.budget = budget
+        self.limits = dict(limits or {})
+        self.prefix_tokens = count_tokens(self.prefix)
+        self.calls = self.total_tokens = self.max_tokens = self.truncations = self.over_budget = 0
+        self._lock = threading.Lock()
+
+    def _fit(self, fields):
+        truncated = []
+        for name, limit in self.limits.items():
+            value = str(fields.get(name) or "")
+            if count_tokens(value) > limit:
+                fields[name] = truncate_tokens(value, limit)
+                truncated.append(name)
+        text = self.prefix + self.context.substitute(fields)
+        over = count_tokens(text) - self.budget
+        while over > 0:
+            name = max(self.limits, key=lambda n: count_tokens(str(fields.get(n) or "")), default=None)
+            size = count_tokens(str(fields.get(name) or "")) if name else 0
+            if size <= 1:
+                break   # nothing left to give; the fixed text alone is over budget
+            fields[name] = truncate_tokens(fields[name], max(1, size - over))
+            if name not in truncated:
+                truncated.append(name)
+            text = self.prefix + self.context.substitute(fields)
+            over = count_tokens(text) - self.budget
+        return text, truncated
+
+    def render(self, **fields):
+        text, truncated = self._fit(fields)
+        tokens = count_tokens(text)
+        over = tokens > self.budget
+        with self._lock:
+            self.calls += 1
+            self.total_tokens += tokens
+            self.max_tokens = max(self.max_tokens, tokens)
+            self.truncations += bool(truncated)
+            self.over_budget += over
+        print(f"[{'WARN' if over else 'DEBUG'}] Prompt '{self.name}': {tokens} tokens (prefix {self.prefix_tokens}, "
+              f"budget {self.budget})" + (f", truncated {', '.join(truncated)}" if truncated else ""))
+        return RenderedPrompt(text, tokens, truncated, over)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "prefix_tokens": self.prefix_tokens,
+                "avg_tokens": round(self.total_tokens / self.calls, 1) if self.calls else 0.0,
+                "max_tokens": self.max_tokens,
+                "budget": self.budget,
+                "truncations": self.truncations,
+                "over_budget": self.over_budget,
+            }
+
+
+TASK_PROMPT = PromptTemplate(
+    "task",
+    prefix="""
+You are a warm, witty real-world assistant named Hoppi.
+
+Write ONE real-time challenge (25–30 words) for the user, using the context at the end.
+It must clearly include the weather hint and the current light condition from the context.
+For example, if it’s raining, the task should mention rain or wet surfaces directly.
+No emojis/hashtags. Avoid repetitive openings. No exact clock time.
+Simple, 12-year-old-friendly, spontaneous, doable now with just a phone.
+Each challenge should invite the user to do *only one small action* — like take a photo, record ambient sound, take a few seconds clip or write one thought.
+The weather and time should influence the tone.
+""",
+    context="""
+Context:
+The user’s environment: $location_type.
+Coordinates: $coordinates.
+Local time (approx hour): $hour:00.
+$weather_hint
+According to the sun cycle, it’s $period.
+$time_hint
+$safety_hint
+
+Nearby info: $nearby_hint
+Variation: $variation_hint
+Freshness: $freshness_hint
+""",
+    budget=int(os.getenv("PROMPT_BUDGET_TASK", "450")),
+    limits={"nearby_hint": 60, "location_type": 12},
+)
+
+_JUDGE_INSTRUCTIONS = """
+You are Hoppi — a witty, thoughtful AI who is a story companion, not just a reviewer.
+You react to a user's submission for a small real-world task; the task, the submission and the
+setting are given at the end.
+
+Your goal:
+1. Skip greetings like “Hello there” or “Hi friend.”
+2. Be short, friendly, and specific (under 30 words).
+3. React to the actual content first — summarize or interpret what the user submitted (especially audio or image content), even if it diverges from the task.
+4. Use surprise or contrast. Point out what’s weird, bold, or interesting in what they did.
+5. If it’s off-task: tease them a little, but make it fun — like “that’s not what I asked, but I’ll allow it.”
+6. Avoid generic compliments (“Beautiful!” “Nice work!”). Focus on imagery, tone, or emotion evoked.
+7. No emojis, hashtags, lists, or markdown.
+8. Be playful and teasing — like a clever friend noticing what they *tried* to do.
+
+Examples:
+
+A. User sends breath audio as requested:
+> “Alright, that’s definitely breathing. Not creepy at all. You and the BUDō door are totally vibing. Want the next one?”
+
+B. User sends something random instead of breath:
+> “That’s not a breath. That’s... a glitchy rave? But sure, let’s pretend it’s your soul pulsing at 6am. Let’s see what’s next.”
+
+C. User nails the mood:
+> “Oooh that clip is so calm I almost took a nap. You’re setting the mood early. Ready to shake it up?”
+
+D. Totally empty or meaningless input:
+> “You blinked, didn’t you? Try again — I want to hear something real.”
+
+Rules:
+- Be short (under 30 words).
+- Be specific, casual, and grounded.
+- No greetings, hashtags, or quotes.
+- Always react to the submission. Never ignore it.
+- Keep the voice smart, warm, and just a little chaotic.
+"""
+
+JUDGE_PROMPT = PromptTemplate(
+    "judge",
+    prefix=_JUDGE_INSTRUCTIONS,
+    context="""
+Task:
+> $task
+
+User submission:
+> $sample
+
+Environment context:
+- Media type: $media_type
+- Location: $location, $weather
+- Time: $period
+- Tone: $tone
+- Humor: $humor
+""",
+    budget=int(os.getenv("PROMPT_BUDGET_JUDGE", "900")),
+    limits={"task": 80, "sample": 200},
+)
+
+# Several submissions in one call (judgebatch.py); same rules, so the judge prefix is shared
+JUDGE_BATCH_PROMPT = PromptTemplate(
+    "judge_batch",
+    prefix=_JUDGE_INSTRUCTIONS + """
+You will get several independent submissions, each with a numeric id. React to each one on its own.
+Return ONLY a JSON array with one object per submission, in any order:
+[{"id": 1, "feedback": "..."}, {"id": 2, "feedback": "..."}]
+""",
+    context="""
+Submissions:
+
+$items
+""",
+    budget=int(os.getenv("PROMPT_BUDGET_JUDGE_BATCH", "4000")),
+)
+
+TEMPLATES = {t.name: t for t in (TASK_PROMPT, JUDGE_PROMPT, JUDGE_BATCH_PROMPT)}
+
+
+def render_judge_batch(items):
+    """
+    Multi-item judge prompt from [(id, judge fields), ...]; each item's fields get the single-call
+    caps. Items are added in order while they fit the budget (the first always goes in); `ids` on
+    the result lists the ones included, and the caller judges the rest one by one.
+    """
+    room = JUDGE_BATCH_PROMPT.budget - count_tokens(JUDGE_BATCH_PROMPT.prefix
+                                                    + JUDGE_BATCH_PROMPT.context.substitute(items=""))
+    blocks, ids = [], []
+    for item_id, f in items:
+        task = truncate_tokens(f["task"], JUDGE_PROMPT.limits["task"])
+        sample = truncate_tokens(f["sample"], JUDGE_PROMPT.limits["sample"])
+        block = (
+            f"[id {item_id}]\nTask: {task}\nUser submission: {sample}\n"
+            f"Media type: {f['media_type']} | Location: {f['location']}, {f['weather']} | "
+            f"Time: {f['period']} | Tone: {f['tone']} | Humor: {f['humor']}"
+        )
+        if blocks and count_tokens("\n\n".join(blocks + [block])) > room:
+            break
+        blocks.append(block)
+        ids.append(item_id)
+    prompt = JUDGE_BATCH_PROMPT.render(items="\n\n".join(blocks))
+    prompt.ids = ids
+    return prompt
+
+
+def stats():
+    return {name: t.stats() for name, t in TEMPLATES.items()}
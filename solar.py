@@ -0,0 +1,113 @@
+# /app/solar.py
+# Offline solar-position engine (NOAA spreadsheet equations) → sunrise/sunset and day period
+# Works on scalars or NumPy arrays of coordinates; accurate to ~1 minute between ±72° latitude.
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+# Sun's centre 0.833° below the horizon: refraction + solar disc radius
+SUNRISE_ZENITH = 90.833
+
+# Status codes returned alongside event times
+NORMAL, POLAR_DAY, POLAR_NIGHT = 0, 1, -1
+
+
+def _julian_day(d) -> float:
+    """Julian day at 0h UTC of a date."""
+    return d.toordinal() + 1721424.5
+
+
+def _solar_date(now: datetime, lon):
+    """Local *solar* calendar date, so evening in the Americas isn't read as the next UTC day."""
+    return (now + timedelta(hours=float(lon) / 15.0)).date()
+
+
+def solar_events(lat, lon, jd):
+    """
+    Vectorised core. Returns (sunrise, sunset, solar_noon, status) in minutes after 0h UTC of the
+    day `jd` (may fall outside 0–1440 for far-east/west longitudes). Sunrise/sunset are NaN when
+    `status` is POLAR_DAY or POLAR_NIGHT.
+    """
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    # Evaluate near local solar noon for the best sunrise/sunset estimate
+    t = (np.asarray(jd, dtype=float) + 0.5 - lon / 360.0 - 2451545.0) / 36525.0
+
+    l0 = np.mod(280.46646 + t * (36000.76983 + t * 0.0003032), 360.0)
+    m = 357.52911 + t * (35999.05029 - 0.0001537 * t)
+    e = 0.016708634 - t * (0.000042037 + 0.0000001267 * t)
+    m_r = np.radians(m)
+    c = (np.sin(m_r) * (1.914602 - t * (0.004817 + 0.000014 * t))
+         + np.sin(2 * m_r) * (0.019993 - 0.000101 * t)
+         + np.sin(3 * m_r) * 0.000289)
+    omega = np.radians(125.04 - 1934.136 * t)
+    app_long = np.radians(l0 + c - 0.00569 - 0.00478 * np.sin(omega))
+    mean_obliq = 23.0 + (26.0 + (21.448 - t * (46.815 + t * (0.00059 - t * 0.001813))) / 60.0) / 60.0
+    obliq = np.radians(mean_obliq + 0.00256 * np.cos(omega))
+    decl = np.arcsin(np.sin(obliq) * np.sin(app_long))
+
+    y = np.tan(obliq / 2) ** 2
+    l0_r = np.radians(l0)
+    eq_time = 4 * np.degrees(
+        y * np.sin(2 * l0_r) - 2 * e * np.sin(m_r) + 4 * e * y * np.sin(m_r) * np.cos(2 * l0_r)
+        - 0.5 * y * y * np.sin(4 * l0_r) - 1.25 * e * e * np.sin(2 * m_r)
+    )
+
+    lat_r = np.radians(lat)
+    cos_ha = (np.cos(np.radians(SUNRISE_ZENITH)) / (np.cos(lat_r) * np.cos(decl))
+              - np.tan(lat_r) * np.tan(decl))
+    status = np.where(cos_ha < -1, POLAR_DAY, np.where(cos_ha > 1, POLAR_NIGHT, NORMAL))
+    ha = np.degrees(np.arccos(np.clip(cos_ha, -1.0, 1.0)))
+    ha = np.where(status == NORMAL, ha, np.nan)
+
+    noon = 720.0 - 4.0 * lon - eq_time
+    return noon - 4.0 * ha, noon + 4.0 * ha, noon, status
+
+
+def sun_times(lat, lon, now=None):
+    """Scalar helper: (sunrise, sunset) as aware UTC datetimes for the local solar day, or (None, None) at the poles."""
+    now = now or datetime.now(timezone.utc)
+    d = _solar_date(now, lon)
+    rise, sett, _, status = solar_events(lat, lon, _julian_day(d))
+    if int(status) != NORMAL:
+        return None, None
+    midnight = datetime(d.year, d.month, d.day, tzinfo=timezone.utc)
+    return midnight + timedelta(minutes=float(rise)), midnight + timedelta(minutes=float(sett))
+
+
+def _classify(minutes_now, rise, sett, noon, status):
+    """Vectorised day-period labels from minutes-since-midnight-UTC of the solar date."""
+    labels = np.select(
+        [minutes_now < rise,
+         minutes_now < rise + 240,      # 4 h after sunrise
+         minutes_now < sett - 120,      # until 2 h before sunset
+         minutes_now < sett],
+        ["pre-dawn", "morning", "afternoon", "evening"],
+        default="night",
+    )
+    # Midnight sun: fall back to local solar time; polar night is always night
+    solar_hour = np.mod((minutes_now - noon) / 60.0 + 12.0, 24.0)
+    polar_day = np.select([solar_hour < 12, solar_hour < 18], ["morning", "afternoon"], default="evening")
+    labels = np.where(status == POLAR_DAY, polar_day, labels)
+    return np.where(status == POLAR_NIGHT, "night", labels)
+
+
+def day_period(lat, lon, now=None) -> str:
+    """Classify `now` at (lat, lon) as pre-dawn / morning / afternoon / evening / night."""
+    return str(day_periods([lat], [lon], now)[0])
+
+
+def day_periods(lats, lons, now=None):
+    """Batch version of `day_period` over arrays of coordinates; returns a NumPy array of labels."""
+    now = now or datetime.now(timezone.utc)
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    # Each coordinate gets its own solar date; express `now` relative to that date's 0h UTC
+    shifted = np.datetime64(now.astimezone(timezone.utc).replace(tzinfo=None), "s") \
+        + (lons / 15.0 * 3600).astype("timedelta64[s]")
+    days = shifted.astype("datetime64[D]")
+    jd = days.astype("int64") + 2440587.5          # 1970-01-01 → JD 2440587.5
+    minutes_now = (np.datetime64(now.astimezone(timezone.utc).replace(tzinfo=None), "s")
+                   - days.astype("datetime64[s]")).astype("int64") / 60.0
+    rise, sett, noon, status = solar_events(lats, lons, jd)
+    return _classify(minutes_now, rise, sett, noon, status)
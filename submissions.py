@@ -0,0 +1,198 @@
+# /app/submissions.py
+# SQLite (WAL) store for submission metadata: atomic per-session index allocation, O(1) progress
+# counts and indexed lookups. Media files stay on disk under UPLOAD_FOLDER and are referenced by path.
+import json
+import os
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+
+BUSY_TIMEOUT_MS = 5000
+# Columns mirrored from meta.json; anything else in a meta dict is kept in the `extra` JSON blob
+COLUMNS = ("task", "media_type", "file", "text", "lat", "lon", "created_utc", "judge_text", "fit_score",
+           "thumbnail")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id  TEXT PRIMARY KEY,
+    next_index  INTEGER NOT NULL DEFAULT 1,
+    count       INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS submissions (
+    session_id  TEXT NOT NULL,
+    idx         INTEGER NOT NULL,
+    task        TEXT,
+    media_type  TEXT,
+    file        TEXT,
+    text        TEXT,
+    lat         REAL,
+    lon         REAL,
+    created_utc TEXT,
+    judge_text  TEXT,
+    fit_score   REAL,
+    thumbnail   TEXT,
+    extra       TEXT,
+    PRIMARY KEY (session_id, idx)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+class SubmissionStore:
+    """One connection per thread; writers serialize through SQLite's own locking (BEGIN IMMEDIATE)."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        # Columns added after a database was created
+        have = {r["name"] for r in conn.execute("PRAGMA table_info(submissions)")}
+        for col in COLUMNS:
+            if col not in have:
+                conn.execute(f"ALTER TABLE submissions ADD COLUMN {col}")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False,
+                                   timeout=BUSY_TIMEOUT_MS / 1000)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _write(self, fn):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            out = fn(conn)
+            conn.execute("COMMIT")
+            return out
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    # --- writes ---
+    def allocate_index(self, session_id) -> int:
+        """Reserve the session's next submission index; concurrent callers always get distinct ones."""
+        def _alloc(conn):
+            conn.execute("INSERT OR IGNORE INTO sessions (session_id) VALUES (?)", (session_id,))
+            conn.execute("UPDATE sessions SET next_index = next_index + 1 WHERE session_id = ?", (session_id,))
+            return conn.execute("SELECT next_index - 1 FROM sessions WHERE session_id = ?", (session_id,)).fetchone()[0]
+        return self._write(_alloc)
+
+    def add(self, meta):
+        """Record a submission (a meta dict with session_id + index); returns the session's new count."""
+        def _add(conn):
+            self._insert(conn, meta)
+            return conn.execute("SELECT count FROM sessions WHERE session_id = ?", (meta["session_id"],)).fetchone()[0]
+        return self._write(_add)
+
+    def _insert(self, conn, meta):
+        session_id, idx = meta["session_id"], int(meta["index"])
+        extra = {k: v for k, v in meta.items() if k not in COLUMNS and k not in ("session_id", "index")}
+        cur = conn.execute(
+            f"INSERT OR IGNORE INTO submissions (session_id, idx, {', '.join(COLUMNS)}, extra)"
+            f" VALUES (?, ?, {', '.join('?' * len(COLUMNS))}, ?)",
+            (session_id, idx, *(meta.get(c) for c in COLUMNS), json.dumps(extra) if extra else None),
+        )
+        conn.execute("INSERT OR IGNORE INTO sessions (session_id) VALUES (?)", (session_id,))
+        conn.execute(
+            "UPDATE sessions SET count = count + ?, next_index = MAX(next_index, ? + 1) WHERE session_id = ?",
+            (cur.rowcount, idx, session_id),
+        )
+        return cur.rowcount
+
+    def update(self, session_id, idx, **fields):
+        cols = [c for c in fields if c in COLUMNS]
+        if not cols:
+            return
+        self._write(lambda conn: conn.execute(
+            f"UPDATE submissions SET {', '.join(f'{c} = ?' for c in cols)} WHERE session_id = ? AND idx = ?",
+            (*(fields[c] for c in cols), session_id, idx),
+        ))
+
+    # --- reads ---
+    def count(self, session_id) -> int:
+        row = self._conn().execute("SELECT count FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0] if row else 0
+
+    def indices(self, session_id):
+        rows = self._conn().execute("SELECT idx FROM submissions WHERE session_id = ? ORDER BY idx", (session_id,))
+        return [r[0] for r in rows]
+
+    def get(self, session_id, idx):
+        row = self._conn().execute(
+            "SELECT * FROM submissions WHERE session_id = ? AND idx = ?", (session_id, idx)
+        ).fetchone()
+        return self._meta(row) if row else None
+
+    def recent(self, session_id, limit=3):
+        """Newest first."""
+        rows = self._conn().execute(
+            "SELECT * FROM submissions WHERE session_id = ? ORDER BY idx DESC LIMIT ?", (session_id, limit)
+        )
+        return [self._meta(r) for r in rows]
+
+    @staticmethod
+    def _meta(row):
+        meta = {"session_id": row["session_id"], "index": row["idx"]}
+        meta.update({c: row[c] for c in COLUMNS})
+        if row["extra"]:
+            meta.update(json.loads(row["extra"]))
+        return meta
+
+    def clear(self):
+        def _clear(conn):
+            for table in ("submissions", "sessions", "store_meta"):
+                conn.execute(f"DELETE FROM {table}")
+        self._write(_clear)
+
+    # --- one-shot import of the old directory layout ---
+    def migrate_from_dir(self, upload_root):
+        """
+        Import <upload_root>/<session>/<NNN>/meta.json into the store. Runs once per root (recorded in
+        store_meta); existing rows are left alone, so re-running after an interruption is safe.
+        Returns the number of submissions imported.
+        """
+        root = Path(upload_root)
+        marker = f"migrated:{root.resolve()}"
+        if self._conn().execute("SELECT 1 FROM store_meta WHERE key = ?", (marker,)).fetchone():
+            return 0
+        imported = 0
+        if root.is_dir():
+            for sdir in sorted(p for p in root.iterdir() if p.is_dir()):
+                metas = []
+                for entry in sorted(p for p in sdir.iterdir() if p.is_dir() and p.name.isdigit()):
+                    meta = {}
+                    meta_path = entry / "meta.json"
+                    if meta_path.exists():
+                        try:
+                            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+                        except Exception as e:
+                            print(f"[WARN] Skipping unreadable {meta_path}: {e}")
+                    meta["session_id"], meta["index"] = sdir.name, int(entry.name)
+                    metas.append(meta)
+                if metas:
+                    imported += self._write(lambda conn: sum(self._insert(conn, m) for m in metas))
+        self._write(lambda conn: conn.execute("INSERT OR REPLACE INTO store_meta VALUES (?, '1')", (marker,)))
+        if imported:
+            print(f"[INFO] Migrated {imported} submissions from {root} into {self.path}")
+        return imported
+
+
+def main(argv):
+    if len(argv) != 3 or argv[0] != "migrate":
+        print("usage: python submissions.py migrate <upload-root> <db-file>")
+        return 2
+    n = SubmissionStore(argv[2]).migrate_from_dir(argv[1])
+    print(f"Imported {n} submissions into {argv[2]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,155 @@
+# /app/taskpool.py
+# Background pool of pre-generated challenges per context bucket, so /generate-task can answer
+# from memory for common contexts and refill asynchronously after each pop.
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+TASK_POOL_SIZE = int(os.getenv("TASK_POOL_SIZE", "3"))        # tasks kept ready per key; 0 disables
+TASK_POOL_TTL = float(os.getenv("TASK_POOL_TTL", "900"))      # seconds before a pooled task goes stale
+TASK_POOL_WORKERS = int(os.getenv("TASK_POOL_WORKERS", "2"))
+TASK_POOL_MAX_KEYS = int(os.getenv("TASK_POOL_MAX_KEYS", "500"))
+# Requests a key must see before it gets a pool; most buckets are rare and would only waste refills
+TASK_POOL_MIN_REQUESTS = int(os.getenv("TASK_POOL_MIN_REQUESTS", "2"))
+DEDUPE_WINDOW = 200  # recently pooled/served tasks remembered per key
+
+
+def _normalize(text):
+    return re.sub(r"[^a-z0-9 ]+", "", text.lower()).split()
+
+
+class TaskPool:
+    """
+    `generate(prompt) -> str` writes one task; `prompt_factory() -> str` (passed to `refill`) builds the
+    prompt for a key, so pooled tasks come from exactly the same prompt construction as live ones.
+    """
+
+    def __init__(self, generate, target=TASK_POOL_SIZE, ttl=TASK_POOL_TTL,
+                 workers=TASK_POOL_WORKERS, max_keys=TASK_POOL_MAX_KEYS, min_requests=TASK_POOL_MIN_REQUESTS):
+        self.generate = generate
+        self.target = target
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.min_requests = min_requests
+        self._demand = OrderedDict()  # key -> requests seen while the key has no pool yet
+        self._pools = OrderedDict()   # key -> deque of {"task", "prompt", "created"}
+        self._seen = {}               # key -> deque of normalized task strings (de-duplication)
+        self._inflight = {}
+        self._generation = 0          # bumped by clear() so stale background jobs drop their result
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="hoppi-taskpool")
+        self.hits = self.misses = self.expired = self.duplicates = self.failures = self.cold_skips = 0
+
+    @property
+    def enabled(self):
+        return self.target > 0
+
+    def pop(self, key):
+        """Return a fresh pooled entry for `key`, or None."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            pool = self._pools.get(key)
+            while pool:
+                entry = pool.popleft()
+                if now - entry["created"] <= self.ttl:
+                    self._pools.move_to_end(key)
+                    self.hits += 1
+                    return entry
+                self.expired += 1
+            self.misses += 1
+            return None
+
+    def refill(self, key, prompt_factory):
+        """
+        Top the key back up to `target` in the background (never blocks the caller). A key only gets
+        a pool once it has been asked for `min_requests` times, so one-off buckets cost one LLM call.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if key not in self._pools:
+                seen = self._demand.pop(key, 0) + 1
+                if seen < self.min_requests:
+                    self._demand[key] = seen
+                    while len(self._demand) > self.max_keys:
+                        self._demand.popitem(last=False)
+                    self.cold_skips += 1
+                    return
+            pool = self._pools.setdefault(key, deque())
+            self._pools.move_to_end(key)
+            while len(self._pools) > self.max_keys:
+                old, _ = self._pools.popitem(last=False)
+                self._seen.pop(old, None)
+                self._inflight.pop(old, None)
+            needed = self.target - len(pool) - self._inflight.get(key, 0)
+            if needed <= 0:
+                return
+            self._inflight[key] = self._inflight.get(key, 0) + needed
+            generation = self._generation
+        for _ in range(needed):
+            self._executor.submit(self._fill_one, key, prompt_factory, generation)
+
+    def _fill_one(self, key, prompt_factory, generation):
+        entry = None
+        try:
+            prompt = prompt_factory()
+            task = (self.generate(prompt) or "").strip()
+            if task:
+                entry = {"task": task, "prompt": prompt.strip(), "created": time.time()}
+        except Exception as e:
+            print("[WARN] Task pool refill failed:", e)
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._inflight[key] = max(0, self._inflight.get(key, 1) - 1)
+            if entry is None:
+                self.failures += 1
+                return
+            if not self._remember(key, entry["task"]):
+                self.duplicates += 1
+                return
+            if key in self._pools:
+                self._pools[key].append(entry)
+
+    def note_issued(self, key, task):
+        """Record a live-generated task so the pool won't hand out a duplicate of it."""
+        with self._lock:
+            self._remember(key, task)
+
+    def _remember(self, key, task):
+        norm = " ".join(_normalize(task))
+        seen = self._seen.setdefault(key, deque(maxlen=DEDUPE_WINDOW))
+        if norm in seen:
+            return False
+        seen.append(norm)
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._pools.clear()
+            self._seen.clear()
+            self._inflight.clear()
+            self._demand.clear()
+            self._generation += 1
+            self.hits = self.misses = self.expired = self.duplicates = self.failures = self.cold_skips = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "keys": len(self._pools),
+                "ready": sum(len(p) for p in self._pools.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "expired": self.expired,
+                "duplicates": self.duplicates,
+                "failures": self.failures,
+                "cold_skips": self.cold_skips,
+            }
@@ -2,6 +2,7 @@
 # File: tests/conftest.py
 # =========================
 import os
+import time
 import importlib.util
 from pathlib import Path
 import pytest
@@ -23,6 +24,9 @@ def _locate_app_py(project_root: Path) -> Path:
 def app_module(tmp_path_factory):
     project_root = Path(__file__).resolve().parents[1]
     app_file = _locate_app_py(project_root)
+    # Feedback segments and their exports (written again at exit) stay out of the working tree
+    os.environ["FEEDBACK_DIR"] = str(tmp_path_factory.mktemp("feedback"))
+    os.environ["FEEDBACK_EXPORT_DIR"] = str(tmp_path_factory.mktemp("feedback_export"))
 
     # Import module from file path as "hoppi_app"
     spec = importlib.util.spec_from_file_location("hoppi_app", str(app_file))
@@ -47,6 +51,25 @@ def client(app_module, tmp_path, monkeypatch):
     if hasattr(app_module, "RESULTS_DIR"):
         app_module.RESULTS_DIR = str(results)
 
+    # Fresh upstream caches per test
+    if hasattr(app_module, "GEO_CACHE"):
+        app_module.GEO_CACHE.clear()
+    if hasattr(app_module, "TASK_POOL"):
+        app_module.TASK_POOL.clear()
+    if hasattr(app_module, "PROMPT_CACHE"):
+        app_module.PROMPT_CACHE.clear()
+    if hasattr(app_module, "NOVELTY"):
+        app_module.NOVELTY.clear()
+    if hasattr(app_module, "SUBMISSIONS"):
+        from submissions import SubmissionStore
+        monkeypatch.setattr(app_module, "SUBMISSIONS", SubmissionStore(uploads / "submissions.db"))
+    if hasattr(app_module, "UPLOADS"):
+        from uploads import UploadManager
+        monkeypatch.setattr(app_module, "UPLOADS", UploadManager(uploads / ".uploads"))
+    if hasattr(app_module, "MEDIA_SERVICE"):
+        from mediasvc import MediaService, StubBackend
+        monkeypatch.setattr(app_module, "MEDIA_SERVICE", MediaService(StubBackend()))
+
     # ---- Stub outbound HTTP calls ----
     class _FakeResp:
         def __init__(self, data=None, status=200):
@@ -91,6 +114,19 @@ def client(app_module, tmp_path, monkeypatch):
     app.testing = True
     return app.test_client()
 
+# /submit returns a job id; block until the background pipeline finishes
+@pytest.fixture
+def wait_job(client):
+    def _wait(job_id, timeout=60):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            j = client.get(f"/jobs/{job_id}").get_json()
+            if j["status"] in ("done", "failed"):
+                return j
+            time.sleep(0.02)
+        raise TimeoutError(f"job {job_id} still running")
+    return _wait
+
 # Handy coordinates used across tests
 @pytest.fixture
 def coords():
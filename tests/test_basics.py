@@ -2,6 +2,7 @@
 from pathlib import Path
 import io
 import json
+import time
 from pathlib import Path
 
 def test_generate_task_missing_coords_returns_400(client):
@@ -22,7 +23,7 @@ def test_generate_task_happy_writes_prompt_and_returns_task(client, coords):
     # probe typical path under tmp (uploaded by the app). We check via client.app config?
     # Instead, hit again to ensure it's not crashing; main assertion is 200 + task.
 
-def test_submit_with_file_saves_meta_and_counts_progress(client, coords):
+def test_submit_with_file_saves_meta_and_counts_progress(client, coords, wait_job):
     # 1) Upload a small "file" with session_id=s1
     file_bytes = b"%PDF-1.4\n%fake\n"
     data = {
@@ -35,12 +36,14 @@ def test_submit_with_file_saves_meta_and_counts_progress(client, coords):
     }
     files = {"file": (io.BytesIO(file_bytes), "doc.pdf")}
     r = client.post("/submit", data={**data, **files}, content_type="multipart/form-data")
-    assert r.status_code == 200, r.data
+    assert r.status_code == 202, r.data
     j = r.get_json()
     assert j["ok"] is True
     assert j["session_id"] == "s1"
     assert j["count"] == 1 and j["remaining"] == 4 and j["surprise_ready"] is False
-    assert isinstance(j["judge_text"], str) and len(j["judge_text"]) > 0  # from stubbed LLM
+    result = wait_job(j["job_id"])
+    assert result["status"] == "done"
+    assert isinstance(result["judge_text"], str) and len(result["judge_text"]) > 0  # from stubbed LLM
 
     # 2) Verify files saved under UPLOAD_FOLDER/s1/001/
     upload_root = Path(client.application.config["UPLOAD_FOLDER"])
@@ -68,7 +71,7 @@ def test_download_found_and_not_found(client, coords):
     }
     files = {"file": (io.BytesIO(file_bytes), "pic.jpg")}
     r = client.post("/submit", data={**data, **files}, content_type="multipart/form-data")
-    assert r.status_code == 200
+    assert r.status_code == 202
     # Build relative path as used by /download/<path:filename>
     upload_root = Path(client.application.config["UPLOAD_FOLDER"])
     saved_rel = Path("s2") / "001" / "pic.jpg"
@@ -83,3 +86,201 @@ def test_download_found_and_not_found(client, coords):
     r3 = client.get("/download/does/not/exist.bin")
     assert r3.status_code == 404
 
+
+def test_generate_task_stream_sends_tokens_then_done(monkeypatch, client, coords, app_module):
+    monkeypatch.setattr(app_module, "prompt_llm_stream", lambda prompt: iter(["Snap ", "a puddle."]), raising=True)
+    r = client.post("/generate-task/stream", json=coords)
+    assert r.status_code == 200 and r.mimetype == "text/event-stream"
+    frames = [f for f in r.get_data(as_text=True).split("\n\n") if f]
+    events = [(f.split("\n")[0][len("event: "):], json.loads(f.split("\n")[1][len("data: "):])) for f in frames]
+    assert [e for e, _ in events] == ["meta", "token", "token", "done"]
+    assert events[0][1]["location_type"] == "park"
+    assert events[-1][1]["task"] == "Snap a puddle." and "context_token" in events[-1][1]
+
+def test_submit_returns_job_and_streams_progress(monkeypatch, client, app_module, wait_job):
+    monkeypatch.setattr(app_module, "judge_submission_model", lambda *a, **kw: {"feedback": "Bold move.", "fit_score": 0.8})
+    r = client.post("/submit", data={"session_id": "job1", "task": "Any", "media_type": "text", "text": "hello"},
+                    content_type="multipart/form-data")
+    assert r.status_code == 202
+    job_id = r.get_json()["job_id"]
+    wait_job(job_id)
+
+    body = client.get(f"/jobs/{job_id}/events").get_data(as_text=True)
+    events = [line[len("event: "):] for line in body.splitlines() if line.startswith("event: ")]
+    assert events == ["judge", "story", "done"]
+    assert client.get(f"/jobs/{job_id}").get_json()["judge_text"] == "Bold move."
+
+    meta = json.loads((Path(client.application.config["UPLOAD_FOLDER"]) / "job1" / "001" / "meta.json").read_text())
+    assert meta["judge_text"] == "Bold move." and meta["fit_score"] == 0.8
+    assert client.get("/jobs/nope").status_code == 404
+
+def test_story_chapter_written_once_per_block(monkeypatch, client, app_module, wait_job):
+    monkeypatch.setattr(app_module, "judge_submission_model", lambda *a, **kw: {"feedback": "Nice.", "fit_score": 0.5})
+    calls = []
+    def _fake_chapter(submissions, **kw):
+        calls.append(submissions)
+        return {"story_text": f"Chapter {len(calls)}", "images": []}
+    monkeypatch.setattr(app_module, "create_micro_narrative_chapter", _fake_chapter)
+
+    ready = []
+    for n in range(4):
+        r = client.post("/submit", data={"session_id": "ch1", "task": f"Task {n}", "media_type": "text", "text": f"note {n}"},
+                        content_type="multipart/form-data")
+        ready.append(wait_job(r.get_json()["job_id"])["story_ready"])
+
+    assert ready == [False, False, True, False]
+    assert len(calls) == 1 and [s["task"] for s in calls[0]] == ["Task 2", "Task 1", "Task 0"]
+    chapters = json.loads((Path(client.application.config["UPLOAD_FOLDER"]) / "ch1" / "chapters.json").read_text())
+    assert list(chapters) == ["001-002-003"] and chapters["001-002-003"]["story_text"] == "Chapter 1"
+
+    # Re-running the closing submission hits the memo instead of the narrator
+    assert app_module.get_or_create_chapter("ch1", 3)["number"] == 1 and len(calls) == 1
+
+def test_chapter_regenerates_evicted_story_images(monkeypatch, client, app_module, wait_job, tmp_path):
+    import base64
+    from types import SimpleNamespace
+    import llm, micronarrative
+    from contentstore import ContentStore
+    store = ContentStore(tmp_path / "story", max_bytes=30)
+    monkeypatch.setattr(micronarrative, "STORY_STORE", store)
+    monkeypatch.setattr(app_module, "STORY_STORE", store)
+    drawn = []
+    def _image(model, prompt, **kw):
+        drawn.append(prompt)
+        return SimpleNamespace(data=[SimpleNamespace(url=None, b64_json=base64.b64encode(b"png:" + prompt[:8].encode()).decode())])
+    monkeypatch.setattr(llm, "GATEWAY", llm.LLMGateway(llm.FakeProvider(image=_image)))
+    monkeypatch.setattr(app_module, "judge_submission_model", lambda *a, **kw: {"feedback": "Nice.", "fit_score": 0.5})
+    def _fake_chapter(submissions, **kw):
+        beats = [{"title": "One", "prompt": "a red kite"}]
+        return {"story_text": "Kites.", "beats": beats, "images": micronarrative.generate_story_images(beats)}
+    monkeypatch.setattr(app_module, "create_micro_narrative_chapter", _fake_chapter)
+    for n in range(3):
+        r = client.post("/submit", data={"session_id": "ev1", "task": f"Task {n}", "media_type": "text", "text": "kite"},
+                        content_type="multipart/form-data")
+        wait_job(r.get_json()["job_id"])
+    first = app_module.get_or_create_chapter("ev1", 3)
+    url = first["images"][0]["url"]
+    store.put("ef" * 32, "png", b"x" * 30)   # pushes the chapter's image out of the store
+    assert client.get(url).status_code == 404
+
+    again = app_module.get_or_create_chapter("ev1", 3)
+    assert again["images"][0]["url"] == url and again["number"] == 1 and len(drawn) == 2
+    assert client.get(url).status_code == 200
+
+def test_download_serves_story_images_by_hash(monkeypatch, client, app_module, tmp_path):
+    from contentstore import ContentStore
+    store = ContentStore(tmp_path / "story", max_bytes=1 << 20)
+    monkeypatch.setattr(app_module, "STORY_STORE", store)
+    store.put("ab" * 32, "png", b"png-bytes")
+    r = client.get(f"/download/story/{'ab' * 32}.png")
+    assert r.status_code == 200 and r.data == b"png-bytes" and "immutable" in r.headers["Cache-Control"]
+    assert client.get(f"/download/story/{'cd' * 32}.png").status_code == 404
+
+def test_feedback_is_logged_and_paginated(monkeypatch, client, app_module, tmp_path):
+    from feedbacklog import FeedbackLog
+    log = FeedbackLog(tmp_path / "fb", export_dir=tmp_path / "export", rotate_bytes=200, flush_interval=0.01)
+    monkeypatch.setattr(app_module, "FEEDBACK_LOG", log)
+    for n in range(5):
+        r = client.post("/feedback", json={"rating": "up" if n % 2 else "down", "input": "p", "output": f"task {n}",
+                                           "reason": "meh"})
+        assert r.status_code == 200 and r.get_json()["id"]
+        log.flush()   # one batch per rating, so the 200-byte segments rotate
+    assert client.post("/feedback", json={"rating": "sideways"}).status_code == 400
+    log.flush()
+
+    seen, cursor = [], None
+    while True:
+        page = client.get("/feedback-logs", query_string={"format": "json", "limit": 2, **({"cursor": cursor} if cursor else {})}).get_json()
+        seen += [e["output"] for e in page["items"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert seen == [f"task {n}" for n in reversed(range(5))]
+    assert log.segment > 1   # rotated
+    assert "task 4" in client.get("/feedback-logs").get_data(as_text=True)
+    for bad in ("nope", "2:", ":10", "-1:5", "0:0", f"1:{10 ** 9}"):
+        assert client.get("/feedback-logs", query_string={"cursor": bad}).status_code == 400
+    started = time.monotonic()
+    assert client.get("/feedback-logs", query_string={"cursor": "999999999:0"}).status_code == 400
+    assert time.monotonic() - started < 0.5
+
+    exported = sorted((tmp_path / "export").glob("feedback-*.jsonl"))
+    assert sum(len(p.read_text().splitlines()) for p in exported) == 5
+    assert log.export() == 0   # nothing new to copy
+
+def test_feedback_pages_read_backwards_from_the_cursor(monkeypatch, tmp_path):
+    import feedbacklog
+    monkeypatch.setattr(feedbacklog, "READ_BLOCK", 32)   # many blocks per page
+    log = feedbacklog.FeedbackLog(tmp_path / "fb", rotate_bytes=1 << 20, flush_interval=0.01)
+    for n in range(60):
+        log.append({"output": f"task {n}" + "!" * (n % 7)})
+    log.flush()
+    with open(log.path_for(1), "a") as f:
+        f.write('{"output": "half a wri')   # a write still in progress is not served
+    seen, cursor = [], None
+    while True:
+        page = log.page(cursor, limit=7)
+        seen += [e["output"].rstrip("!") for e in page["items"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert seen == [f"task {n}" for n in reversed(range(60))]
+
+def test_chunked_upload_resumes_and_feeds_submit(monkeypatch, client, app_module, wait_job):
+    monkeypatch.setattr(app_module, "judge_submission_model", lambda *a, **kw: {"feedback": "Moving!", "fit_score": 0.6})
+    body = bytes(range(256)) * 1000
+    abandoned = client.post("/upload/init", json={"session_id": "up1", "media_type": "video"}).get_json()
+    r = client.post("/upload/init", json={"session_id": "up1", "media_type": "video", "filename": "clip.webm"})
+    assert r.status_code == 201
+    up = r.get_json()
+    assert not (Path(client.application.config["UPLOAD_FOLDER"]) / "up1").exists()   # nothing allocated yet
+    url = up["upload_url"]
+
+    r = client.patch(url, data=body[:100_000], headers={"Upload-Offset": "0"})
+    assert r.get_json()["offset"] == 100_000
+    # A retried chunk at a stale offset is refused with the offset to resume from
+    r = client.patch(url, data=body[:100_000], headers={"Upload-Offset": "0"})
+    assert r.status_code == 409 and r.get_json()["offset"] == 100_000
+    assert client.head(url).headers["Upload-Offset"] == "100000"
+    client.patch(url, data=body[100_000:], headers={"Upload-Offset": "100000"})
+    assert client.post(f"/upload/{up['upload_id']}/finalize", json={"size": 1}).status_code == 409
+    r = client.post(f"/upload/{up['upload_id']}/finalize", json={"size": len(body)})
+    import hashlib
+    assert r.get_json()["blake2b"] == hashlib.blake2b(body, digest_size=32).hexdigest()
+
+    form = {"session_id": "up1", "task": "Film it", "media_type": "video", "upload_id": up["upload_id"]}
+    assert client.post("/submit", data={**form, "session_id": "intruder"}).status_code == 404
+    r = client.post("/submit", data=form)
+    assert r.status_code == 202 and r.get_json()["count"] == 1
+    wait_job(r.get_json()["job_id"])
+    saved = Path(client.application.config["UPLOAD_FOLDER"]) / "up1" / "001" / "clip.webm"
+    assert saved.read_bytes() == body
+    assert client.post("/submit", data=form).status_code == 404   # an upload is claimed once
+
+    # The abandoned recording took no index; the sweep removes its staging directory too
+    staging = Path(app_module.UPLOADS.state_dir) / abandoned["upload_id"]
+    assert staging.is_dir() and not (staging.parent / up["upload_id"]).exists()
+    app_module.UPLOADS.ttl = -1
+    assert app_module.UPLOADS.sweep() == 1 and not staging.exists()
+
+def test_download_supports_ranges_etags_and_offload(monkeypatch, client, app_module):
+    upload_root = Path(client.application.config["UPLOAD_FOLDER"])
+    (upload_root / "m1" / "001").mkdir(parents=True)
+    (upload_root / "m1" / "001" / "clip.webm").write_bytes(bytes(range(256)) * 4)
+
+    r = client.get("/download/m1/001/clip.webm", headers={"Range": "bytes=100-199"})
+    assert r.status_code == 206 and r.data == (bytes(range(256)) * 4)[100:200]
+    assert r.headers["Content-Range"] == "bytes 100-199/1024" and "attachment" not in r.headers.get("Content-Disposition", "")
+    etag = client.get("/download/m1/001/clip.webm").headers["ETag"]
+    assert client.get("/download/m1/001/clip.webm", headers={"If-None-Match": etag}).status_code == 304
+    assert "attachment" in client.get("/download/m1/001/clip.webm?dl=1").headers["Content-Disposition"]
+
+    # Internal files and path tricks are never served
+    (upload_root / ".uploads").mkdir(exist_ok=True)
+    (upload_root / ".uploads" / "abc.json").write_text("{}")
+    for bad in ("/download/.uploads/abc.json", "/download/submissions.db", "/download/../secret.txt"):
+        assert client.get(bad).status_code == 404
+
+    monkeypatch.setattr(app_module, "ACCEL_UPLOADS_PREFIX", "/_media/uploads/")
+    r = client.get("/download/m1/001/clip.webm")
+    assert r.headers["X-Accel-Redirect"] == "/_media/uploads/m1/001/clip.webm" and r.data == b""
@@ -0,0 +1,57 @@
+import time
+
+def test_environment_context_runs_sources_concurrently(monkeypatch, client, app_module):
+    def _slow(value):
+        def _fn(lat, lon):
+            time.sleep(0.3)
+            return value
+        return _fn
+    monkeypatch.setattr(app_module, "get_location_type", _slow("park"), raising=True)
+    monkeypatch.setattr(app_module, "get_weather_hint", _slow("sunny"), raising=True)
+    monkeypatch.setattr(app_module, "get_day_period", _slow("morning"), raising=True)
+    monkeypatch.setattr(app_module, "get_nearby_places", _slow([]), raising=True)
+
+    started = time.monotonic()
+    ctx = app_module.get_environment_context(49.28, -123.12)
+    elapsed = time.monotonic() - started
+
+    assert ctx == {"location_type": "park", "weather_hint": "sunny",
+                   "day_period": "morning", "nearby_places": []}
+    assert elapsed < 0.9  # max of the lookups, not their sum
+
+def test_gather_context_falls_back_on_deadline_and_error():
+    from envcontext import gather_context
+
+    def _boom():
+        raise RuntimeError("upstream down")
+
+    ctx = gather_context({
+        "fast": (lambda: "ok", "unused"),
+        "slow": (lambda: time.sleep(1) or "late", "fallback"),
+        "broken": (_boom, list),
+    }, deadline=0.2)
+    assert ctx == {"fast": "ok", "slow": "fallback", "broken": []}
+
+def test_submit_reuses_context_token(monkeypatch, client, app_module, coords, wait_job):
+    token = client.post("/generate-task", json=coords).get_json()["context_token"]
+
+    calls, seen = [], {}
+    monkeypatch.setattr(app_module, "http_get", lambda url, **kw: calls.append(url), raising=True)
+    def _judge(*args, **kw):
+        seen.update(kw["context"])
+        return "ok"
+    monkeypatch.setattr(app_module, "judge_submission_model", _judge, raising=True)
+
+    data = {"session_id": "ctx1", "task": "Any", "media_type": "text", "text": "hi",
+            "lat": str(coords["latitude"]), "lon": str(coords["longitude"]),
+            "context_token": token}
+    r = client.post("/submit", data=data, content_type="multipart/form-data")
+    assert r.status_code == 202
+    wait_job(r.get_json()["job_id"])
+    assert calls == []                       # no upstream lookups on submit
+    assert seen["location_type"] == "park"   # context came from the token
+
+    app_module.GEO_CACHE.clear()
+    data["context_token"] = token[:-2] + "xx"  # tampered → recompute
+    client.post("/submit", data=data, content_type="multipart/form-data")
+    assert calls
@@ -0,0 +1,35 @@
+from geocache import GeoCache, geohash
+
+def test_geohash_matches_reference():
+    assert geohash(57.64911, 10.40744, 11) == "u4pruydqqvj"
+
+def test_repeat_lookups_hit_cache(monkeypatch, client, app_module, coords):
+    calls = []
+    real_http = app_module.http_get
+    def _counting_http(url, **kw):
+        calls.append(url)
+        return real_http(url, **kw)
+    monkeypatch.setattr(app_module, "http_get", _counting_http, raising=True)
+
+    for _ in range(3):
+        assert client.post("/generate-task", json=coords).status_code == 200
+    assert len(calls) == 3  # one per upstream, then served from the cell cache
+
+    stats = client.get("/metrics").get_json()["geo_cache"]
+    assert stats["weather"]["hits"] == 2 and stats["weather"]["misses"] == 1
+
+def test_failures_are_not_cached_and_disk_survives_restart(tmp_path):
+    path = str(tmp_path / "geo.sqlite")
+    cache = GeoCache(path=path)
+
+    def _boom():
+        raise RuntimeError("upstream down")
+    try:
+        cache.get_or_load("weather", 49.28, -123.12, _boom)
+    except RuntimeError:
+        pass
+    assert cache.get("weather", 49.28, -123.12) is None
+
+    cache.get_or_load("weather", 49.28, -123.12, lambda: 3)
+    reopened = GeoCache(path=path)
+    assert reopened.get("weather", 49.2801, -123.1201) == 3
@@ -0,0 +1,56 @@
+import csv
+
+import geoindex
+
+def _write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=["name", "amenity", "leisure", "lat", "lon"])
+        w.writeheader()
+        w.writerows(rows)
+
+def test_build_and_query_poi_index(tmp_path):
+    src, dst = tmp_path / "extract.csv", tmp_path / "pois.sqlite"
+    _write_csv(src, [
+        {"name": "Corner Cafe", "amenity": "cafe", "lat": 49.2830, "lon": -123.1210},
+        {"name": "Riverside Park", "leisure": "park", "lat": 49.2860, "lon": -123.1207},
+        {"name": "Far Library", "amenity": "library", "lat": 49.3000, "lon": -123.1207},
+        {"name": "Parking lot", "amenity": "parking", "lat": 49.2827, "lon": -123.1207},
+    ])
+    assert geoindex.build_poi_index(str(src), str(dst)) == 3  # parking isn't a POI category
+
+    index = geoindex.PoiIndex(str(dst))
+    names = {p["name"] for p in index.nearby(49.2827, -123.1207, radius=500)}
+    assert names == {"Corner Cafe", "Riverside Park"}
+    assert index.nearby(49.2827, -123.1207, radius=100)[0] == {
+        "name": "Corner Cafe", "category": "cafe", "lat": 49.2830, "lon": -123.1210}
+
+def test_app_prefers_local_poi_index(monkeypatch, client, app_module, coords, tmp_path):
+    src, dst = tmp_path / "extract.csv", tmp_path / "pois.sqlite"
+    _write_csv(src, [{"name": "Local Gallery", "amenity": "cafe", "lat": 49.2828, "lon": -123.1208}])
+    geoindex.build_poi_index(str(src), str(dst))
+    monkeypatch.setattr(app_module, "POI_INDEX", geoindex.PoiIndex(str(dst)), raising=True)
+
+    j = client.post("/generate-task", json=coords).get_json()
+    assert j["selected_place"]["name"] == "Local Gallery"
+
+def test_landuse_classifier_point_in_polygon(tmp_path):
+    import json
+    park = [[-123.13, 49.28], [-123.11, 49.28], [-123.11, 49.29], [-123.13, 49.29], [-123.13, 49.28]]
+    pond = [[-123.125, 49.284], [-123.12, 49.284], [-123.12, 49.286], [-123.125, 49.286], [-123.125, 49.284]]
+    cafe = [[-123.1202, 49.2820], [-123.1198, 49.2820], [-123.1198, 49.2823], [-123.1202, 49.2823], [-123.1202, 49.2820]]
+    geo = {"type": "FeatureCollection", "features": [
+        {"properties": {"leisure": "park"}, "geometry": {"type": "Polygon", "coordinates": [park, pond]}},
+        {"properties": {"class": "restaurant"}, "geometry": {"type": "Polygon", "coordinates": [cafe]}},
+        {"properties": {"natural": "coastline"},
+         "geometry": {"type": "LineString", "coordinates": [[-123.20, 49.30], [-123.15, 49.30]]}},
+    ]}
+    src, dst = tmp_path / "landuse.geojson", tmp_path / "landuse.sqlite"
+    src.write_text(json.dumps(geo), encoding="utf-8")
+    assert geoindex.build_landuse_index(str(src), str(dst)) == 3
+
+    index = geoindex.LanduseIndex(str(dst))
+    assert index.classify(49.287, -123.128) == "park"
+    assert index.classify(49.2821, -123.1200) == "restaurant"   # smallest containing zone wins
+    assert index.classify(49.285, -123.1225) is None             # inside the park's hole
+    assert index.classify(49.3005, -123.17) == "beach"           # within the coast buffer
+    assert index.classify(49.40, -123.17) is None
@@ -0,0 +1,35 @@
+import threading
+import time
+
+from jobs import JobQueue
+
+
+def _wait(queue, job_id, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if queue.get(job_id).finished:
+            return queue.get(job_id)
+        time.sleep(0.01)
+    raise TimeoutError(job_id)
+
+
+def test_busy_session_runs_in_order_without_starving_others():
+    queue = JobQueue(workers=2)
+    gate, order = threading.Event(), []
+
+    def slow(n):
+        def fn(job):
+            gate.wait(5)
+            order.append(n)
+        return fn
+
+    busy = [queue.submit(slow(n), key="busy") for n in range(6)]
+    other = queue.submit(lambda job: order.append("other"), key="calm")
+    assert _wait(queue, other).status == "done" and order == ["other"]   # not stuck behind "busy"
+
+    gate.set()
+    for job_id in busy:
+        _wait(queue, job_id)
+    assert order[1:] == list(range(6))
+    time.sleep(0.05)
+    assert queue._key_queues == {}   # drained keys are forgotten
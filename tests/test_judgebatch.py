@@ -0,0 +1,101 @@
+import json
+import threading
+
+from judgebatch import JudgeBatcher, parse_batch
+from prompts import render_judge_batch
+
+
+def _fields(n):
+    return dict(task=f"Task {n}", sample=f"User wrote: note {n}", media_type="text", location="park",
+                weather="clear sky", period="morning", tone="be bright", humor="clever")
+
+
+def _model(answer_batch):
+    calls, lock = [], threading.Lock()
+
+    def complete(prompt):
+        with lock:
+            calls.append(prompt)
+        if prompt.startswith("BATCH"):
+            ids = [int(line[4:-1]) for line in prompt.splitlines() if line.startswith("[id ")]
+            return answer_batch(ids)
+        return f"single: {prompt}"
+    return calls, complete
+
+
+def _build(items):
+    return "BATCH\n" + "\n".join(f"[id {i}]" for i, _ in items)
+
+
+def test_burst_is_judged_in_one_call_and_split_back_out():
+    calls, complete = _model(lambda ids: "Sure!\n" + json.dumps([{"id": i, "feedback": f"verdict {i}"} for i in ids]))
+    batcher = JudgeBatcher(complete, _build, window=0.2, max_items=10)
+    futures = [batcher.submit(f"prompt {n}", _fields(n)) for n in range(1, 6)]
+    assert [f.result(timeout=5) for f in futures] == [f"verdict {i}" for i in range(1, 6)]
+    assert len(calls) == 1 and batcher.stats()["avg_batch"] == 5.0
+
+    alone = batcher.submit("lonely prompt", _fields(9)).result(timeout=5)
+    assert alone == "single: lonely prompt"     # a batch of one is just the normal prompt
+
+
+def test_missing_or_unparseable_items_fall_back_to_single_calls():
+    calls, complete = _model(lambda ids: json.dumps([{"id": 1, "feedback": "only the first"}]))
+    batcher = JudgeBatcher(complete, _build, window=0.2, max_items=10)
+    futures = [batcher.submit(f"prompt {n}", _fields(n)) for n in (1, 2)]
+    assert [f.result(timeout=5) for f in futures] == ["only the first", "single: prompt 2"]
+    assert batcher.stats()["fallbacks"] == 1
+
+    calls, complete = _model(lambda ids: "I can't do JSON today")
+    batcher = JudgeBatcher(complete, _build, window=0.2, max_items=2)
+    futures = [batcher.submit(f"prompt {n}", _fields(n)) for n in (1, 2)]
+    assert sorted(f.result(timeout=5) for f in futures) == ["single: prompt 1", "single: prompt 2"]
+    assert batcher.stats()["parse_failures"] == 1 and len(calls) == 3
+
+
+def test_batch_prompt_lists_every_item_and_parser_ignores_strays():
+    prompt = render_judge_batch([(1, _fields(1)), (2, dict(_fields(2), sample="x " * 2000))])
+    assert "[id 1]" in prompt and "[id 2]" in prompt and "…" in prompt
+    assert parse_batch('[{"id": "2", "feedback": " ok "}, {"id": 7, "feedback": "?"}, "junk"]', {1: 0, 2: 0}) == {2: "ok"}
+
+
+def test_batch_prompt_stays_in_budget_and_overflow_is_judged_singly():
+    from prompts import JUDGE_BATCH_PROMPT
+    big = lambda n: dict(_fields(n), task="t " * 400, sample="s " * 1000)
+    prompt = render_judge_batch([(i, big(i)) for i in range(1, 13)])
+    assert prompt.tokens <= JUDGE_BATCH_PROMPT.budget and not prompt.over_budget
+    assert 1 < len(prompt.ids) < 12 and prompt.ids == list(range(1, len(prompt.ids) + 1))
+
+    calls = []
+
+    def complete(text):
+        calls.append(text)
+        if text.startswith(JUDGE_BATCH_PROMPT.prefix):
+            return json.dumps([{"id": i, "feedback": f"batched {i}"} for i in range(1, 13)])   # even ones it wasn't shown
+        return "single"
+    batcher = JudgeBatcher(complete, render_judge_batch, window=0.2, max_items=12)
+    futures = [batcher.submit(f"prompt {n}", big(n)) for n in range(1, 13)]
+    results = [f.result(timeout=5) for f in futures]
+    n = len(prompt.ids)
+    assert results == [f"batched {i}" for i in range(1, n + 1)] + ["single"] * (12 - n)
+    assert batcher.stats()["overflow"] == 12 - n and len(calls) == 1 + 12 - n
+
+
+def test_judge_batch_off_starts_no_batcher(monkeypatch):
+    import importlib
+
+    import judge
+    import judgebatch
+    import llm
+
+    monkeypatch.setattr(judgebatch, "JUDGE_BATCH", False)
+    threads = {t.name for t in threading.enumerate()}
+    try:
+        importlib.reload(judge)
+        assert judge.JUDGE_BATCHER is None
+        assert {t.name for t in threading.enumerate()} == threads
+        monkeypatch.setattr(llm, "complete", lambda prompt, model: f" single: {prompt} ")
+        assert judge.complete_judge("hi", _fields(1)) == "single: hi"
+    finally:
+        monkeypatch.undo()
+        importlib.reload(judge)
+    assert judge.JUDGE_BATCHER is not None
@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+import pytest
+
+from llm import FakeProvider, LLMGateway, LLMProvider, LLMTimeout, TogetherProvider, deadline
+
+A, B = "model-a", "model-b"
+
+
+def _gateway(provider, **kw):
+    return LLMGateway(provider, fallbacks={A: B, B: A}, **kw)
+
+
+def test_slow_primary_is_hedged_and_failures_fall_back():
+    provider = FakeProvider(latency={A: 0.5, B: 0.05})
+    gw = _gateway(provider)
+    for _ in range(25):   # teach the gateway that A normally answers fast
+        gw._model(A).latencies.append(0.05)
+    started = time.monotonic()
+    assert gw.complete("hi", A).startswith(f"[{B}]")
+    assert time.monotonic() - started < 0.3
+    assert provider.calls == [A, B] and gw.stats()["hedge_wins"] == 1
+
+    failing = _gateway(FakeProvider(fail={A}), hedge=False)
+    assert failing.complete("hi", A) == f"[{B}] hi" and failing.stats()["fallbacks"] == 1
+    assert "".join(failing.stream("one two", A)) == f"[{B}] one two"
+
+
+def test_deadlines_propagate_and_limit_concurrency():
+    gw = LLMGateway(FakeProvider(latency=0.3), fallbacks={})
+    with deadline(0.1):
+        with pytest.raises(LLMTimeout):
+            gw.complete("hi", A)
+    assert gw.stats()["timeouts"] == 1
+
+    gw = LLMGateway(FakeProvider(latency=0.2), model_concurrency=1, fallbacks={})
+
+    async def both():
+        return await asyncio.gather(gw.acomplete("x", A), gw.acomplete("y", A))
+    started = time.monotonic()
+    assert asyncio.run(both()) == [f"[{A}] x", f"[{A}] y"]
+    assert time.monotonic() - started >= 0.4   # one slot per model → calls run one after the other
+
+
+def test_slot_rejections_are_not_provider_errors():
+    gw = LLMGateway(FakeProvider(), model_concurrency=1, fallbacks={})
+    gw._model(A).slots.acquire()   # someone else holds the only slot
+    with pytest.raises(LLMTimeout):
+        list(gw.stream("hi", A, timeout=0.05))
+    assert gw.stats()["models"][A] == {"calls": 0, "errors": 0, "rejected": 1, "p50_ms": None, "p90_ms": None}
+
+
+def test_provider_gets_the_remaining_deadline():
+    with pytest.raises(TypeError):
+        LLMProvider()   # abstract: a provider that forgets a method fails at construction
+    provider = TogetherProvider(api_key="test-key", timeout=45)
+    scoped = provider.client_for(3.2)
+    assert scoped.chat.completions._client.timeout == 3.2 and scoped.images._client.timeout == 3.2
+    assert provider.client.client.timeout == 45 and provider.client_for(0).client.timeout == 0.5
@@ -0,0 +1,96 @@
+import wave
+
+import numpy as np
+from PIL import Image
+
+import mediaprep
+
+
+def test_photo_is_downscaled_with_thumbnail(tmp_path):
+    src = tmp_path / "phone.png"
+    Image.new("RGB", (4000, 3000), (200, 80, 40)).save(src)
+    out = mediaprep.preprocess(str(src), "photo")
+    assert out["file"] == str(tmp_path / "phone.jpg") and not src.exists()   # original dropped by default
+    with Image.open(out["file"]) as img:
+        assert img.format == "JPEG" and max(img.size) == mediaprep.IMAGE_MAX_SIDE and img.size[0] > img.size[1]
+    with Image.open(out["thumbnail"]) as thumb:
+        assert max(thumb.size) == mediaprep.THUMB_MAX_SIDE
+
+    kept = tmp_path / "kept.jpg"
+    Image.new("RGB", (2000, 1000)).save(kept)
+    out = mediaprep.preprocess(str(kept), "photo", keep_original=True)
+    assert kept.exists() and out["original"] == str(kept) and out["file"].endswith("kept.small.jpg")
+
+
+def test_small_jpeg_is_kept_byte_for_byte(tmp_path):
+    src = tmp_path / "small.jpg"
+    Image.new("RGB", (800, 600), (10, 120, 200)).save(src, quality=95)
+    before = src.read_bytes()
+    out = mediaprep.preprocess(str(src), "photo")
+    assert out["file"] == str(src) and src.read_bytes() == before
+    with Image.open(out["thumbnail"]) as thumb:
+        assert max(thumb.size) == mediaprep.THUMB_MAX_SIDE
+
+    rotated = tmp_path / "rotated.jpg"
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    Image.new("RGB", (800, 600)).save(rotated, exif=exif)
+    out = mediaprep.preprocess(str(rotated), "photo", keep_original=True)
+    with Image.open(out["file"]) as img:
+        assert out["file"].endswith("rotated.small.jpg") and img.size == (600, 800)
+
+
+def test_unreadable_upload_passes_through(tmp_path):
+    src = tmp_path / "pic.jpg"
+    src.write_bytes(b"hello world")
+    assert mediaprep.preprocess(str(src), "photo") == {"file": str(src), "thumbnail": None, "original": None}
+    assert src.read_bytes() == b"hello world"
+
+
+def test_wav_is_downmixed_to_16k_mono(tmp_path, monkeypatch):
+    monkeypatch.setattr(mediaprep, "FFMPEG", None)
+    src = tmp_path / "voice.wav"
+    rate, seconds = 44100, 2
+    t = np.arange(rate * seconds) / rate
+    tone = (np.sin(2 * np.pi * 440 * t) * 10000).astype("<i2")
+    with wave.open(str(src), "wb") as w:
+        w.setnchannels(2)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(np.column_stack([tone, tone]).tobytes())
+    out = mediaprep.preprocess(str(src), "audio")
+    with wave.open(out["file"], "rb") as w:
+        assert (w.getnchannels(), w.getframerate(), w.getsampwidth()) == (1, 16000, 2)
+        assert abs(w.getnframes() / 16000 - seconds) < 0.01
+        pcm = np.frombuffer(w.readframes(w.getnframes()), dtype="<i2")
+    assert 9000 < np.abs(pcm).max() <= 10000   # level survives the downmix
+
+
+def test_wav_is_never_made_bigger(tmp_path, monkeypatch):
+    monkeypatch.setattr(mediaprep, "FFMPEG", None)
+    src = tmp_path / "lofi.wav"
+    with wave.open(str(src), "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(1)
+        w.setframerate(8000)
+        w.writeframes(bytes(range(256)) * 32)
+    before = src.read_bytes()
+    assert mediaprep.preprocess(str(src), "audio")["file"] == str(src)
+    assert src.read_bytes() == before and list(tmp_path.iterdir()) == [src]
+
+
+def test_ffmpeg_encodes_16k_mono_opus(tmp_path, monkeypatch):
+    calls = []
+
+    def run(cmd, **kwargs):
+        calls.append(cmd)
+        open(cmd[-1], "wb").write(b"OggS")
+
+    monkeypatch.setattr(mediaprep, "FFMPEG", "ffmpeg")
+    monkeypatch.setattr(mediaprep.subprocess, "run", run)
+    src = tmp_path / "voice.webm"
+    src.write_bytes(b"\0" * 4096)
+    out = mediaprep.preprocess(str(src), "audio")
+    assert out["file"] == str(tmp_path / "voice.ogg") and not src.exists()
+    cmd = " ".join(calls[0])
+    assert "-ac 1 -ar 16000 -c:a libopus" in cmd
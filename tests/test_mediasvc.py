@@ -0,0 +1,95 @@
+import threading
+
+from mediasvc import MediaService, StubBackend, file_digest
+
+
+def test_same_content_is_analyzed_once(tmp_path):
+    a, b = tmp_path / "a.jpg", tmp_path / "b.jpg"
+    a.write_bytes(b"same pixels")
+    b.write_bytes(b"same pixels")
+    backend = StubBackend()
+    svc = MediaService(backend, cache_path=tmp_path / "media.db")
+    assert svc.summarize(str(a), "photo") == "Image description: a picture of a.jpg"
+    assert svc.summarize(str(b), "photo") == "Image description: a picture of a.jpg"   # re-upload
+    assert backend.calls == 1 and file_digest(a) == file_digest(b)
+
+    # Persisted: a fresh service (e.g. after a restart) still skips inference
+    again = MediaService(StubBackend(), cache_path=tmp_path / "media.db")
+    assert again.summarize(str(b), "photo").endswith("a.jpg") and again.backend.calls == 0
+    assert svc.summarize(str(a), "video") == "Uploaded a video, but no automatic summary available."
+
+
+def test_memory_cache_is_bounded_and_backed_by_sqlite(tmp_path):
+    backend = StubBackend()
+    svc = MediaService(backend, cache_path=tmp_path / "media.db", max_memory=2)
+    photos = []
+    for n in range(3):
+        photos.append(tmp_path / f"p{n}.jpg")
+        photos[-1].write_bytes(f"pixels {n}".encode())
+        svc.summarize(str(photos[-1]), "photo")
+    assert svc.stats()["memory_entries"] == 2
+    # Evicted from memory, read back from SQLite rather than re-inferred
+    assert svc.summarize(str(photos[0]), "photo").endswith("p0.jpg") and backend.calls == 3
+
+
+def test_concurrent_requests_share_one_call_and_failures_are_not_cached(tmp_path):
+    clip = tmp_path / "clip.wav"
+    clip.write_bytes(b"audio")
+    backend = StubBackend(latency=0.2)
+    svc = MediaService(backend, workers=2)
+    out = []
+    threads = [threading.Thread(target=lambda: out.append(svc.summarize(str(clip), "audio"))) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert out == ["Audio transcription: a recording of clip.wav"] * 4 and backend.calls == 1
+
+    class Flaky(StubBackend):
+        def caption(self, path):
+            self.calls += 1
+            if self.calls == 1:
+                raise RuntimeError("endpoint down")
+            return "a dog"
+    flaky = MediaService(Flaky())
+    assert flaky.summarize(str(clip), "photo") == "Image description unavailable."
+    assert flaky.summarize(str(clip), "photo") == "Image description: a dog"
+    assert flaky.stats()["failures"] == 1
+
+
+def test_video_is_summarized_from_captioned_keyframes(tmp_path, monkeypatch):
+    import keyframes
+
+    def fake_extract(path, out_dir, max_frames=keyframes.VIDEO_MAX_FRAMES):
+        frames = []
+        for i, (ts, pixel) in enumerate([(0.0, b"a"), (4.5, b"a"), (65.0, b"b")]):
+            f = tmp_path / f"frame_{i}.jpg"
+            f.write_bytes(pixel)
+            frames.append((ts, str(f)))
+        return frames
+
+    class ByContent(StubBackend):
+        def caption(self, path):
+            self.calls += 1
+            return {b"a": "a dog on a beach", b"b": "a sunset"}[open(path, "rb").read()]
+
+    monkeypatch.setattr(keyframes, "FFMPEG", "/usr/bin/ffmpeg")
+    monkeypatch.setattr(keyframes, "extract_keyframes", fake_extract)
+    clip = tmp_path / "clip.mp4"
+    clip.write_bytes(b"not really a video")
+    backend = ByContent()
+    svc = MediaService(backend)
+    summary = "Video keyframes: [0:00] a dog on a beach; [1:05] a sunset"
+    assert svc.summarize(str(clip), "video") == summary
+    assert backend.calls == 2   # identical frames share one caption
+    assert svc.summarize(str(clip), "video") == summary and backend.calls == 2
+
+    monkeypatch.setattr(keyframes, "FFMPEG", None)
+    assert MediaService(backend).summarize(str(clip), "video") == "Uploaded a video, but no automatic summary available."
+
+
+def test_keyframe_sampling_rate_is_bounded():
+    import keyframes
+    assert keyframes.uniform_fps(600, max_frames=6, max_fps=2) == 0.01
+    assert keyframes.uniform_fps(1, max_frames=6, max_fps=2) == 2
+    assert keyframes.uniform_fps(None, max_frames=6, max_fps=2) == 2
@@ -0,0 +1,81 @@
+import base64
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import llm
+import micronarrative
+from contentstore import ContentStore
+
+PNG = b"\x89PNG\r\n\x1a\nfake"
+
+
+@pytest.fixture(autouse=True)
+def story_store(monkeypatch, tmp_path):
+    store = ContentStore(tmp_path / "story", max_bytes=1024)
+    monkeypatch.setattr(micronarrative, "STORY_STORE", store)
+    return store
+
+
+def _fake_images(delays, calls=None):
+    def generate(model, prompt, size, steps):
+        title = prompt.split(" |")[0]
+        if calls is not None:
+            calls.append(title)
+        time.sleep(delays[title])
+        b64 = base64.b64encode(PNG + title.encode()).decode()
+        return SimpleNamespace(data=[SimpleNamespace(url=None, b64_json=b64)])
+    return llm.LLMGateway(llm.FakeProvider(image=generate))
+
+def test_story_images_run_concurrently_and_keep_order(monkeypatch, story_store):
+    monkeypatch.setattr(llm, "GATEWAY", _fake_images({"a": 0.3, "b": 0.1, "c": 0.2}))
+    beats = [{"title": t.upper(), "prompt": t} for t in "abc"]
+    started = time.monotonic()
+    images = micronarrative.generate_story_images(beats)
+    assert time.monotonic() - started < 0.55  # ~max(image), not sum
+    paths = [story_store.open(img["url"].rsplit("/", 1)[1]) for img in images]
+    assert [open(p, "rb").read() for p in paths] == [PNG + t for t in (b"a", b"b", b"c")]
+
+def test_slow_beat_gets_placeholder_and_images_stream_in_finish_order(monkeypatch):
+    monkeypatch.setattr(llm, "GATEWAY", _fake_images({"a": 0.5, "b": 0.0, "c": 0.1}))
+    beats = [{"title": t.upper(), "prompt": t} for t in "abc"]
+    order = [i for i, _ in micronarrative.iter_story_images(beats, timeout=0.3)]
+    assert order == [1, 2, 0]
+    monkeypatch.setattr(llm, "GATEWAY", _fake_images({"a": 0.5, "b": 0.0, "c": 0.1}))
+    images = dict(micronarrative.iter_story_images([{"title": "D", "prompt": "a"}], timeout=0.1))
+    assert images[0]["url"] == micronarrative.PLACEHOLDER_IMAGE
+
+def test_repeated_prompts_are_served_from_the_store(monkeypatch, story_store):
+    calls = []
+    monkeypatch.setattr(llm, "GATEWAY", _fake_images({"a": 0, "b": 0}, calls))
+    first = micronarrative.generate_story_images([{"title": "A", "prompt": "a"}, {"title": "B", "prompt": "b"}])
+    again = micronarrative.generate_story_images([{"title": "Other", "prompt": "a"}])
+    assert calls == ["a", "b"] or calls == ["b", "a"]
+    assert again[0]["url"] == first[0]["url"] and again[0]["title"] == "Other"
+    assert story_store.stats()["blobs"] == 2 and story_store.stats()["hits"] == 1
+
+def test_store_evicts_least_recently_used(tmp_path):
+    store = ContentStore(tmp_path, max_bytes=10)
+    store.put("a" * 64, "png", b"12345")
+    store.put("b" * 64, "png", b"12345")
+    assert store.get("a" * 64, "png")          # a is now most recent
+    store.put("c" * 64, "png", b"12345")
+    assert store.get("b" * 64, "png") is None and store.get("a" * 64, "png")
+    assert ContentStore(tmp_path, max_bytes=10).stats()["blobs"] == 2   # survives a restart
+    assert store.open("../etc/passwd") is None
+
+def test_each_beat_is_timed_from_its_own_start_on_its_own_chapter_pool(monkeypatch):
+    monkeypatch.setattr(micronarrative, "IMAGE_CONCURRENCY", 1)
+    monkeypatch.setattr(llm, "GATEWAY", _fake_images({"a": 0.05, "b": 0.05, "c": 0.6}))
+    beats = [{"title": t.upper(), "prompt": t} for t in "abc"]
+    images = dict(micronarrative.iter_story_images(beats, timeout=0.3))
+    assert images[0]["url"] != micronarrative.PLACEHOLDER_IMAGE != images[1]["url"]
+    assert images[2]["url"] == micronarrative.PLACEHOLDER_IMAGE   # queued, but still only 0.3 s once running
+
+    # The stuck beat above is still running; the next chapter has its own workers
+    monkeypatch.setattr(llm, "GATEWAY", _fake_images({"d": 0.0}))
+    started = time.monotonic()
+    images = dict(micronarrative.iter_story_images([{"title": "D", "prompt": "d"}], timeout=0.3))
+    assert images[0]["url"].endswith(".png")
+    assert time.monotonic() - started < 0.2
@@ -0,0 +1,44 @@
+import time
+
+from novelty import NoveltyIndex
+
+
+def test_scopes_remember_a_window_of_recent_tasks():
+    index = NoveltyIndex(threshold=0.6, window=3, ttl=60)
+    scopes = index.scopes_for("s1", 49.2827, -123.1207)
+    assert scopes[0] == "session:s1" and scopes[1].startswith("cell:")
+    tasks = ["Photograph a puddle after the rain.", "Record birdsong for ten seconds.",
+             "Write a line about the streetlights.", "Sketch the nearest bench from memory."]
+    for t in tasks:
+        index.add(t, scopes)
+    assert index.recent(scopes) == tasks[-1]
+    assert index.check("photograph a PUDDLE after rain", scopes)["novel"]          # oldest one fell out
+    hit = index.check("Record some birdsong for ten seconds!", ["session:s1"])
+    assert not hit["novel"] and hit["closest"] == tasks[1] and hit["scope"] == "session:s1"
+    assert index.similarity("Record birdsong", ["session:other"])["score"] == 0.0
+
+    index.ttl = 0
+    time.sleep(0.01)
+    assert index.check(tasks[1], scopes)["novel"] and index.recent(scopes) is None
+    assert index.stats()["rejections"] == 1 and index.stats()["checks"] == 3
+
+
+def test_repeats_are_regenerated_and_similarity_is_queryable(monkeypatch, client, app_module, coords):
+    monkeypatch.setattr(app_module.TASK_POOL, "target", 0)
+    replies = iter(["Photograph a puddle reflecting the cloudy sky.", "Snap a puddle reflecting the cloudy sky!",
+                    "Hum along to the nearest birdsong for ten seconds."])
+    prompts = []
+    monkeypatch.setattr(app_module, "prompt_llm", lambda prompt: prompts.append(prompt) or next(replies), raising=True)
+    body = {**coords, "session_id": "nov1"}
+    first = client.post("/generate-task", json=body).get_json()["task"]
+    second = client.post("/generate-task", json=body).get_json()["task"]
+    assert second.startswith("Hum along") and len(prompts) == 3
+    assert all("recently got “Photograph a puddle" in p for p in prompts[1:])   # told what to avoid
+
+    r = client.post("/novelty", json={"text": "photograph a PUDDLE reflecting the cloudy sky", "session_id": "nov1"})
+    assert r.get_json()["closest"] == first and r.get_json()["novel"] is False
+    r = client.post("/novelty", json={"text": "Draw a cat", **coords}).get_json()
+    assert r["novel"] is True and r["score"] < r["threshold"]
+    assert client.post("/novelty", json={"text": "x"}).status_code == 400
+    for bad in ({"latitude": "north", "longitude": 1}, {"latitude": 1}, {"latitude": 95, "longitude": 0}):
+        assert client.post("/novelty", json={"text": "x", **bad}).status_code == 400
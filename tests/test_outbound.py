@@ -0,0 +1,62 @@
+import pytest
+import requests
+
+import outbound
+
+class _Resp:
+    def __init__(self, status):
+        self.status_code = status
+
+def _fake_upstream(monkeypatch, host, responses):
+    up = outbound.Upstream(host)
+    calls = []
+    def _request(method, url, **kw):
+        calls.append(url)
+        r = responses.pop(0) if responses else _Resp(200)
+        if isinstance(r, Exception):
+            raise r
+        return r
+    monkeypatch.setattr(up.session, "request", _request)
+    monkeypatch.setitem(outbound._upstreams, host, up)
+    monkeypatch.setattr(outbound, "BACKOFF_BASE", 0.0)
+    return up, calls
+
+def test_get_retries_transient_errors(monkeypatch):
+    up, calls = _fake_upstream(monkeypatch, "retry.test", [_Resp(503), requests.exceptions.Timeout(), _Resp(200)])
+    assert outbound.get("https://retry.test/x").status_code == 200
+    assert len(calls) == 3
+    stats = up.stats()
+    assert stats["retries"] == 2 and stats["errors"] == 2 and stats["state"] == "closed"
+    assert sum(stats["latency_histogram"].values()) == 3
+
+def test_breaker_opens_and_short_circuits(monkeypatch):
+    down = [requests.exceptions.ConnectionError("down")] * 20
+    up, calls = _fake_upstream(monkeypatch, "down.test", down)
+    up.breaker = outbound.CircuitBreaker(failures=3, cooldown=60)
+    for _ in range(3):
+        with pytest.raises(requests.exceptions.ConnectionError):
+            outbound.get("https://down.test/x", retries=0)
+    with pytest.raises(outbound.CircuitOpenError):
+        outbound.get("https://down.test/x")
+    assert len(calls) == 3 and up.stats()["short_circuits"] == 1
+
+    up.breaker.opened_at -= 61  # cooldown elapsed → one half-open probe closes it again
+    up.breaker.failures = 0
+    down.clear()
+    assert outbound.get("https://down.test/x").status_code == 200
+    assert up.breaker.state == "closed"
+
+def test_post_is_not_retried_by_default(monkeypatch):
+    _, calls = _fake_upstream(monkeypatch, "post.test", [_Resp(503), _Resp(200)])
+    assert outbound.post("https://post.test/x").status_code == 503
+    assert len(calls) == 1
+
+def test_any_request_error_ends_a_half_open_probe(monkeypatch):
+    up, calls = _fake_upstream(monkeypatch, "redirects.test", [requests.exceptions.TooManyRedirects("loop"), _Resp(200)])
+    up.breaker = outbound.CircuitBreaker(failures=1, cooldown=60)
+    up.breaker.opened_at = outbound.time.monotonic() - 61
+    with pytest.raises(requests.exceptions.TooManyRedirects):
+        outbound.get("https://redirects.test/x")
+    assert len(calls) == 1 and not up.breaker.probing   # not retried, and the probe was recorded
+    up.breaker.opened_at -= 61
+    assert outbound.get("https://redirects.test/x").status_code == 200
@@ -0,0 +1,73 @@
+import time
+
+from promptcache import PromptCache
+
+# Distinct enough that the novelty index doesn't treat them as repeats of each other
+SUBJECTS = ["puddle", "bicycle", "streetlamp", "mailbox", "pigeon", "doorway", "graffiti", "bench"]
+
+POLICIES = {
+    "exact":    {"mode": "exact", "k": 1, "ttl": 60, "max_entries": 2},
+    "creative": {"mode": "variants", "k": 2, "ttl": 60, "max_entries": 10},
+}
+
+
+def test_exact_reuse_is_keyed_by_normalized_fields(tmp_path):
+    cache = PromptCache(POLICIES, path=tmp_path / "prompts.db")
+    calls = []
+    load = lambda: calls.append(1) or f"answer {len(calls)}"
+    assert cache.get_or_load("exact", {"task": "Snap a  Tree", "lat": 49.28271}, load) == "answer 1"
+    assert cache.get_or_load("exact", {"lat": 49.28269, "task": "snap a tree "}, load) == "answer 1"
+    assert cache.get_or_load("exact", {"task": "snap a bush"}, load) == "answer 2"
+    assert cache.stats()["exact"] == {"mode": "exact", "hits": 1, "misses": 2, "hit_rate": 0.333, "size": 2}
+
+    # LRU bound in memory; the SQLite copy still answers after eviction and across restarts
+    cache.get_or_load("exact", {"task": "third"}, load)
+    assert cache.stats()["exact"]["size"] == 2
+    again = PromptCache(POLICIES, path=tmp_path / "prompts.db")
+    assert again.get("exact", {"task": "SNAP a tree", "lat": 49.2827}) == "answer 1"
+
+    cache.policies["exact"]["ttl"] = 0
+    cache.put("exact", {"task": "stale"}, "old")
+    time.sleep(0.01)
+    assert cache.get("exact", {"task": "stale"}) is None
+
+
+def test_variants_fill_up_to_k_then_rotate():
+    cache = PromptCache(POLICIES)
+    answers = iter(["one", "two", "three"])
+    fields = {"bucket": ["park", "morning", "clear sky"]}
+    first = [cache.get_or_load("creative", fields, lambda: next(answers)) for _ in range(2)]
+    assert first == ["one", "two"]                       # every call asks the model until k exist
+    picks = {cache.get_or_load("creative", fields, lambda: next(answers)) for _ in range(30)}
+    assert picks == {"one", "two"} and cache.stats()["creative"]["hits"] == 30
+
+
+def test_generate_task_reuses_cached_variants(monkeypatch, client, app_module, coords):
+    monkeypatch.setattr(app_module.TASK_POOL, "target", 0)
+    monkeypatch.setitem(app_module.PROMPT_CACHE.policies["task"], "k", 2)
+    counter = iter(range(1000))
+    monkeypatch.setattr(app_module, "prompt_llm", lambda prompt: f"Find a {SUBJECTS[next(counter) % len(SUBJECTS)]}", raising=True)
+    sources = [client.post("/generate-task", json=coords).get_json()["source"] for _ in range(4)]
+    assert sources == ["LLM", "LLM", "cache", "cache"]
+    assert app_module.PROMPT_CACHE.stats()["task"]["hits"] == 2
+
+
+def test_judge_verdicts_for_fallback_summaries_are_not_cached(monkeypatch):
+    import judge
+    from mediasvc import MediaSummary
+    from promptcache import DEFAULT_POLICIES
+    monkeypatch.setattr(judge, "PROMPT_CACHE", PromptCache(DEFAULT_POLICIES))
+    calls = []
+    monkeypatch.setattr(judge, "complete_judge", lambda prompt, fields: calls.append(fields["sample"]) or "Nice one.")
+    summaries = iter([MediaSummary("Image description unavailable.", analyzed=False)] * 2
+                     + [MediaSummary("Image description: a red kite")] * 2)
+    monkeypatch.setattr(judge, "summarize_media", lambda path, media_type: next(summaries))
+    ctx = {"location_type": "park", "weather_hint": "sunny", "day_period": "morning"}
+    for _ in range(4):
+        judge.judge_with_gemma("Snap a kite", "photo", file_path="kite.jpg", context=ctx)
+    for _ in range(2):
+        judge.judge_with_gemma("Snap a kite", "photo", context=ctx)                       # nothing to go on
+        judge.judge_with_gemma("Snap a kite", "photo", text=MediaSummary("No submission text provided.", analyzed=False),
+                               context=ctx)
+    assert calls.count("Image description unavailable.") == 2 and calls.count("Image description: a red kite") == 1
+    assert len(calls) == 7
@@ -24,7 +24,7 @@ def test_generate_task_builds_rich_prompt(monkeypatch, client, coords, app_modul
     # sanity: response used our stubbed answer
     assert r.get_json()["task"].startswith("Do a small creative act")
 
-def test_submit_uses_llm_verdict(monkeypatch, client, coords, app_module, tmp_path):
+def test_submit_uses_llm_verdict(monkeypatch, client, coords, app_module, tmp_path, wait_job):
     verdict = "Nice shot! Keep the momentum and try one more challenge."
     monkeypatch.setattr(app_module, "prompt_llm", lambda _: verdict, raising=True)
 
@@ -39,10 +39,10 @@ def test_submit_uses_llm_verdict(monkeypatch, client, coords, app_module, tmp_pa
     r = client.post("/submit",
                     data={**data, "file": (io.BytesIO(b"img"), "pic.jpg")},
                     content_type="multipart/form-data")
-    assert r.status_code == 200
+    assert r.status_code == 202
     j = r.get_json()
     assert j["ok"] is True
-    assert j["judge_text"] == verdict  # exact LLM output propagated
+    assert wait_job(j["job_id"])["judge_text"] == verdict  # exact LLM output propagated
 
 def judge_submission(
         task: str,
@@ -77,3 +77,23 @@ def test_generate_task_fallback_on_llm_error(monkeypatch, client, coords, app_mo
     # The fallback string is expected (same as fallback in app.py)
     fallback_start = "Nice! That totally counts"
     assert isinstance(j["task"], str) and j["task"].startswith(fallback_start)
+
+def test_templates_keep_a_stable_prefix_and_respect_the_budget():
+    from prompts import JUDGE_PROMPT, PromptTemplate, count_tokens
+
+    fields = dict(task="Snap something green", media_type="text", location="park", weather="clear sky",
+                  period="morning", tone="be bright", humor="clever")
+    a = JUDGE_PROMPT.render(sample="User wrote: a leaf", **fields)
+    b = JUDGE_PROMPT.render(sample="User wrote: " + "very long rambling " * 400, **fields)
+    assert a.startswith(JUDGE_PROMPT.prefix) and b.startswith(JUDGE_PROMPT.prefix)
+    assert a.index("a leaf") > len(JUDGE_PROMPT.prefix)         # per-request details come last
+    assert b.truncated == ["sample"] and b.tokens <= JUDGE_PROMPT.budget and b.endswith("Humor: clever\n")
+
+    tight = PromptTemplate("tight", "Fixed rules.", "Task: $task\nNote: $note", budget=30,
+                           limits={"task": 20, "note": 20})
+    p = tight.render(task="t " * 50, note="n " * 50)
+    assert count_tokens(p) == p.tokens <= 30 and set(p.truncated) == {"task", "note"}
+    assert tight.stats()["truncations"] == 1 and tight.stats()["calls"] == 1
+
+    unbounded = PromptTemplate("unbounded", "Fixed rules.", "Items: $items", budget=10)
+    assert unbounded.render(items="x " * 100).over_budget and unbounded.stats()["over_budget"] == 1
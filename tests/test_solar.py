@@ -0,0 +1,44 @@
+from datetime import datetime, timezone
+
+import numpy as np
+import solar
+
+def _hm(dt):
+    return dt.hour * 60 + dt.minute
+
+def test_sun_times_match_published_tables():
+    # London, 2024-06-21: sunrise 03:43 UTC, sunset 20:21 UTC (timeanddate.com)
+    rise, sett = solar.sun_times(51.5074, -0.1278, datetime(2024, 6, 21, 12, tzinfo=timezone.utc))
+    assert abs(_hm(rise) - (3 * 60 + 43)) <= 2 and abs(_hm(sett) - (20 * 60 + 21)) <= 2
+    # Vancouver, 2025-12-21: sunrise 08:05 PST, sunset 16:16 PST
+    rise, sett = solar.sun_times(49.2827, -123.1207, datetime(2025, 12, 21, 20, tzinfo=timezone.utc))
+    assert abs(_hm(rise) - (16 * 60 + 5)) <= 2 and abs(_hm(sett) - (0 * 60 + 16)) <= 2
+    # Tromsø has no sunrise at the winter solstice
+    assert solar.sun_times(69.65, 18.96, datetime(2025, 12, 21, 12, tzinfo=timezone.utc)) == (None, None)
+
+def test_day_period_uses_local_solar_day():
+    # 03:00 UTC is 20:00 in Vancouver on the previous day → evening, not pre-dawn
+    assert solar.day_period(49.2827, -123.1207, datetime(2025, 6, 2, 3, tzinfo=timezone.utc)) == "evening"
+    assert solar.day_period(49.2827, -123.1207, datetime(2025, 6, 1, 12, tzinfo=timezone.utc)) == "pre-dawn"
+    assert solar.day_period(69.65, 18.96, datetime(2025, 12, 21, 12, tzinfo=timezone.utc)) == "night"
+
+def test_batch_events_match_published_tables():
+    # Minutes after 0h UTC of each local date (timeanddate.com): London 2024-06-21, New York 2024-06-20,
+    # Vancouver 2025-12-21, Sydney 2024-12-21 (05:41/20:05 AEDT), Singapore 2024-03-20 (07:09/19:16 SGT)
+    lats = np.array([51.5074, 40.7128, 49.2827, -33.8688, 1.3521])
+    lons = np.array([-0.1278, -74.0060, -123.1207, 151.2093, 103.8198])
+    days = ["2024-06-21", "2024-06-20", "2025-12-21", "2024-12-21", "2024-03-20"]
+    jd = np.array(days, dtype="datetime64[D]").astype("int64") + 2440587.5
+    rise, sett, _, status = solar.solar_events(lats, lons, jd)
+    assert list(status) == [solar.NORMAL] * 5
+    assert np.all(np.abs(rise - [223, 565, 965, -319, -51]) <= 2)
+    assert np.all(np.abs(sett - [1221, 1471, 1456, 545, 676]) <= 2)
+
+def test_batch_labels_at_fixed_time():
+    now = datetime(2024, 6, 21, 12, tzinfo=timezone.utc)
+    # London 13:00 BST, New York 08:00 EDT, Sydney 22:00 AEST, Singapore 20:00 SGT,
+    # Tromsø under the midnight sun at ~13:15 solar time, McMurdo in polar night
+    lats = np.array([51.5074, 40.7128, -33.8688, 1.3521, 69.65, -77.85])
+    lons = np.array([-0.1278, -74.0060, 151.2093, 103.8198, 18.96, 166.67])
+    assert list(solar.day_periods(lats, lons, now)) == [
+        "afternoon", "morning", "night", "night", "afternoon", "night"]
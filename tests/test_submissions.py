@@ -0,0 +1,47 @@
+import json
+import threading
+
+from submissions import SubmissionStore
+
+
+def test_index_allocation_is_atomic_across_threads(tmp_path):
+    store = SubmissionStore(tmp_path / "s.db")
+    got = []
+    def worker():
+        for _ in range(20):
+            got.append(store.allocate_index("sess"))
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(got) == list(range(1, 81))
+    assert store.allocate_index("other") == 1
+
+
+def test_add_update_and_read_back(tmp_path):
+    store = SubmissionStore(tmp_path / "s.db")
+    for n in range(3):
+        idx = store.allocate_index("a")
+        count = store.add({"session_id": "a", "index": idx, "task": f"t{n}", "media_type": "text",
+                           "text": f"note {n}", "lat": 1.5, "lon": 2.5, "source": "test"})
+    assert count == 3 and store.count("a") == 3 and store.count("nobody") == 0
+    store.update("a", 2, judge_text="Nice.", fit_score=0.7)
+    assert store.get("a", 2)["judge_text"] == "Nice." and store.get("a", 2)["source"] == "test"
+    assert [m["task"] for m in store.recent("a", limit=2)] == ["t2", "t1"]
+    assert store.indices("a") == [1, 2, 3]
+
+
+def test_migrates_old_directory_layout_once(tmp_path):
+    uploads = tmp_path / "uploads"
+    for idx, meta in ((1, {"task": "old", "fit_score": 0.4}), (2, {"task": "older"})):
+        entry = uploads / "legacy" / f"{idx:03d}"
+        entry.mkdir(parents=True)
+        (entry / "meta.json").write_text(json.dumps({"session_id": "legacy", "index": idx, **meta}))
+    (uploads / "legacy" / "003").mkdir()   # folder without meta still counts, as it did before
+
+    store = SubmissionStore(tmp_path / "s.db")
+    assert store.migrate_from_dir(uploads) == 3
+    assert store.count("legacy") == 3 and store.get("legacy", 1)["fit_score"] == 0.4
+    assert store.allocate_index("legacy") == 4
+    assert store.migrate_from_dir(uploads) == 0
@@ -0,0 +1,44 @@
+import time
+
+from taskpool import TaskPool
+
+# Distinct enough that the novelty index doesn't treat them as repeats of each other
+SUBJECTS = ["puddle", "bicycle", "streetlamp", "mailbox", "pigeon", "doorway", "graffiti", "bench"]
+
+def _wait_ready(pool, n, timeout=2.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if pool.stats()["ready"] >= n:
+            return
+        time.sleep(0.01)
+
+def test_pool_refills_dedupes_and_expires():
+    answers = iter(["Snap a puddle.", "snap a PUDDLE!", "Record the rain.", "Write one line."])
+    pool = TaskPool(lambda prompt: next(answers), target=3, ttl=60, workers=1)
+    key = ("park", "morning", "rain", "cafe")
+
+    assert pool.pop(key) is None
+    pool.refill(key, lambda: "prompt")
+    assert pool.stats()["cold_skips"] == 1 and pool.stats()["keys"] == 0   # a one-off key gets no pool
+    pool.refill(key, lambda: "prompt")
+    _wait_ready(pool, 2)
+    time.sleep(0.05)
+    tasks = [pool.pop(key)["task"] for _ in range(2)]
+    assert tasks == ["Snap a puddle.", "Record the rain."]   # the near-duplicate was dropped
+    assert pool.stats()["duplicates"] == 1
+
+    pool.ttl = 0
+    pool._pools[key].append({"task": "old", "prompt": "p", "created": time.time() - 1})
+    assert pool.pop(key) is None and pool.stats()["expired"] == 1
+
+def test_generate_task_served_from_pool(monkeypatch, client, app_module, coords):
+    counter = iter(range(1000))
+    monkeypatch.setattr(app_module, "prompt_llm", lambda prompt: f"Find a {SUBJECTS[next(counter) % len(SUBJECTS)]}", raising=True)
+    sources = [client.post("/generate-task", json=coords).get_json()["source"] for _ in range(2)]
+    assert sources == ["LLM", "LLM"]   # the pool only starts filling on the key's second request
+    _wait_ready(app_module.TASK_POOL, 1)
+    second = client.post("/generate-task", json=coords).get_json()
+    assert second["source"] == "pool"
+    assert "Riverside Park" not in second["prompt"]  # pooled prompts only name the category
+    assert "park nearby" in second["prompt"]
+    assert "Coordinates: not given" in second["prompt"] and f"{coords['latitude']:.4f}" not in second["prompt"]
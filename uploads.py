@@ -0,0 +1,210 @@
+# /app/uploads.py
+# Resumable, offset-based chunked uploads (tus-like): init → PATCH chunks at the current offset →
+# finalize. Bytes are staged next to the upload's state and hashed as they arrive; /submit moves
+# the finished file into the submission's entry directory.
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(64 * 1024 * 1024)))
+UPLOAD_TTL = float(os.getenv("UPLOAD_TTL", str(24 * 3600)))   # unfinished uploads are swept after this
+SWEEP_INTERVAL = 3600
+COPY_BUFFER = 64 * 1024
+
+
+class UploadError(Exception):
+    status = 400
+
+
+class UploadNotFound(UploadError):
+    status = 404
+
+
+class OffsetMismatch(UploadError):
+    """The client's offset isn't where the file ends; it should resume from `offset`."""
+    status = 409
+
+    def __init__(self, offset):
+        super().__init__(f"Upload is at offset {offset}")
+        self.offset = offset
+
+
+class UploadTooLarge(UploadError):
+    status = 413
+
+
+class Upload:
+    def __init__(self, upload_id, session_id, path, media_type, created=None, finalized=False, digest=None):
+        self.id = upload_id
+        self.session_id = session_id
+        self.path = path
+        self.media_type = media_type
+        self.created = created or time.time()
+        self.finalized = finalized
+        self.digest = digest
+        self._hasher = None   # rebuilt lazily from the bytes on disk after a restart
+        self._lock = threading.Lock()
+
+    @property
+    def offset(self):
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def _state(self):
+        return {"id": self.id, "session_id": self.session_id, "path": self.path,
+                "media_type": self.media_type, "created": self.created, "finalized": self.finalized,
+                "digest": self.digest}
+
+    def _ensure_hasher(self):
+        if self._hasher is None:
+            self._hasher = hashlib.blake2b(digest_size=32)
+            if os.path.exists(self.path):
+                with open(self.path, "rb") as f:
+                    for chunk in iter(lambda: f.read(COPY_BUFFER), b""):
+                        self._hasher.update(chunk)
+        return self._hasher
+
+
+class UploadManager:
+    """
+    Upload state is a small JSON file per upload under `state_dir`, so an upload can resume after a
+    restart; the current offset is always just the size of the partial file, which lives in
+    `state_dir/<upload id>/` until it's claimed. Nothing is allocated for the submission before then.
+    """
+
+    def __init__(self, state_dir, max_bytes=UPLOAD_MAX_BYTES, ttl=UPLOAD_TTL):
+        self.state_dir = state_dir
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._uploads = {}
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+        os.makedirs(state_dir, exist_ok=True)
+
+    def _state_path(self, upload_id):
+        return os.path.join(self.state_dir, f"{upload_id}.json")
+
+    def _staging_dir(self, upload_id):
+        return os.path.join(self.state_dir, upload_id)
+
+    def _save(self, up):
+        tmp = self._state_path(up.id) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(up._state(), f)
+        os.replace(tmp, self._state_path(up.id))
+
+    def create(self, session_id, filename, media_type):
+        if time.time() - self._last_sweep > SWEEP_INTERVAL:
+            self.sweep()
+        upload_id = uuid.uuid4().hex
+        os.makedirs(self._staging_dir(upload_id))
+        up = Upload(upload_id, session_id, os.path.join(self._staging_dir(upload_id), filename), media_type)
+        open(up.path, "wb").close()
+        self._save(up)
+        with self._lock:
+            self._uploads[up.id] = up
+        return up
+
+    def get(self, upload_id):
+        if not upload_id or not all(c in "0123456789abcdef" for c in upload_id):
+            raise UploadNotFound("Unknown upload")
+        with self._lock:
+            up = self._uploads.get(upload_id)
+            if up is None:
+                try:
+                    with open(self._state_path(upload_id), "r", encoding="utf-8") as f:
+                        state = json.load(f)
+                except (OSError, ValueError):
+                    raise UploadNotFound("Unknown upload")
+                up = self._uploads[upload_id] = Upload(
+                    state["id"], state["session_id"], state["path"], state["media_type"],
+                    state["created"], state["finalized"], state.get("digest"),
+                )
+            return up
+
+    def append(self, upload_id, offset, stream):
+        """Write `stream` at `offset` (which must be the current end); returns the new offset."""
+        up = self.get(upload_id)
+        with up._lock:
+            if up.finalized:
+                raise UploadError("Upload already finalized")
+            current = up.offset
+            if offset != current:
+                raise OffsetMismatch(current)
+            hasher = up._ensure_hasher()
+            with open(up.path, "ab") as f:
+                # Whatever arrives before a dropped connection is kept; the client resumes from there
+                for chunk in iter(lambda: stream.read(COPY_BUFFER), b""):
+                    if current + len(chunk) > self.max_bytes:
+                        raise UploadTooLarge(f"Upload exceeds {self.max_bytes} bytes")
+                    f.write(chunk)
+                    hasher.update(chunk)
+                    current += len(chunk)
+            return current
+
+    def finalize(self, upload_id, expected_size=None):
+        up = self.get(upload_id)
+        with up._lock:
+            if not up.finalized:
+                if expected_size is not None and int(expected_size) != up.offset:
+                    raise OffsetMismatch(up.offset)
+                if up.offset == 0:
+                    raise UploadError("Upload is empty")
+                up.digest = up._ensure_hasher().hexdigest()
+                up.finalized = True
+                self._save(up)
+            return up
+
+    def claim(self, upload_id, session_id):
+        """Hand a finished upload to /submit (once), which then `move`s it into the submission."""
+        up = self.get(upload_id)
+        if up.session_id != session_id:
+            raise UploadNotFound("Unknown upload")
+        if not up.finalized:
+            raise UploadError("Upload not finalized")
+        # Removing the state file is the claim; a second /submit for the same upload finds nothing
+        try:
+            os.remove(self._state_path(upload_id))
+        except FileNotFoundError:
+            raise UploadNotFound("Unknown upload")
+        finally:
+            with self._lock:
+                self._uploads.pop(upload_id, None)
+        return up
+
+    def move(self, up, dest):
+        """Move a claimed upload's file to `dest` (same filesystem) and drop its staging directory."""
+        os.replace(up.path, dest)
+        shutil.rmtree(self._staging_dir(up.id), ignore_errors=True)
+        up.path = dest
+        return up
+
+    def sweep(self):
+        """Delete unfinished or unclaimed uploads older than the TTL (partial file and directory included)."""
+        self._last_sweep = time.time()
+        cutoff = self._last_sweep - self.ttl
+        removed = 0
+        for name in os.listdir(self.state_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                up = self.get(name[:-5])
+            except UploadError:
+                continue
+            if up.created >= cutoff:
+                continue
+            with self._lock:
+                self._uploads.pop(up.id, None)
+            shutil.rmtree(self._staging_dir(up.id), ignore_errors=True)
+            try:
+                os.remove(self._state_path(up.id))
+            except OSError:
+                pass
+            removed += 1
+        return removed